@@ -2,6 +2,7 @@
 Admin panel funksiyalari
 """
 
+import os
 import json
 import asyncio
 from datetime import datetime, timedelta, date
@@ -9,21 +10,25 @@ from typing import List, Dict, Optional
 from io import BytesIO
 
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, BufferedInputFile
+from aiogram.types import Message, CallbackQuery, BufferedInputFile, FSInputFile
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from sqlalchemy import select, and_, or_, func, desc, asc
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import async_session, User, Court, Booking, Payment, Ticket, Settings
-from database import BookingStatus, PaymentStatus, UserRole, TicketStatus
+from database import async_session, User, Court, Booking, Payment, Settings
+from database import BookingStatus, PaymentStatus, UserRole, Broadcast, BroadcastStatus
 from config import Config
 from localization import get_text
 from keyboards import get_admin_main_keyboard, get_back_keyboard, get_pagination_keyboard
 from utils import create_excel_report, get_uzbekistan_time, format_currency
+from broadcast import broadcast_engine, count_recipients
+from checkin import check_in_photo, check_in_payload, CheckinTimeout, STAGE_TIMEOUT_TEXTS
+from ticket_pdf import ticket_pdf_renderer
+from send_queue import send_queue, PRIORITY_LOW
 
-admin_router = Router()
+admin_router = Router(name="admin")
 
 class AdminStates(StatesGroup):
     main_menu = State()
@@ -33,6 +38,8 @@ class AdminStates(StatesGroup):
     court_management = State()
     reports_menu = State()
     settings_menu = State()
+    broadcast_text = State()
+    broadcast_confirm = State()
 
 @admin_router.message(Command("admin"))
 async def admin_panel_handler(message: Message, state: FSMContext):
@@ -290,6 +297,12 @@ def get_admin_reports_keyboard(lang: str = "uz"):
         InlineKeyboardButton(text="🏟 Kortlar", callback_data="reports:courts"),
         InlineKeyboardButton(text="📋 Barchasi", callback_data="reports:full")
     )
+    builder.row(
+        InlineKeyboardButton(text="🎫 Bugungi biletlar (PDF)", callback_data="reports:tickets")
+    )
+    builder.row(
+        InlineKeyboardButton(text="📨 Biletlarni mijozlarga yuborish", callback_data="reports:tickets_users")
+    )
     builder.row(
         InlineKeyboardButton(text=get_text("back", lang), callback_data="back:admin")
     )
@@ -332,6 +345,16 @@ async def generate_report_handler(callback: CallbackQuery, state: FSMContext):
                     caption=f"📊 {report_data['title']}"
                 )
                 
+            elif report_data['format'] == 'pdf':
+                file_name = os.path.basename(report_data['path'])
+                with open(report_data['path'], 'rb') as f:
+                    document = BufferedInputFile(f.read(), filename=file_name)
+                
+                await callback.message.answer_document(
+                    document=document,
+                    caption=f"🎫 {report_data['title']}"
+                )
+                
         except Exception as e:
             await callback.message.edit_text(
                 f"❌ Hisobot yaratishda xatolik: {str(e)}",
@@ -418,6 +441,60 @@ async def generate_report(session: AsyncSession, report_type: str) -> Dict:
             'title': f'Oylik hisobot - {now.strftime("%m.%Y")}'
         }
     
+    elif report_type == "tickets":
+        # Qabulxona uchun kun biletlari (bitta PDF, jarayonlar pool'ida)
+        file_path = await ticket_pdf_renderer.render_day(now.date())
+        if file_path is None:
+            return {
+                'format': 'text',
+                'content': "🎫 Bugun uchun biletlar yo'q",
+                'title': 'Biletlar'
+            }
+        
+        return {
+            'format': 'pdf',
+            'path': file_path,
+            'title': f'Biletlar - {now.strftime("%d.%m.%Y")}'
+        }
+    
+    elif report_type == "tickets_users":
+        # Har bir mijozga o'z kun biletlari PDF i
+        paths = await ticket_pdf_renderer.render_per_user(now.date())
+        if not paths:
+            return {
+                'format': 'text',
+                'content': "🎫 Bugun uchun biletlar yo'q",
+                'title': 'Biletlar'
+            }
+        
+        result = await session.execute(
+            select(User.id, User.telegram_id).where(User.id.in_(list(paths)))
+        )
+        sends = [
+            send_queue.send_document(
+                row.telegram_id,
+                FSInputFile(paths[row.id]),
+                priority=PRIORITY_LOW,
+                caption=f"🎫 Biletlaringiz - {now.strftime('%d.%m.%Y')}"
+            )
+            for row in result.all()
+        ]
+        results = await asyncio.gather(*sends, return_exceptions=True)
+        sent = sum(1 for r in results if not isinstance(r, BaseException))
+        
+        content = f"""
+📨 Biletlar yuborildi - {now.strftime('%d.%m.%Y')}
+
+✅ Yuborildi: {sent}
+❌ Xatolik: {len(results) - sent}
+        """
+        
+        return {
+            'format': 'text',
+            'content': content,
+            'title': 'Biletlar'
+        }
+    
     # Boshqa hisobot turlari...
     return {
         'format': 'text',
@@ -425,100 +502,233 @@ async def generate_report(session: AsyncSession, report_type: str) -> Dict:
         'title': 'Xatolik'
     }
 
-@admin_router.message(F.photo, AdminStates.qr_checking)
-async def qr_check_handler(message: Message, state: FSMContext):
-    """QR kod tekshirish"""
+# Broadcast (barcha foydalanuvchilarga xabar)
+BROADCAST_AUDIENCES = {
+    'all': ("👥 Hammaga", None, False),
+    'uz': ("🇺🇿 O'zbek tilidagilar", "uz", False),
+    'ru': ("🇷🇺 Rus tilidagilar", "ru", False),
+    'vip': ("⭐ VIP mijozlar", None, True),
+}
+
+@admin_router.callback_query(F.data == "admin:broadcast")
+async def admin_broadcast_handler(callback: CallbackQuery, state: FSMContext):
+    """Broadcastlar ro'yxati"""
     async with async_session() as session:
-        user = await get_admin_user(message.from_user.id, session)
+        user = await get_admin_user(callback.from_user.id, session)
         if not user:
             return
         
         lang = user.language
         
-        try:
-            # QR kodni dekodlash (bu yerda qrcode kutubxonasi kerak)
-            # Hozircha mock implementation
-            
-            # Faraz qilamiz QR kod to'g'ri dekodlandi
-            qr_data = {
-                'ticket_id': 'TNS-20241201-CRT1-ABCD',
-                'booking_id': 123,
-                'user_id': 456
-            }
-            
-            # Biletni database dan tekshirish
-            result = await session.execute(
-                select(Ticket, Booking, Court, User).join(Booking).join(Court).join(User).where(
-                    Ticket.ticket_id == qr_data['ticket_id']
-                )
+        result = await session.execute(
+            select(Broadcast).order_by(desc(Broadcast.id)).limit(5)
+        )
+        broadcasts = result.scalars().all()
+        
+        text = "📢 Xabar yuborish\n\n"
+        if broadcasts:
+            text += "Oxirgi xabarlar:\n\n"
+            for broadcast in broadcasts:
+                text += format_broadcast_status(broadcast) + "\n\n"
+        
+        await callback.message.edit_text(text, reply_markup=get_admin_broadcast_keyboard(broadcasts, lang))
+        await state.set_state(AdminStates.main_menu)
+
+def format_broadcast_status(broadcast: Broadcast) -> str:
+    """Broadcast holati va progressi"""
+    status_emojis = {
+        BroadcastStatus.RUNNING: '⏳',
+        BroadcastStatus.DONE: '✅',
+        BroadcastStatus.CANCELLED: '❌'
+    }
+    preview = broadcast.text if len(broadcast.text) <= 40 else broadcast.text[:40] + "..."
+    processed = broadcast.sent_count + broadcast.failed_count
+    total = f"{broadcast.total_count}" if broadcast.recipients_ready else f"{broadcast.total_count}+"
+    return (
+        f"{status_emojis.get(broadcast.status, '❓')} #{broadcast.id} {broadcast.created_at.strftime('%d.%m %H:%M')}\n"
+        f"📝 {preview}\n"
+        f"📨 {processed}/{total} (✅ {broadcast.sent_count}, ❌ {broadcast.failed_count})"
+    )
+
+def get_admin_broadcast_keyboard(broadcasts: List[Broadcast], lang: str = "uz"):
+    """Admin broadcast klaviaturasi"""
+    from aiogram.utils.keyboard import InlineKeyboardBuilder
+    from aiogram.types import InlineKeyboardButton
+    
+    builder = InlineKeyboardBuilder()
+    
+    builder.row(InlineKeyboardButton(text="✍️ Yangi xabar", callback_data="broadcast:new"))
+    for broadcast in broadcasts:
+        if broadcast.status == BroadcastStatus.RUNNING:
+            builder.row(
+                InlineKeyboardButton(text=f"🔄 #{broadcast.id}", callback_data="admin:broadcast"),
+                InlineKeyboardButton(text=f"⛔ #{broadcast.id} to'xtatish", callback_data=f"broadcast:cancel:{broadcast.id}")
             )
-            
-            ticket_data = result.first()
-            
-            if not ticket_data:
-                await message.answer("❌ Bilet topilmadi!")
-                return
-            
-            ticket, booking, court, ticket_user = ticket_data
-            
-            if ticket.status == TicketStatus.USED:
-                await message.answer(
-                    f"⚠️ Bilet allaqachon foydalanilgan!\n"
-                    f"Foydalanilgan vaqt: {ticket.used_at.strftime('%d.%m.%Y %H:%M')}"
-                )
-                return
-            
-            if ticket.status != TicketStatus.ACTIVE:
-                await message.answer(f"❌ Bilet holati: {ticket.status.value}")
-                return
-            
-            # Vaqtni tekshirish
-            now = get_uzbekistan_time()
-            booking_time = booking.start_time
-            
-            # Check-in oralig'i (1 soat oldin va 15 daqiqa keyin)
-            checkin_start = booking_time - timedelta(hours=1)
-            checkin_end = booking_time + timedelta(minutes=15)
-            
-            if now < checkin_start:
-                await message.answer(
-                    f"⏰ Check-in vaqti hali kelmagan!\n"
-                    f"Check-in: {checkin_start.strftime('%H:%M')} dan"
-                )
-                return
-            
-            if now > checkin_end:
-                await message.answer(
-                    f"⏰ Check-in vaqti o'tib ketgan!\n"
-                    f"Bron vaqti: {booking_time.strftime('%H:%M')}"
-                )
-                return
-            
-            # Biletni foydalanilgan deb belgilash
-            ticket.status = TicketStatus.USED
-            ticket.used_at = now
-            ticket.checked_in_by = user.id
-            
-            await session.commit()
-            
-            success_text = f"""
-✅ Bilet muvaffaqiyatli tekshirildi!
-
-🎫 Bilet ID: {ticket.ticket_id}
-👤 Mijoz: {ticket_user.first_name} {ticket_user.last_name or ''}
-📱 Telefon: {ticket_user.phone_number}
-🏟 Kort: {court.name}
-📅 Sana: {booking.booking_date.strftime('%d.%m.%Y')}
-⏰ Vaqt: {booking.start_time.strftime('%H:%M')}-{booking.end_time.strftime('%H:%M')}
-💰 Narx: {format_currency(booking.final_amount)}
-
-✅ Check-in: {now.strftime('%H:%M')}
-            """
-            
-            await message.answer(success_text)
-            
-        except Exception as e:
-            await message.answer(f"❌ QR kod tekshirishda xatolik: {str(e)}")
+    builder.row(
+        InlineKeyboardButton(text=get_text("back", lang), callback_data="back:admin")
+    )
+    
+    return builder.as_markup()
+
+@admin_router.callback_query(F.data == "broadcast:new")
+async def broadcast_new_handler(callback: CallbackQuery, state: FSMContext):
+    """Broadcast matnini so'rash"""
+    async with async_session() as session:
+        user = await get_admin_user(callback.from_user.id, session)
+        if not user:
+            return
+        
+        await callback.message.edit_text(
+            "✍️ Yuboriladigan xabar matnini kiriting:",
+            reply_markup=get_back_keyboard("admin:broadcast", user.language)
+        )
+        await state.set_state(AdminStates.broadcast_text)
+
+@admin_router.message(F.text, AdminStates.broadcast_text)
+async def broadcast_text_handler(message: Message, state: FSMContext):
+    """Broadcast matni qabul qilindi - auditoriyani tanlash"""
+    async with async_session() as session:
+        user = await get_admin_user(message.from_user.id, session)
+        if not user:
+            return
+        
+        from aiogram.utils.keyboard import InlineKeyboardBuilder
+        from aiogram.types import InlineKeyboardButton
+        
+        builder = InlineKeyboardBuilder()
+        for key, (title, _, _) in BROADCAST_AUDIENCES.items():
+            builder.row(InlineKeyboardButton(text=title, callback_data=f"broadcast:audience:{key}"))
+        builder.row(InlineKeyboardButton(text=get_text("back", user.language), callback_data="admin:broadcast"))
+        
+        await state.update_data(broadcast_text=message.text)
+        await message.answer("👥 Kimlarga yuborilsin?", reply_markup=builder.as_markup())
+        await state.set_state(AdminStates.broadcast_confirm)
+
+@admin_router.callback_query(F.data.startswith("broadcast:audience:"), AdminStates.broadcast_confirm)
+async def broadcast_audience_handler(callback: CallbackQuery, state: FSMContext):
+    """Auditoriya tanlandi - tasdiqlash"""
+    audience = callback.data.split(":")[2]
+    if audience not in BROADCAST_AUDIENCES:
+        await callback.answer()
+        return
+    
+    async with async_session() as session:
+        user = await get_admin_user(callback.from_user.id, session)
+        if not user:
+            return
+        
+        title, language, vip_only = BROADCAST_AUDIENCES[audience]
+        recipients = await count_recipients(session, language, vip_only)
+        data = await state.update_data(broadcast_audience=audience)
+        
+        from aiogram.utils.keyboard import InlineKeyboardBuilder
+        from aiogram.types import InlineKeyboardButton
+        
+        builder = InlineKeyboardBuilder()
+        builder.row(
+            InlineKeyboardButton(text="✅ Yuborish", callback_data="broadcast:send"),
+            InlineKeyboardButton(text="❌ Bekor qilish", callback_data="admin:broadcast")
+        )
+        
+        await callback.message.edit_text(
+            f"📢 Xabar:\n\n{data['broadcast_text']}\n\n"
+            f"👥 Auditoriya: {title}\n"
+            f"📨 Qabul qiluvchilar: {recipients}",
+            reply_markup=builder.as_markup()
+        )
+
+@admin_router.callback_query(F.data == "broadcast:send", AdminStates.broadcast_confirm)
+async def broadcast_send_handler(callback: CallbackQuery, state: FSMContext):
+    """Broadcastni boshlash"""
+    async with async_session() as session:
+        user = await get_admin_user(callback.from_user.id, session)
+        if not user:
+            return
+    
+    data = await state.get_data()
+    if 'broadcast_text' not in data or 'broadcast_audience' not in data:
+        await callback.answer("Xatolik yuz berdi")
+        return
+    
+    _, language, vip_only = BROADCAST_AUDIENCES[data['broadcast_audience']]
+    broadcast = await broadcast_engine.create(user.id, data['broadcast_text'], language, vip_only)
+    
+    await state.set_state(AdminStates.main_menu)
+    await callback.message.edit_text(
+        f"✅ Xabar #{broadcast.id} yuborilmoqda.\n\nProgressni \"📢 Xabar yuborish\" bo'limida kuzatishingiz mumkin.",
+        reply_markup=get_back_keyboard("admin:broadcast", user.language)
+    )
+
+@admin_router.callback_query(F.data.startswith("broadcast:cancel:"))
+async def broadcast_cancel_handler(callback: CallbackQuery, state: FSMContext):
+    """Broadcastni to'xtatish"""
+    async with async_session() as session:
+        user = await get_admin_user(callback.from_user.id, session)
+        if not user:
+            return
+    
+    broadcast_id = int(callback.data.split(":")[2])
+    if await broadcast_engine.cancel(broadcast_id):
+        await callback.answer(f"⛔ Xabar #{broadcast_id} to'xtatildi")
+    else:
+        await callback.answer("Xabar allaqachon yakunlangan")
+    await admin_broadcast_handler(callback, state)
+
+# QR tekshirish (check-in): adminlar va qo'riqchilar
+@admin_router.callback_query(F.data == "admin:qr_check")
+async def admin_qr_check_handler(callback: CallbackQuery, state: FSMContext):
+    """QR tekshirish rejimini yoqish"""
+    async with async_session() as session:
+        user = await get_staff_user(callback.from_user.id, session)
+        if not user:
+            return
+        
+        await callback.message.edit_text(
+            "🎫 Bilet QR kodini suratga olib yuboring yoki bilet ID sini yozing.",
+            reply_markup=get_back_keyboard("back:admin", user.language)
+        )
+        await state.set_state(AdminStates.qr_checking)
+
+@admin_router.message(Command("check"))
+async def check_command_handler(message: Message, state: FSMContext):
+    """Qo'riqchi uchun QR tekshirish rejimi"""
+    async with async_session() as session:
+        user = await get_staff_user(message.from_user.id, session)
+        if not user:
+            return
+    
+    await message.answer("🎫 Bilet QR kodini suratga olib yuboring yoki bilet ID sini yozing.")
+    await state.set_state(AdminStates.qr_checking)
+
+@admin_router.message(F.photo, AdminStates.qr_checking)
+async def qr_check_handler(message: Message, state: FSMContext):
+    """QR kod tekshirish"""
+    async with async_session() as session:
+        user = await get_staff_user(message.from_user.id, session)
+        if not user:
+            return
+    
+    try:
+        result = await check_in_photo(message.bot, message, user.id)
+        await message.answer(result.text)
+    except Exception as e:
+        await message.answer(f"❌ QR kod tekshirishda xatolik: {str(e)}")
+
+@admin_router.message(F.text & ~F.text.startswith("/"), AdminStates.qr_checking)
+async def ticket_id_check_handler(message: Message, state: FSMContext):
+    """Bilet ID si qo'lda kiritilganda tekshirish"""
+    async with async_session() as session:
+        user = await get_staff_user(message.from_user.id, session)
+        if not user:
+            return
+    
+    try:
+        result = await check_in_payload(message.text.strip(), user.id)
+        await message.answer(result.text)
+    except CheckinTimeout as e:
+        await message.answer(STAGE_TIMEOUT_TEXTS[e.stage])
+    except Exception as e:
+        await message.answer(f"❌ Bilet tekshirishda xatolik: {str(e)}")
 
 async def get_admin_user(telegram_id: int, session: AsyncSession) -> Optional[User]:
     """Admin foydalanuvchini olish"""
@@ -532,6 +742,18 @@ async def get_admin_user(telegram_id: int, session: AsyncSession) -> Optional[Us
     
     return user
 
+async def get_staff_user(telegram_id: int, session: AsyncSession) -> Optional[User]:
+    """Check-in qila oladigan xodim (adminlar va qo'riqchilar)"""
+    result = await session.execute(
+        select(User).where(User.telegram_id == telegram_id)
+    )
+    user = result.scalar_one_or_none()
+    
+    if not user or user.role not in [UserRole.ADMIN, UserRole.OWNER, UserRole.MANAGER, UserRole.GUARD]:
+        return None
+    
+    return user
+
 def get_booking_status_emoji(status: str) -> str:
     """Bron holati uchun emoji"""
     status_emojis = {
@@ -0,0 +1,181 @@
+"""
+Bilet rasmlari (QR, bilet PNG) uchun asset store
+
+Kalit - render kiritmalarining SHA-256 xeshi (`asset_key`), shuning uchun bir
+xil bilet bir marta saqlanadi va o'chirilgan asset talab bo'yicha qayta
+yaratiladi (`get_or_render`). Assetlar kesh hisoblanadi: yo'qolsa ham zarar yo'q.
+
+Backend Config.ASSET_STORE_BACKEND orqali tanlanadi:
+    local  - Config.TICKETS_PATH da, hajmi ASSET_STORE_MAX_MB bilan cheklangan,
+             eng uzoq ishlatilmagan fayllar (LRU) o'chiriladi (standart)
+    s3     - S3 mos object storage (boto3 kerak); hajm bucket lifecycle
+             qoidalari bilan cheklanadi
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+def asset_key(kind: str, payload: Dict[str, Any], ext: str = "png") -> str:
+    """Render kiritmalaridan asset kaliti (kind - renderer versiyasini ham o'z ichiga oladi)"""
+    body = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    digest = hashlib.sha256(f"{kind}:{body}".encode("utf-8")).hexdigest()
+    return f"{digest}.{ext}"
+
+class AssetStore:
+    """Asset store interfeysi (bloklovchi I/O thread'da bajariladi)"""
+
+    def _get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def _put(self, key: str, data: bytes):
+        raise NotImplementedError
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def put(self, key: str, data: bytes):
+        await asyncio.to_thread(self._put, key, data)
+
+    async def get_or_render(self, key: str, render: Callable[[], bytes]) -> bytes:
+        """Assetni olish, bo'lmasa yaratib saqlash (saqlash xatosi render natijasiga ta'sir qilmaydi)"""
+        try:
+            data = await self.get(key)
+            if data is not None:
+                return data
+        except Exception as e:
+            logger.warning(f"Asset o'qilmadi ({key}): {e}")
+
+        data = await asyncio.to_thread(render)
+        try:
+            await self.put(key, data)
+        except Exception as e:
+            logger.warning(f"Asset saqlanmadi ({key}): {e}")
+        return data
+
+class LocalAssetStore(AssetStore):
+    """Diskdagi hajmi cheklangan LRU store"""
+
+    def __init__(self, root: str = None, max_bytes: int = None):
+        self.root = root or os.path.join(Config.TICKETS_PATH, "assets")
+        self.max_bytes = max_bytes or Config.ASSET_STORE_MAX_MB * 1024 * 1024
+        # key -> hajm; oxiridagi - eng yaqinda ishlatilgan
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def _load(self):
+        """Mavjud fayllarni oxirgi ishlatilish vaqti bo'yicha indekslash"""
+        files = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(directory, name))
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, name, stat.st_size))
+
+        for _, name, size in sorted(files):
+            self._index[name] = size
+            self._total += size
+        self._loaded = True
+        self._evict()
+
+    def _get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                size = self._index.pop(key, None)
+                if size is not None:
+                    self._total -= size
+            return None
+
+        # mtime - LRU tartibi (qayta ishga tushganda ham saqlanadi)
+        os.utime(path)
+        with self._lock:
+            if key in self._index:
+                self._index.move_to_end(key)
+        return data
+
+    def _put(self, key: str, data: bytes):
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if key in self._index:
+                self._index.move_to_end(key)
+                return
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if key not in self._index:
+                self._index[key] = len(data)
+                self._total += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def usage(self) -> int:
+        """Indeksdagi assetlar hajmi (bayt)"""
+        return self._total
+
+class S3AssetStore(AssetStore):
+    """S3 mos object storage (boto3)"""
+
+    def __init__(self, bucket: str = None, prefix: str = None, endpoint_url: str = None):
+        import boto3
+
+        self.bucket = bucket or Config.ASSET_STORE_BUCKET
+        self.prefix = prefix if prefix is not None else Config.ASSET_STORE_PREFIX
+        self._client = boto3.client("s3", endpoint_url=endpoint_url or Config.ASSET_STORE_ENDPOINT_URL or None)
+
+    def _get(self, key: str) -> Optional[bytes]:
+        try:
+            response = self._client.get_object(Bucket=self.bucket, Key=self.prefix + key)
+        except self._client.exceptions.NoSuchKey:
+            return None
+        return response["Body"].read()
+
+    def _put(self, key: str, data: bytes):
+        content_type = "application/pdf" if key.endswith(".pdf") else "image/png"
+        self._client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data, ContentType=content_type)
+
+def create_asset_store(backend: str = None) -> AssetStore:
+    """Konfiguratsiya bo'yicha asset store yaratish"""
+    backend = (backend or Config.ASSET_STORE_BACKEND).lower()
+    if backend == "s3":
+        return S3AssetStore()
+    return LocalAssetStore()
+
+# Global asset store
+asset_store = create_asset_store()
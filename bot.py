@@ -4,45 +4,75 @@ Asosiy Telegram bot
 
 import asyncio
 import logging
-import json
-from datetime import datetime, timedelta
-from typing import Dict, Any
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Tuple
 
 from aiogram import Bot, Dispatcher, Router, F
-from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove, Update
+from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove, Update, BufferedInputFile
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
-from sqlalchemy import select, and_, or_
+from sqlalchemy import select, update, exists, and_, or_
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
 from config import Config
-from database import async_session, User, Court, Booking, Payment, Ticket, BookingStatus, PaymentStatus, UserRole
+from database import (
+    async_session, engine, User, Court, Booking, Payment, Ticket,
+    BookingStatus, PaymentStatus, TicketStatus, WaitlistEntry, WaitlistStatus
+)
 from localization import get_text
 from keyboards import *
 from utils import *
-from payments import payment_manager, PaymentError
-
-# Logging sozlash
-logging.basicConfig(
-    level=getattr(logging, Config.LOG_LEVEL),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(Config.LOG_FILE),
-        logging.StreamHandler()
-    ]
+from payments import payment_manager, PaymentError, refund_payment, REFUND_MANUAL
+from reconciliation import PaymentReconciler
+from events import event_bus, PAYMENT_FAILED, PAYMENT_PAID
+from outbox import (
+    outbox_worker, enqueue_payment_paid, enqueue_refund,
+    TICKET_ISSUE, NOTIFY_PAYMENT_FAILED, NOTIFY_PAYMENT_SUCCESS, REFUND_PAYMENT
 )
+from server import start_http_server
+from send_queue import send_queue, PRIORITY_HIGH
+from ticket_tokens import encode_ticket_token
+from broadcast import broadcast_engine
+from reminders import reminder_scheduler
+from checkin import checkin_cache
+from waitlist import waitlist_manager, slot_hours, local_now
+from guard_mode import guard_sync
+from ticket_pdf import ticket_pdf_renderer
+from asset_store import asset_store, asset_key
+from admin import admin_router
+from metrics import MetricsMiddleware, TICKET_RENDER_SECONDS, instrument_engine
+from loop_watchdog import LoopWatchdog, UpdateTrackingMiddleware
+
+from logging_setup import LogContextMiddleware, setup_logging
+
 logger = logging.getLogger(__name__)
 
 # Bot va dispatcher
 bot = Bot(token=Config.BOT_TOKEN)
+send_queue.bind(bot)
 
 # Storage - faqat Memory storage (Redis muammolarini oldini olish uchun)
 storage = MemoryStorage()
 
 dp = Dispatcher(storage=storage)
-router = Router()
+router = Router(name="bot")
+
+# Metrikalar: handler kechikishi (barcha ichki routerlar uchun) va SQL so'rovlar
+dp.message.middleware(MetricsMiddleware())
+dp.callback_query.middleware(MetricsMiddleware())
+instrument_engine(engine)
+
+# Watchdog sekin callbacklarni qaysi update/handler chaqirganini bilishi uchun
+dp.message.middleware(UpdateTrackingMiddleware())
+dp.callback_query.middleware(UpdateTrackingMiddleware())
+
+# Strukturali loglar uchun update_id, user_id va handler konteksti
+dp.update.outer_middleware(LogContextMiddleware())
+dp.message.middleware(LogContextMiddleware())
+dp.callback_query.middleware(LogContextMiddleware())
 
 # States
 class RegistrationStates(StatesGroup):
@@ -263,10 +293,24 @@ async def show_time_slots(callback: CallbackQuery, state: FSMContext,
         available_slots = get_available_time_slots(booking_date, court_id, booked_times)
         
         if not available_slots:
-            await callback.message.edit_text(
-                get_text("no_available_slots", lang),
-                reply_markup=get_back_keyboard("back:main", lang)
-            )
+            # Hali boshlanmagan band soatlar uchun navbatga yozilish taklif qilinadi
+            now = get_uzbekistan_time().replace(tzinfo=None)
+            busy_hours = sorted({
+                hour_start.hour
+                for b in booked_slots
+                for hour_start in slot_hours(b.start_time, b.end_time)
+                if hour_start > now and hour_start.date() == booking_date.date()
+            })
+            if busy_hours:
+                await callback.message.edit_text(
+                    get_text("no_available_slots", lang) + "\n\n" + get_text("waitlist_prompt", lang),
+                    reply_markup=get_waitlist_hours_keyboard(court_id, booking_date, busy_hours, lang)
+                )
+            else:
+                await callback.message.edit_text(
+                    get_text("no_available_slots", lang),
+                    reply_markup=get_back_keyboard("back:main", lang)
+                )
             return
         
         await callback.message.edit_text(
@@ -387,6 +431,7 @@ async def confirm_booking_handler(callback: CallbackQuery, state: FSMContext):
         await session.refresh(booking)
         
         await state.update_data(booking_id=booking.id)
+        log_user_action(user.telegram_id, "booking_created", f"booking_id={booking.id}")
         
         # To'lov usulini tanlash
         await callback.message.edit_text(
@@ -431,6 +476,35 @@ async def payment_method_handler(callback: CallbackQuery, state: FSMContext):
             await callback.answer(get_text("error_occurred", lang))
             return
         
+        if booking.status != BookingStatus.HOLD:
+            # HOLD muddati o'tib, slot bo'shatilgan (navbatga yoki boshqa mijozga)
+            await callback.answer(get_text("hold_expired", lang), show_alert=True)
+            return
+        
+        if booking.hold_expires_at is None:
+            # Tugma ikki marta bosildi - to'lov allaqachon yaratilmoqda
+            await callback.answer(get_text("payment_processing", lang))
+            return
+        
+        # HOLD provayder chaqiruvidan oldin band qilinadi: javob kutilayotganda
+        # sweep uni bekor qilib, slotni navbatdagi mijozga bera olmaydi
+        hold_expires_at = booking.hold_expires_at
+        claimed = await session.scalar(
+            update(Booking)
+            .where(
+                Booking.id == booking.id,
+                Booking.status == BookingStatus.HOLD,
+                Booking.hold_expires_at > local_now()
+            )
+            .values(hold_expires_at=None, updated_at=datetime.utcnow())
+            .returning(Booking.id)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        if claimed is None:
+            await callback.answer(get_text("hold_expired", lang), show_alert=True)
+            return
+        
         try:
             # To'lov yaratish
             payment_data = await payment_manager.create_payment(
@@ -452,6 +526,7 @@ async def payment_method_handler(callback: CallbackQuery, state: FSMContext):
             
             session.add(payment)
             await session.commit()
+            log_user_action(user.telegram_id, "payment_started", f"booking_id={booking.id} method={payment_method.value}")
             
             await callback.message.edit_text(
                 get_text("payment_processing", lang)
@@ -470,78 +545,123 @@ async def payment_method_handler(callback: CallbackQuery, state: FSMContext):
                         f"💳 To'lov uchun havola:\n{payment_data['payment_url']}"
                     )
             
-            # To'lov holatini tekshirish (background task)
-            asyncio.create_task(check_payment_status(booking.id, payment_method, payment_data.get('payment_id')))
+            # To'lov holatini reconciliation worker tekshiradi
+            payment_reconciler.wake()
             
         except PaymentError as e:
+            await _release_payment_claim(booking.id, hold_expires_at)
             await callback.message.edit_text(
                 get_text("payment_failed", lang) + f"\n\nXatolik: {str(e)}"
             )
         except Exception as e:
             logger.error(f"Payment error: {e}")
+            await _release_payment_claim(booking.id, hold_expires_at)
             await callback.message.edit_text(
                 get_text("error_occurred", lang)
             )
 
-async def check_payment_status(booking_id: int, payment_method, payment_id: str):
-    """To'lov holatini tekshirish (background task)"""
-    await asyncio.sleep(5)  # 5 soniya kutish
+async def _release_payment_claim(booking_id: int, hold_expires_at: datetime):
+    """To'lov yaratilmadi: HOLD muddati qaytariladi (o'tgan bo'lsa sweep slotni bo'shatadi)"""
+    async with async_session() as session:
+        await session.execute(
+            update(Booking)
+            .where(
+                Booking.id == booking_id,
+                Booking.status == BookingStatus.HOLD,
+                Booking.hold_expires_at.is_(None),
+                ~exists().where(Payment.booking_id == Booking.id)
+            )
+            .values(hold_expires_at=hold_expires_at, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+async def _load_booking(session: AsyncSession, booking_id: int):
+    result = await session.execute(
+        select(Booking)
+        .options(selectinload(Booking.user), selectinload(Booking.court))
+        .where(Booking.id == booking_id)
+    )
+    return result.scalar_one_or_none()
+
+async def issue_ticket_job(payload: Dict[str, Any]):
+    """Outbox: bilet yaratish va yuborish (xato bo'lsa worker qayta uradi)"""
+    async with async_session() as session:
+        booking = await _load_booking(session, payload['booking_id'])
+        if not booking or booking.status != BookingStatus.CONFIRMED:
+            return
+        await create_and_send_ticket(booking, session)
+
+async def notify_payment_success_job(payload: Dict[str, Any]):
+    """Outbox: to'lov muvaffaqiyatli xabari"""
+    async with async_session() as session:
+        booking = await _load_booking(session, payload['booking_id'])
+        if not booking:
+            return
+        await send_queue.send_message(
+            booking.user.telegram_id,
+            get_text("payment_success", booking.user.language),
+            priority=PRIORITY_HIGH
+        )
+
+async def notify_payment_failed_job(payload: Dict[str, Any]):
+    """Outbox: to'lov bekor qilindi yoki muddati o'tdi"""
+    async with async_session() as session:
+        booking = await _load_booking(session, payload['booking_id'])
+        if not booking:
+            return
+        await send_queue.send_message(
+            booking.user.telegram_id,
+            get_text("payment_cancelled", booking.user.language),
+            priority=PRIORITY_HIGH
+        )
+
+async def refund_payment_job(payload: Dict[str, Any]):
+    """Outbox: bekor qilingan bron to'lovini qaytarish va xabar berish"""
+    outcome = await refund_payment(payload['payment_id'])
+    if outcome is None:
+        return
     
-    try:
-        if Config.MANUAL_PAYMENT_MODE:
-            # VAQTINCHA: Avtomatik to'lovni muvaffaqiyatli deb hisoblash
-            status = {'status': 'paid', 'transaction_id': f'manual_{payment_id}_{int(datetime.now().timestamp())}'}
-        else:
-            # Haqiqiy to'lov holatini tekshirish
-            # payment_method enum bo'lsa, uning value'sini olish
-            payment_method_str = payment_method.value if hasattr(payment_method, 'value') else str(payment_method)
-            status = await payment_manager.check_payment_status(payment_method_str, payment_id)
-        
-        async with async_session() as session:
-            booking = await session.get(Booking, booking_id)
-            if not booking:
-                return
-            
-            payment = await session.execute(
-                select(Payment).where(Payment.booking_id == booking_id)
+    async with async_session() as session:
+        booking = await _load_booking(session, payload['booking_id'])
+        payment = await session.get(Payment, payload['payment_id'])
+    if not booking or not payment:
+        return
+    
+    lang = booking.user.language
+    if outcome == REFUND_MANUAL:
+        for chat_id in Config.ADMIN_CHAT_IDS:
+            await send_queue.send_message(
+                chat_id,
+                get_text("admin_refund_required", "uz").format(
+                    payment_id=payment.id,
+                    method=payment.payment_method.value,
+                    booking_id=booking.id,
+                    amount=payment.amount
+                ),
+                priority=PRIORITY_HIGH
             )
-            payment = payment.scalar_one_or_none()
-            
-            if status['status'] == 'paid':
-                # To'lov muvaffaqiyatli
-                booking.status = BookingStatus.CONFIRMED
-                if payment:
-                    payment.status = PaymentStatus.PAID
-                    payment.paid_at = get_uzbekistan_time()
-                    payment.transaction_id = status.get('transaction_id')
-                
-                await session.commit()
-                
-                # Bilet yaratish
-                await create_and_send_ticket(booking, session)
-                
-                # Foydalanuvchiga muvaffaqiyat xabarini yuborish
-                await bot.send_message(
-                    booking.user.telegram_id,
-                    get_text("payment_success", booking.user.language)
-                )
-                
-            elif status['status'] == 'cancelled' and not Config.MANUAL_PAYMENT_MODE:
-                # To'lov bekor qilingan (faqat haqiqiy rejimda)
-                booking.status = BookingStatus.CANCELLED
-                if payment:
-                    payment.status = PaymentStatus.FAILED
-                
-                await session.commit()
-                
-                # Foydalanuvchiga xabar yuborish
-                await bot.send_message(
-                    booking.user.telegram_id,
-                    get_text("payment_cancelled", booking.user.language)
-                )
+        text = get_text("refund_manual", lang)
+    else:
+        text = get_text("refund_completed", lang).format(amount=payment.amount)
     
-    except Exception as e:
-        logger.error(f"Payment status check error: {e}")
+    await send_queue.send_message(booking.user.telegram_id, text, priority=PRIORITY_HIGH)
+
+async def wake_outbox(event: Dict[str, Any]):
+    """payment.paid / payment.failed: outbox yozuvlari allaqachon commit qilingan"""
+    outbox_worker.wake()
+
+outbox_worker.register(TICKET_ISSUE, issue_ticket_job)
+outbox_worker.register(NOTIFY_PAYMENT_SUCCESS, notify_payment_success_job)
+outbox_worker.register(NOTIFY_PAYMENT_FAILED, notify_payment_failed_job)
+outbox_worker.register(REFUND_PAYMENT, refund_payment_job)
+
+event_bus.subscribe(PAYMENT_PAID, wake_outbox)
+event_bus.subscribe(PAYMENT_FAILED, wake_outbox)
+event_bus.subscribe(PAYMENT_PAID, reminder_scheduler.on_booking_confirmed)
+event_bus.subscribe(PAYMENT_FAILED, waitlist_manager.on_payment_failed)
+
+payment_reconciler = PaymentReconciler()
 
 async def handle_payment_done(callback: CallbackQuery, state: FSMContext):
     """To'lov qilindi tugmasi bosilganda"""
@@ -561,9 +681,24 @@ async def handle_payment_done(callback: CallbackQuery, state: FSMContext):
             await callback.answer(get_text("error_occurred", lang))
             return
         
+        if booking.status == BookingStatus.CONFIRMED:
+            # Tugma ikki marta bosildi - bilet allaqachon navbatda
+            await callback.answer()
+            return
+        
         try:
-            # To'lovni avtomatik tasdiqlash
-            booking.status = BookingStatus.CONFIRMED
+            # To'lovni avtomatik tasdiqlash (faqat bron hali ochiq bo'lsa)
+            confirmed = await session.scalar(
+                update(Booking)
+                .where(Booking.id == booking.id, Booking.status.in_([BookingStatus.PENDING, BookingStatus.HOLD]))
+                .values(status=BookingStatus.CONFIRMED, updated_at=datetime.utcnow())
+                .returning(Booking.id)
+                .execution_options(synchronize_session=False)
+            )
+            if confirmed is None:
+                await session.rollback()
+                await callback.answer(get_text("hold_expired", lang), show_alert=True)
+                return
             
             # Payment record yaratish (cash to'lov sifatida)
             from database import PaymentMethod, PaymentStatus
@@ -574,26 +709,27 @@ async def handle_payment_done(callback: CallbackQuery, state: FSMContext):
                 amount=booking.final_amount,
                 status=PaymentStatus.PAID,
                 external_payment_id=f"cash_manual_{booking.id}",
-                paid_at=get_uzbekistan_time(),
+                paid_at=datetime.utcnow(),
                 transaction_id=f"cash_{booking.id}_{int(datetime.now().timestamp())}"
             )
             
             session.add(payment)
+            # Bilet va muvaffaqiyat xabari shu tranzaksiyada outbox ga yoziladi
+            enqueue_payment_paid(session, booking.id)
             await session.commit()
+            log_user_action(user.telegram_id, "payment_confirmed", f"booking_id={booking.id} method=cash")
             
             # Xabar yuborish
             await callback.message.edit_text(
                 "✅ To'lov tasdiqlandi!\n\nBiletingiz tayyorlanmoqda..."
             )
             
-            # Bilet yaratish va yuborish
-            await create_and_send_ticket(booking, session)
-            
-            # Muvaffaqiyat xabari
-            await bot.send_message(
-                user.telegram_id,
-                get_text("payment_success", lang)
-            )
+            # Outbox workerni uyg'otish
+            await event_bus.publish(PAYMENT_PAID, {
+                'booking_id': booking.id,
+                'payment_id': payment.id,
+                'method': PaymentMethod.CASH.value
+            })
             
         except Exception as e:
             logger.error(f"Payment done error: {e}")
@@ -602,85 +738,120 @@ async def handle_payment_done(callback: CallbackQuery, state: FSMContext):
             )
 
 async def create_and_send_ticket(booking: Booking, session: AsyncSession):
-    """Bilet yaratish va yuborish"""
-    try:
+    """
+    Bilet yaratish va yuborish
+    
+    Outbox worker tomonidan chaqiriladi; xatolar yuqoriga uzatiladi va
+    qayta urinishda avval yaratilgan bilet yozuvi qayta ishlatiladi.
+    """
+    from sqlalchemy.exc import IntegrityError
+    
+    result = await session.execute(select(Ticket).where(Ticket.booking_id == booking.id))
+    ticket = result.scalar_one_or_none()
+    
+    if ticket is None:
         # Ticket ID yaratish
         ticket_id = generate_ticket_id(booking.id, booking.court_id, booking.start_time)
         
-        # QR kod ma'lumotlari
-        qr_data = {
-            'ticket_id': ticket_id,
-            'booking_id': booking.id,
-            'user_id': booking.user_id,
-            'court_id': booking.court_id,
-            'start_time': booking.start_time.isoformat(),
-            'amount': float(booking.final_amount)
-        }
-        qr_string = json.dumps(qr_data)
-        
-        # QR kod fayli yo'li
-        qr_path = f"{Config.TICKETS_PATH}/qr_{ticket_id}.png"
-        save_qr_code(qr_string, qr_path)
-        
-        # Ticket record yaratish
+        # Ticket record yaratish (booking_id unique - bron uchun bitta bilet)
+        # QR ichida imzolangan ixcham token (ticket_tokens.py)
         ticket = Ticket(
             booking_id=booking.id,
             ticket_id=ticket_id,
-            qr_code_data=qr_string,
-            qr_code_path=qr_path
+            qr_code_data=encode_ticket_token(booking.id, booking.court_id, booking.start_time)
         )
         
         session.add(ticket)
-        await session.commit()
-        
-        # Foydalanuvchiga bilet yuborish
-        # User va Court ma'lumotlarini olish
-        from sqlalchemy import select
-        user_result = await session.execute(select(User).where(User.id == booking.user_id))
-        user = user_result.scalar_one()
-        
-        court_result = await session.execute(select(Court).where(Court.id == booking.court_id))
-        court = court_result.scalar_one()
-        
-        ticket_info = get_text("ticket_generated", user.language).format(
-            ticket_id=ticket_id,
-            date=booking.booking_date.strftime("%d.%m.%Y"),
-            start_time=booking.start_time.strftime("%H:%M"),
-            end_time=booking.end_time.strftime("%H:%M"),
-            court_name=court.name,
-            amount=booking.final_amount
-        )
-        
-        # Bilet rasmini yaratish va yuborish
-        from utils import create_ticket_image
-        ticket_image_path = f"{Config.TICKETS_PATH}/ticket_{ticket_id}.png"
-        ticket_data = {
-            'ticket_id': ticket_id,
-            'user_name': f"{user.first_name} {user.last_name or ''}".strip(),
-            'phone': user.phone_number or "N/A",
-            'date': booking.booking_date.strftime("%d.%m.%Y"),
-            'start_time': booking.start_time.strftime("%H:%M"),
-            'end_time': booking.end_time.strftime("%H:%M"),
-            'court_name': court.name,
-            'amount': booking.final_amount,
-            'payment_status': 'To\'langan',
-            'created_at': get_uzbekistan_time().strftime("%d.%m.%Y %H:%M"),
-            'qr_code_path': qr_path
-        }
-        
-        create_ticket_image(ticket_data, qr_path, ticket_image_path)
+        try:
+            await session.commit()
+        except IntegrityError:
+            # Boshqa worker hozirgina yaratdi
+            await session.rollback()
+            result = await session.execute(select(Ticket).where(Ticket.booking_id == booking.id))
+            ticket = result.scalar_one()
+    
+    ticket_id = ticket.ticket_id
+    
+    # Foydalanuvchiga bilet yuborish
+    # User va Court ma'lumotlarini olish
+    user_result = await session.execute(select(User).where(User.id == booking.user_id))
+    user = user_result.scalar_one()
+    
+    court_result = await session.execute(select(Court).where(Court.id == booking.court_id))
+    court = court_result.scalar_one()
+    
+    # Bugungi bron bo'lsa - kirishdagi check-in keshiga
+    checkin_cache.add_ticket(ticket, booking, court, user)
+    
+    # Bilet rasmi xotirada yaratiladi (asset store'da keshlanadi)
+    ticket_png = await render_ticket_photo(ticket, booking, user, court)
+    await send_queue.send_photo(
+        user.telegram_id,
+        photo=BufferedInputFile(ticket_png, filename=f"ticket_{ticket_id}.png"),
+        priority=PRIORITY_HIGH,
+        caption=f"🎫 Sizning biletingiz tayyor!\n\nBilet ID: {ticket_id}\nKort: {court.name}\nSana: {booking.booking_date.strftime('%d.%m.%Y')}\nVaqt: {booking.start_time.strftime('%H:%M')} - {booking.end_time.strftime('%H:%M')}\nSumma: {booking.final_amount:,.0f} so'm\n\nQR kodni kirish vaqtida ko'rsating!"
+    )
+
+async def render_ticket_photo(ticket: Ticket, booking: Booking, user: User, court: Court) -> bytes:
+    """
+    Bilet rasmi (PNG)
+    
+    Kalit bilet ma'lumotlaridan olinadi, shuning uchun asset store'dan
+    o'chirilgan rasm xuddi shu ko'rinishda qayta yaratiladi.
+    """
+    created_at = (ticket.created_at or datetime.utcnow()).replace(tzinfo=timezone.utc)
+    ticket_data = {
+        'ticket_id': ticket.ticket_id,
+        'user_name': f"{user.first_name} {user.last_name or ''}".strip(),
+        'phone': user.phone_number or "N/A",
+        'date': booking.booking_date.strftime("%d.%m.%Y"),
+        'start_time': booking.start_time.strftime("%H:%M"),
+        'end_time': booking.end_time.strftime("%H:%M"),
+        'court_name': court.name,
+        'amount': booking.final_amount,
+        'payment_status': 'To\'langan',
+        'created_at': created_at.astimezone(Config.get_timezone()).strftime("%d.%m.%Y %H:%M"),
+        'qr_code_data': ticket.qr_code_data
+    }
+    
+    def render_qr() -> bytes:
+        with TICKET_RENDER_SECONDS.labels("qr").time():
+            return generate_qr_code(ticket.qr_code_data).getvalue()
+    
+    qr_png = await asset_store.get_or_render(asset_key("qr:v1", {'data': ticket.qr_code_data}), render_qr)
+    
+    def render_image() -> bytes:
+        with TICKET_RENDER_SECONDS.labels("image").time():
+            return render_ticket_png(ticket_data, qr_png)
+    
+    return await asset_store.get_or_render(asset_key("ticket:v1", ticket_data), render_image)
+
+@router.callback_query(F.data.startswith("ticket:show:"))
+async def show_ticket_handler(callback: CallbackQuery):
+    """Biletni qayta ko'rsatish (rasm kerak bo'lsa qayta yaratiladi)"""
+    booking_id = int(callback.data.split(":")[2])
+    
+    async with async_session() as session:
+        user = await get_or_create_user(callback.from_user, session)
+        lang = user.language
         
-        # Bilet rasmini yuborish
-        from aiogram.types import FSInputFile
-        ticket_photo = FSInputFile(ticket_image_path)
-        await bot.send_photo(
-            user.telegram_id,
-            photo=ticket_photo,
-            caption=f"🎫 Sizning biletingiz tayyor!\n\nBilet ID: {ticket_id}\nKort: {court.name}\nSana: {booking.booking_date.strftime('%d.%m.%Y')}\nVaqt: {booking.start_time.strftime('%H:%M')} - {booking.end_time.strftime('%H:%M')}\nSumma: {booking.final_amount:,.0f} so'm\n\nQR kodni kirish vaqtida ko'rsating!"
+        result = await session.execute(
+            select(Booking)
+            .options(selectinload(Booking.ticket), selectinload(Booking.court))
+            .where(Booking.id == booking_id, Booking.user_id == user.id)
         )
-        
-    except Exception as e:
-        logger.error(f"Ticket creation error: {e}")
+        booking = result.scalar_one_or_none()
+    
+    if booking is None or booking.ticket is None:
+        await callback.answer(get_text("ticket_not_found", lang), show_alert=True)
+        return
+    
+    await callback.answer()
+    ticket_png = await render_ticket_photo(booking.ticket, booking, user, booking.court)
+    await callback.message.answer_photo(
+        BufferedInputFile(ticket_png, filename=f"ticket_{booking.ticket.ticket_id}.png"),
+        caption=f"🎫 Bilet ID: {booking.ticket.ticket_id}"
+    )
 
 @router.message(F.text.in_([
     "🎫 Buyurtmalarim", "🎫 Мои заказы"
@@ -760,39 +931,375 @@ async def back_button_handler(callback: CallbackQuery, state: FSMContext):
             reply_markup=get_calendar_keyboard(now.year, now.month, lang)
         )
         await state.set_state(BookingStates.selecting_date)
+    elif destination == "bookings":
+        await callback.message.edit_text(
+            get_text("my_bookings_menu", lang),
+            reply_markup=get_my_bookings_keyboard(lang)
+        )
     
     await callback.answer()
 
-@router.callback_query(F.data == "bookings:active")
-async def active_bookings_handler(callback: CallbackQuery):
-    """Faol bronlarni ko'rsatish"""
+# "Buyurtmalarim" bo'limlari: holatlar, kelajakdagi/o'tgan bronlar (None - hammasi), o'sish tartibi
+BOOKING_VIEWS = {
+    'active': ([BookingStatus.CONFIRMED, BookingStatus.PAID], True, True),
+    'history': ([BookingStatus.CONFIRMED, BookingStatus.PAID, BookingStatus.COMPLETED, BookingStatus.NO_SHOW], False, False),
+    'cancelled': ([BookingStatus.CANCELLED], None, False),
+}
+
+BOOKING_VIEW_TEXTS = {
+    'active': ("active_bookings", "no_active_bookings"),
+    'history': ("booking_history", "no_booking_history"),
+    'cancelled': ("cancelled_bookings", "no_cancelled_bookings"),
+}
+
+CURSOR_FORMAT = "%Y%m%d%H%M%S"
+
+def encode_booking_cursor(booking: Booking) -> str:
+    return f"{booking.start_time.strftime(CURSOR_FORMAT)}:{booking.id}"
+
+async def load_bookings_page(session: AsyncSession, user_id: int, view: str, direction: str = "n",
+                             cursor: Tuple[datetime, int] = None) -> Tuple[List[Booking], bool, bool]:
+    """
+    Bronlar sahifasi (start_time, id) bo'yicha keyset bilan
+    
+    direction - "n" (cursor dan keyingi) yoki "p" (cursor dan oldingi sahifa).
+    Qaytaradi: bronlar, oldingi sahifa bormi, keyingi sahifa bormi.
+    """
+    statuses, upcoming, ascending = BOOKING_VIEWS[view]
+    page_size = Config.BOOKINGS_PAGE_SIZE
+    now = get_uzbekistan_time().replace(tzinfo=None)
+    
+    query = (
+        select(Booking)
+        .options(selectinload(Booking.court))
+        .where(Booking.user_id == user_id, Booking.status.in_(statuses))
+    )
+    if upcoming is True:
+        query = query.where(Booking.start_time > now)
+    elif upcoming is False:
+        query = query.where(Booking.start_time <= now)
+    
+    # Oldingi sahifa teskari tartibda o'qiladi va keyin aylantiriladi
+    forward = direction != "p"
+    scan_ascending = ascending == forward
+    if cursor is not None:
+        start_time, booking_id = cursor
+        if scan_ascending:
+            query = query.where(or_(
+                Booking.start_time > start_time,
+                and_(Booking.start_time == start_time, Booking.id > booking_id)
+            ))
+        else:
+            query = query.where(or_(
+                Booking.start_time < start_time,
+                and_(Booking.start_time == start_time, Booking.id < booking_id)
+            ))
+    
+    if scan_ascending:
+        query = query.order_by(Booking.start_time.asc(), Booking.id.asc())
+    else:
+        query = query.order_by(Booking.start_time.desc(), Booking.id.desc())
+    
+    result = await session.execute(query.limit(page_size + 1))
+    bookings = list(result.scalars().all())
+    has_more = len(bookings) > page_size
+    bookings = bookings[:page_size]
+    
+    if forward:
+        return bookings, cursor is not None, has_more
+    bookings.reverse()
+    return bookings, has_more, True
+
+@router.callback_query(F.data.startswith("bookings:"))
+async def bookings_page_handler(callback: CallbackQuery):
+    """Faol, o'tgan va bekor qilingan bronlar (sahifalab)"""
+    parts = callback.data.split(":")
+    view = parts[1]
+    if view not in BOOKING_VIEWS:
+        await callback.answer()
+        return
+    
+    direction, cursor = "n", None
+    if len(parts) == 5:
+        direction = parts[2]
+        cursor = (datetime.strptime(parts[3], CURSOR_FORMAT), int(parts[4]))
+    
+    async with async_session() as session:
+        user = await get_or_create_user(callback.from_user, session)
+        lang = user.language
+        bookings, has_prev, has_next = await load_bookings_page(session, user.id, view, direction, cursor)
+    
+    title_key, empty_key = BOOKING_VIEW_TEXTS[view]
+    await callback.answer()
+    
+    if not bookings:
+        await callback.message.edit_text(
+            get_text(empty_key, lang),
+            reply_markup=get_back_keyboard("back:bookings", lang)
+        )
+        return
+    
+    items = [
+        (
+            booking.id,
+            f"{get_booking_status_emoji(booking.status.value)} "
+            f"{booking.start_time.strftime('%d.%m %H:%M')}-{booking.end_time.strftime('%H:%M')} · {booking.court.name}"
+        )
+        for booking in bookings
+    ]
+    await callback.message.edit_text(
+        get_text(title_key, lang),
+        reply_markup=get_bookings_page_keyboard(
+            view,
+            items,
+            encode_booking_cursor(bookings[0]) if has_prev else None,
+            encode_booking_cursor(bookings[-1]) if has_next else None,
+            lang
+        )
+    )
+
+@router.callback_query(F.data.startswith("booking:view:"))
+async def booking_view_handler(callback: CallbackQuery):
+    """Bitta bron tafsilotlari"""
+    booking_id = int(callback.data.split(":")[2])
+    
     async with async_session() as session:
         user = await get_or_create_user(callback.from_user, session)
         lang = user.language
         
-        now = get_uzbekistan_time()
         result = await session.execute(
-            select(Booking).join(Court).where(
-                and_(
-                    Booking.user_id == user.id,
-                    Booking.start_time > now,
-                    Booking.status.in_([BookingStatus.CONFIRMED, BookingStatus.PAID])
-                )
-            ).order_by(Booking.start_time)
+            select(Booking)
+            .options(selectinload(Booking.court))
+            .where(Booking.id == booking_id, Booking.user_id == user.id)
+        )
+        booking = result.scalar_one_or_none()
+    
+    await callback.answer()
+    if booking is None:
+        await callback.message.edit_text(
+            get_text("error_occurred", lang),
+            reply_markup=get_back_keyboard("back:bookings", lang)
         )
+        return
+    
+    await show_booking_details(callback, booking, lang, can_cancel=is_cancellable(booking))
+
+def cancellation_deadline() -> datetime:
+    """Shu vaqtdan keyin boshlanadigan bronlarni bekor qilish mumkin"""
+    return get_uzbekistan_time().replace(tzinfo=None) + timedelta(hours=Config.CANCELLATION_HOURS)
+
+def is_cancellable(booking: Booking) -> bool:
+    return (
+        booking.status in (BookingStatus.CONFIRMED, BookingStatus.PAID)
+        and booking.start_time > cancellation_deadline()
+    )
+
+@router.callback_query(F.data.startswith("booking:cancel:"))
+async def cancel_booking_handler(callback: CallbackQuery):
+    """Bron bekor qilishni tasdiqlash"""
+    booking_id = int(callback.data.split(":")[2])
+    
+    async with async_session() as session:
+        user = await get_or_create_user(callback.from_user, session)
+        lang = user.language
         
-        bookings = result.scalars().all()
+        result = await session.execute(
+            select(Booking)
+            .options(selectinload(Booking.court))
+            .where(Booking.id == booking_id, Booking.user_id == user.id)
+        )
+        booking = result.scalar_one_or_none()
+    
+    if booking is None or not is_cancellable(booking):
+        await callback.answer(
+            get_text("cancellation_not_allowed", lang).format(hours=Config.CANCELLATION_HOURS),
+            show_alert=True
+        )
+        return
+    
+    await callback.answer()
+    await callback.message.edit_text(
+        get_text("cancel_booking_confirm", lang).format(
+            date=booking.booking_date.strftime("%d.%m.%Y"),
+            time=booking.start_time.strftime("%H:%M"),
+            court_name=booking.court.name,
+            hours=Config.CANCELLATION_HOURS
+        ),
+        reply_markup=get_cancel_booking_keyboard(booking.id, lang)
+    )
+
+@router.callback_query(F.data.startswith("booking:cancel_yes:"))
+async def cancel_booking_confirm_handler(callback: CallbackQuery):
+    """Bronni bekor qilish: slot darhol bo'shaydi, to'lov outbox orqali qaytariladi"""
+    booking_id = int(callback.data.split(":")[2])
+    
+    async with async_session() as session:
+        user = await get_or_create_user(callback.from_user, session)
+        lang = user.language
         
-        if not bookings:
-            await callback.message.edit_text(
-                get_text("no_active_bookings", lang),
-                reply_markup=get_back_keyboard("back:main", lang)
+        # Shartli UPDATE: ikki marta bosish yoki muddat o'tgani bitta so'rovda tekshiriladi
+        result = await session.execute(
+            update(Booking)
+            .where(
+                Booking.id == booking_id,
+                Booking.user_id == user.id,
+                Booking.status.in_([BookingStatus.CONFIRMED, BookingStatus.PAID]),
+                Booking.start_time > cancellation_deadline()
+            )
+            .values(status=BookingStatus.CANCELLED, updated_at=datetime.utcnow())
+            .returning(Booking.court_id, Booking.start_time, Booking.end_time)
+            .execution_options(synchronize_session=False)
+        )
+        cancelled = result.first()
+        if cancelled is None:
+            await session.rollback()
+            await callback.answer(
+                get_text("cancellation_not_allowed", lang).format(hours=Config.CANCELLATION_HOURS),
+                show_alert=True
             )
             return
         
-        # Birinchi bronni ko'rsatish
-        booking = bookings[0]
-        await show_booking_details(callback, booking, lang, can_cancel=True)
+        await session.execute(
+            update(Ticket)
+            .where(Ticket.booking_id == booking_id, Ticket.status == TicketStatus.ACTIVE)
+            .values(status=TicketStatus.CANCELLED)
+            .execution_options(synchronize_session=False)
+        )
+        payment_id = await session.scalar(
+            select(Payment.id).where(Payment.booking_id == booking_id, Payment.status == PaymentStatus.PAID)
+        )
+        if payment_id is not None:
+            # Qaytarish shu tranzaksiyada outbox ga yoziladi - handler provayderni kutmaydi
+            enqueue_refund(session, booking_id, payment_id)
+        await session.commit()
+    
+    checkin_cache.discard(booking_id)
+    waitlist_manager.slot_freed(cancelled.court_id, cancelled.start_time, cancelled.end_time)
+    if payment_id is not None:
+        outbox_worker.wake()
+    log_user_action(user.telegram_id, "booking_cancelled", f"booking_id={booking_id} payment_id={payment_id}")
+    
+    text = get_text("booking_cancelled_by_user", lang)
+    if payment_id is not None:
+        text += "\n\n" + get_text("refund_pending", lang)
+    await callback.answer()
+    await callback.message.edit_text(text, reply_markup=get_back_keyboard("back:bookings", lang))
+
+@router.callback_query(F.data.startswith("waitlist:join:"))
+async def waitlist_join_handler(callback: CallbackQuery):
+    """Band slot navbatiga yozilish"""
+    _, _, court_id, day, hour = callback.data.split(":")
+    court_id = int(court_id)
+    slot_start = datetime.strptime(day, "%Y%m%d").replace(hour=int(hour))
+    
+    async with async_session() as session:
+        user = await get_or_create_user(callback.from_user, session)
+        lang = user.language
+        court = await session.get(Court, court_id)
+    
+    now = get_uzbekistan_time().replace(tzinfo=None)
+    if court is None or slot_start <= now or not Config.COURT_OPEN_HOUR <= slot_start.hour < Config.COURT_CLOSE_HOUR:
+        await callback.answer(get_text("error_occurred", lang), show_alert=True)
+        return
+    
+    entry_id, position = await waitlist_manager.join(user.id, court_id, slot_start)
+    log_user_action(user.telegram_id, "waitlist_joined", f"court_id={court_id} slot={slot_start:%Y-%m-%d %H:%M}")
+    
+    await callback.answer()
+    await callback.message.edit_text(
+        get_text("waitlist_joined", lang).format(
+            date=slot_start.strftime("%d.%m.%Y"),
+            time=slot_start.strftime("%H:%M"),
+            court_name=court.name,
+            position=position,
+            minutes=Config.WAITLIST_OFFER_MINUTES
+        ),
+        reply_markup=get_waitlist_joined_keyboard(entry_id, lang)
+    )
+
+@router.callback_query(F.data.startswith("waitlist:leave:"))
+async def waitlist_leave_handler(callback: CallbackQuery):
+    """Navbatdan chiqish"""
+    entry_id = int(callback.data.split(":")[2])
+    
+    async with async_session() as session:
+        user = await get_or_create_user(callback.from_user, session)
+        lang = user.language
+    
+    await waitlist_manager.leave(user.id, entry_id)
+    await callback.answer()
+    await callback.message.edit_text(
+        get_text("waitlist_left", lang),
+        reply_markup=get_back_keyboard("back:main", lang)
+    )
+
+@router.callback_query(F.data.startswith("waitlist:accept:"))
+async def waitlist_accept_handler(callback: CallbackQuery, state: FSMContext):
+    """Navbat taklifi qabul qilindi: odatdagi to'lov oqimiga o'tish"""
+    booking_id = int(callback.data.split(":")[2])
+    
+    async with async_session() as session:
+        user = await get_or_create_user(callback.from_user, session)
+        lang = user.language
+        
+        # Taklif faqat HOLD hali tirik bo'lsa qabul qilinadi
+        hold_alive = exists().where(
+            Booking.id == WaitlistEntry.booking_id,
+            Booking.user_id == user.id,
+            Booking.status == BookingStatus.HOLD
+        )
+        accepted = await session.scalar(
+            update(WaitlistEntry)
+            .where(
+                WaitlistEntry.booking_id == booking_id,
+                WaitlistEntry.user_id == user.id,
+                WaitlistEntry.status.in_([WaitlistStatus.OFFERED, WaitlistStatus.ACCEPTED]),
+                hold_alive
+            )
+            .values(status=WaitlistStatus.ACCEPTED)
+            .returning(WaitlistEntry.id)
+            .execution_options(synchronize_session=False)
+        )
+        if accepted is None:
+            # HOLD bekor qilingan yoki muddati o'tgan - taklif yopiladi
+            await session.execute(
+                update(WaitlistEntry)
+                .where(
+                    WaitlistEntry.booking_id == booking_id,
+                    WaitlistEntry.user_id == user.id,
+                    WaitlistEntry.status.in_([WaitlistStatus.OFFERED, WaitlistStatus.ACCEPTED])
+                )
+                .values(status=WaitlistStatus.EXPIRED)
+                .execution_options(synchronize_session=False)
+            )
+        await session.commit()
+    
+    if accepted is None:
+        await callback.answer(get_text("hold_expired", lang), show_alert=True)
+        return
+    
+    await state.update_data(booking_id=booking_id)
+    await state.set_state(BookingStates.processing_payment)
+    await callback.answer()
+    await callback.message.edit_text(
+        get_text("select_payment_method", lang),
+        reply_markup=get_payment_methods_keyboard(lang)
+    )
+
+@router.callback_query(F.data.startswith("waitlist:decline:"))
+async def waitlist_decline_handler(callback: CallbackQuery):
+    """Navbat taklifi rad etildi: slot keyingi mijozga o'tadi"""
+    booking_id = int(callback.data.split(":")[2])
+    
+    async with async_session() as session:
+        user = await get_or_create_user(callback.from_user, session)
+        lang = user.language
+    
+    released = await waitlist_manager.release_offer(user.id, booking_id)
+    await callback.answer()
+    await callback.message.edit_text(
+        get_text("waitlist_declined" if released else "hold_expired", lang)
+    )
 
 # Language change handler
 @router.callback_query(F.data.startswith("lang:"))
@@ -804,6 +1311,7 @@ async def language_change_handler(callback: CallbackQuery):
         user = await get_or_create_user(callback.from_user, session)
         user.language = new_lang
         await session.commit()
+        log_user_action(user.telegram_id, "language_changed", new_lang)
         
         await callback.message.edit_text(
             get_text("main_menu", new_lang),
@@ -837,23 +1345,6 @@ async def show_booking_details(callback: CallbackQuery, booking: Booking,
         reply_markup=get_booking_actions_keyboard(booking.id, can_cancel, lang)
     )
 
-# Admin handlers
-@router.message(Command("admin"))
-async def admin_panel_handler(message: Message):
-    """Admin panel"""
-    async with async_session() as session:
-        user = await get_or_create_user(message.from_user, session)
-        
-        # Admin huquqlarini tekshirish
-        if user.role not in [UserRole.ADMIN, UserRole.OWNER, UserRole.MANAGER]:
-            return
-        
-        lang = user.language
-        await message.answer(
-            get_text("admin_panel", lang),
-            reply_markup=get_admin_main_keyboard(lang)
-        )
-
 # Main menu handlers
 @router.message(F.text.in_([
     "👤 Mening profilim", "👤 Мой профиль"
@@ -932,11 +1423,14 @@ async def error_handler(event, exception: Exception):
     
     return True
 
-# Dispatcher sozlash
+# Dispatcher sozlash (admin panel handlerlari state bo'yicha, shuning uchun oldinroq)
+dp.include_router(admin_router)
 dp.include_router(router)
 
 async def main():
     """Asosiy funksiya"""
+    http_runner = None
+    loop_watchdog = None
     try:
         # Ma'lumotlar bazasini boshlang'ich holatga keltirish
         from database import init_database
@@ -944,6 +1438,30 @@ async def main():
         
         logger.info("Bot ishga tushirilmoqda...")
         
+        # To'lov hodisalari (webhook va reconciliation -> bilet, xabarlar)
+        await event_bus.start()
+        
+        # Webhook'lar va /metrics
+        if Config.METRICS_ENABLED or Config.WEBHOOKS_ENABLED:
+            http_runner = await start_http_server()
+        
+        # Monitoring
+        if Config.WATCHDOG_ENABLED:
+            loop_watchdog = LoopWatchdog()
+            loop_watchdog.start()
+        
+        # To'lov holatlarini solishtirish va outbox (bilet, bildirishnomalar)
+        send_queue.start()
+        await broadcast_engine.resume()
+        if Config.REMINDERS_ENABLED:
+            reminder_scheduler.start()
+        checkin_cache.start()
+        if Config.GUARD_OFFLINE_ENABLED:
+            guard_sync.start()
+        payment_reconciler.start()
+        outbox_worker.start()
+        waitlist_manager.start()
+        
         # Bot ma'lumotlarini olish
         bot_info = await bot.get_me()
         logger.info(f"Bot @{bot_info.username} ishga tushdi")
@@ -954,8 +1472,23 @@ async def main():
     except Exception as e:
         logger.error(f"Bot ishga tushishda xatolik: {e}")
     finally:
+        await payment_reconciler.stop()
+        await outbox_worker.stop()
+        await waitlist_manager.stop()
+        await broadcast_engine.stop()
+        await reminder_scheduler.stop()
+        await checkin_cache.stop()
+        await guard_sync.stop()
+        await asyncio.to_thread(ticket_pdf_renderer.shutdown)
+        await send_queue.stop()
+        if loop_watchdog:
+            await loop_watchdog.stop()
+        if http_runner:
+            await http_runner.cleanup()
+        await event_bus.stop()
         await bot.session.close()
         await payment_manager.close_all_sessions()
 
 if __name__ == "__main__":
+    setup_logging()
     asyncio.run(main())
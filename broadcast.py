@@ -0,0 +1,229 @@
+"""
+Admin broadcast: barcha foydalanuvchilarga partiyalab xabar yuborish
+
+Ishlash tartibi:
+    1. Qabul qiluvchilar `users` jadvalidan id bo'yicha keyset cursor bilan
+       partiyalab o'qiladi va `broadcast_deliveries` ga bulk insert qilinadi.
+       `Broadcast.last_user_id` har partiya bilan birga saqlanadi.
+    2. PENDING yetkazishlar partiyalab send_queue orqali (past ustuvorlikda)
+       yuboriladi, natijalar bitta bulk UPDATE bilan yoziladi.
+
+Jarayon qayta ishga tushsa, RUNNING broadcastlar shu joydan davom etadi.
+Yuborilgan, lekin natijasi yozilmagan xabarlar qayta yuborilishi mumkin.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import Config
+from database import async_session, Broadcast, BroadcastDelivery, BroadcastStatus, DeliveryStatus, User
+from send_queue import send_queue, TelegramSendQueue, PRIORITY_LOW
+
+logger = logging.getLogger(__name__)
+
+def recipients_query(language: Optional[str] = None, vip_only: bool = False):
+    """Broadcast qabul qiluvchilari: bloklanmagan va bildirishnomalari yoqilgan"""
+    query = select(User.id, User.telegram_id).where(
+        User.is_blocked == False,
+        User.notifications_enabled == True
+    )
+    if language:
+        query = query.where(User.language == language)
+    if vip_only:
+        query = query.where(User.is_vip == True)
+    return query
+
+async def count_recipients(session: AsyncSession, language: Optional[str] = None, vip_only: bool = False) -> int:
+    """Qabul qiluvchilar soni (admin tasdiqlashi uchun)"""
+    subquery = recipients_query(language, vip_only).subquery()
+    result = await session.execute(select(func.count()).select_from(subquery))
+    return result.scalar()
+
+class BroadcastEngine:
+    """Broadcastlarni fon rejimida yuboruvchi"""
+
+    def __init__(self, queue: TelegramSendQueue = None, batch_size: int = None, send_batch_size: int = None):
+        self.queue = queue or send_queue
+        self.batch_size = batch_size or Config.BROADCAST_BATCH_SIZE
+        self.send_batch_size = send_batch_size or Config.BROADCAST_SEND_BATCH_SIZE
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    async def create(self, created_by: int, text: str, language: Optional[str] = None,
+                     vip_only: bool = False) -> Broadcast:
+        """Yangi broadcast yaratish va yuborishni boshlash"""
+        async with async_session() as session:
+            broadcast = Broadcast(created_by=created_by, text=text, language=language, vip_only=vip_only)
+            session.add(broadcast)
+            await session.commit()
+
+        self.launch(broadcast.id)
+        return broadcast
+
+    def launch(self, broadcast_id: int):
+        """Broadcastni fon task'ida ishga tushirish (allaqachon ishlayotgan bo'lsa - hech narsa)"""
+        task = self._tasks.get(broadcast_id)
+        if task and not task.done():
+            return
+        task = asyncio.create_task(self._run(broadcast_id))
+        self._tasks[broadcast_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast_id, None))
+
+    async def resume(self):
+        """Qayta ishga tushganda tugallanmagan broadcastlarni davom ettirish"""
+        async with async_session() as session:
+            result = await session.execute(
+                select(Broadcast.id).where(Broadcast.status == BroadcastStatus.RUNNING)
+            )
+            broadcast_ids = result.scalars().all()
+
+        for broadcast_id in broadcast_ids:
+            logger.info(f"Broadcast #{broadcast_id} davom ettirilmoqda")
+            self.launch(broadcast_id)
+
+    async def cancel(self, broadcast_id: int) -> bool:
+        """Broadcastni to'xtatish (joriy partiya tugagach to'xtaydi)"""
+        async with async_session() as session:
+            result = await session.execute(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast_id, Broadcast.status == BroadcastStatus.RUNNING)
+                .values(status=BroadcastStatus.CANCELLED, finished_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        return result.rowcount > 0
+
+    async def stop(self):
+        """Barcha broadcast task'larini to'xtatish (holat bazada saqlanadi)"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, broadcast_id: int):
+        try:
+            await self._collect_recipients(broadcast_id)
+            await self._deliver(broadcast_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"Broadcast #{broadcast_id} xatosi: {e}")
+
+    async def _collect_recipients(self, broadcast_id: int):
+        """
+        Qabul qiluvchilarni users.id bo'yicha keyset cursor bilan partiyalab yozish
+
+        Har bir partiya va cursor holati bitta tranzaksiyada saqlanadi, shuning
+        uchun butun jadval bo'ylab ochiq tranzaksiya/cursor ushlab turilmaydi.
+        """
+        while True:
+            async with async_session() as session:
+                broadcast = await session.get(Broadcast, broadcast_id)
+                if broadcast is None or broadcast.recipients_ready:
+                    return
+
+                result = await session.execute(
+                    recipients_query(broadcast.language, broadcast.vip_only)
+                    .where(User.id > broadcast.last_user_id)
+                    .order_by(User.id)
+                    .limit(self.batch_size)
+                )
+                rows = result.all()
+
+                if rows:
+                    await session.execute(insert(BroadcastDelivery), [
+                        {
+                            'broadcast_id': broadcast_id,
+                            'user_id': row.id,
+                            'chat_id': row.telegram_id,
+                            'status': DeliveryStatus.PENDING
+                        }
+                        for row in rows
+                    ])
+                    broadcast.last_user_id = rows[-1].id
+                    broadcast.total_count += len(rows)
+
+                if len(rows) < self.batch_size:
+                    broadcast.recipients_ready = True
+                await session.commit()
+
+    async def _deliver(self, broadcast_id: int):
+        """PENDING yetkazishlarni partiyalab yuborish"""
+        last_id = 0
+        while True:
+            async with async_session() as session:
+                broadcast = await session.get(Broadcast, broadcast_id)
+                if broadcast is None or broadcast.status != BroadcastStatus.RUNNING:
+                    return
+
+                result = await session.execute(
+                    select(BroadcastDelivery.id, BroadcastDelivery.chat_id)
+                    .where(
+                        BroadcastDelivery.broadcast_id == broadcast_id,
+                        BroadcastDelivery.status == DeliveryStatus.PENDING,
+                        BroadcastDelivery.id > last_id
+                    )
+                    .order_by(BroadcastDelivery.id)
+                    .limit(self.send_batch_size)
+                )
+                rows = result.all()
+
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            results = await asyncio.gather(*(self._send(row.chat_id, broadcast.text) for row in rows))
+            now = datetime.utcnow()
+            sent = sum(1 for status, _ in results if status == DeliveryStatus.SENT)
+
+            async with async_session() as session:
+                await session.execute(update(BroadcastDelivery), [
+                    {
+                        'id': row.id,
+                        'status': status,
+                        'error': error,
+                        'sent_at': now if status == DeliveryStatus.SENT else None
+                    }
+                    for row, (status, error) in zip(rows, results)
+                ])
+                await session.execute(
+                    update(Broadcast)
+                    .where(Broadcast.id == broadcast_id)
+                    .values(
+                        sent_count=Broadcast.sent_count + sent,
+                        failed_count=Broadcast.failed_count + len(rows) - sent
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+
+        async with async_session() as session:
+            await session.execute(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast_id, Broadcast.status == BroadcastStatus.RUNNING)
+                .values(status=BroadcastStatus.DONE, finished_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        logger.info(f"Broadcast #{broadcast_id} yakunlandi")
+
+    async def _send(self, chat_id: int, text: str) -> Tuple[DeliveryStatus, Optional[str]]:
+        try:
+            await self.queue.send_message(chat_id, text, priority=PRIORITY_LOW)
+            return DeliveryStatus.SENT, None
+        except TelegramForbiddenError as e:
+            # Foydalanuvchi botni bloklagan
+            return DeliveryStatus.BLOCKED, str(e)
+        except TelegramBadRequest as e:
+            return DeliveryStatus.FAILED, str(e)
+        except Exception as e:
+            logger.warning(f"Broadcast xabari yuborilmadi (chat {chat_id}): {e}")
+            return DeliveryStatus.FAILED, f"{type(e).__name__}: {e}"
+
+# Global broadcast engine
+broadcast_engine = BroadcastEngine()
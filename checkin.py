@@ -0,0 +1,510 @@
+"""
+Kirishda bilet tekshirish (check-in): QR rasmdan biletgacha
+
+Bosqichlar (har biri o'z vaqt limiti bilan):
+    download - rasm Telegramdan xotiraga yuklanadi (diskka yozilmaydi)
+    decode   - QR thread pool'da dekodlanadi (pyzbar, bo'lmasa OpenCV)
+    lookup   - bilet keshdan (bo'lmasa bazadan) olinadi va bitta atomik UPDATE
+               bilan foydalanilgan deb belgilanadi
+
+Imzolangan token (ticket_tokens.py) lookup dan oldin bazasiz tekshiriladi,
+bugungi biletlar esa xotiradagi keshdan olinadi (CheckinCache).
+
+Dekoder o'rnatilmagan bo'lsa, qo'riqchi bilet ID sini matn sifatida
+yuborishi mumkin.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from io import BytesIO
+from typing import Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.types import Message, PhotoSize
+from PIL import Image
+from sqlalchemy import select, update
+from sqlalchemy.exc import DBAPIError
+
+from config import Config
+from database import async_session, Ticket, Booking, Court, User, TicketStatus
+from metrics import CHECKIN_STAGE_SECONDS
+from utils import get_uzbekistan_time, format_currency, normalize_ticket_id, validate_ticket_id, TICKET_ID_SHAPE
+from ticket_tokens import decode_ticket_token, looks_like_ticket_token, TicketToken
+from guard_mode import guard_sync, read_snapshot, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+try:
+    from pyzbar.pyzbar import decode as zbar_decode, ZBarSymbol
+except ImportError:  # libzbar yoki pyzbar o'rnatilmagan
+    zbar_decode = None
+
+try:
+    import cv2
+    import numpy
+except ImportError:
+    cv2 = None
+
+_decode_executor = ThreadPoolExecutor(max_workers=Config.CHECKIN_DECODE_WORKERS, thread_name_prefix="qr-decode")
+
+class CheckinTimeout(Exception):
+    """Bosqich vaqt limitidan oshdi"""
+
+    def __init__(self, stage: str):
+        super().__init__(stage)
+        self.stage = stage
+
+@dataclass
+class CheckinResult:
+    ok: bool
+    text: str
+
+def decoder_available() -> bool:
+    return zbar_decode is not None or cv2 is not None
+
+def decode_qr(image_bytes: bytes) -> List[str]:
+    """Rasmdagi QR kodlarni dekodlash (sinxron, thread pool'da chaqiriladi)"""
+    image = Image.open(BytesIO(image_bytes)).convert("L")
+
+    if zbar_decode is not None:
+        return [symbol.data.decode("utf-8", "replace") for symbol in zbar_decode(image, symbols=[ZBarSymbol.QRCODE])]
+
+    if cv2 is not None:
+        data, _, _ = cv2.QRCodeDetector().detectAndDecode(numpy.array(image))
+        return [data] if data else []
+
+    raise RuntimeError("QR dekoder o'rnatilmagan (pyzbar yoki opencv)")
+
+def extract_ticket_id(payload: str) -> Optional[str]:
+    """Eski QR (JSON) yoki qo'lda kiritilgan matndan bilet ID sini olish"""
+    payload = payload.strip()
+    if not payload:
+        return None
+    if payload.startswith("{"):
+        try:
+            ticket_id = json.loads(payload).get("ticket_id")
+        except (ValueError, AttributeError):
+            return None
+        return str(ticket_id) if ticket_id else None
+    return payload
+
+def checkin_window_error(start_time: datetime, now: datetime) -> Optional[str]:
+    """Check-in oralig'i (1 soat oldin va 15 daqiqa keyin) tashqarisida bo'lsa - xato matni"""
+    checkin_start = start_time - timedelta(hours=1)
+    checkin_end = start_time + timedelta(minutes=15)
+    
+    if now < checkin_start:
+        return (
+            f"⏰ Check-in vaqti hali kelmagan!\n"
+            f"Check-in: {checkin_start.strftime('%H:%M')} dan"
+        )
+    if now > checkin_end:
+        return (
+            f"⏰ Check-in vaqti o'tib ketgan!\n"
+            f"Bron vaqti: {start_time.strftime('%H:%M')}"
+        )
+    return None
+
+def pick_photo_size(photos: List[PhotoSize]) -> PhotoSize:
+    """QR o'qish uchun yetarli eng kichik o'lcham (katta rasm sekinroq yuklanadi va dekodlanadi)"""
+    for photo in sorted(photos, key=lambda p: p.width * p.height):
+        if min(photo.width, photo.height) >= Config.CHECKIN_MIN_PHOTO_SIDE:
+            return photo
+    return max(photos, key=lambda p: p.width * p.height)
+
+async def _stage(name: str, budget_ms: int, awaitable):
+    """Bosqichni vaqt limiti bilan bajarish va metrikaga yozish"""
+    started = time.perf_counter()
+    try:
+        return await asyncio.wait_for(awaitable, timeout=budget_ms / 1000.0)
+    except asyncio.TimeoutError:
+        raise CheckinTimeout(name)
+    finally:
+        CHECKIN_STAGE_SECONDS.labels(name).observe(time.perf_counter() - started)
+
+async def download_photo(bot: Bot, message: Message) -> bytes:
+    """Rasmni xotiraga yuklash"""
+    photo = pick_photo_size(message.photo)
+    buffer = BytesIO()
+    await bot.download(photo, destination=buffer)
+    return buffer.getvalue()
+
+async def read_qr_payload(bot: Bot, message: Message) -> Optional[str]:
+    """Rasmni yuklab, QR ichidagi matnni olish"""
+    image_bytes = await _stage("download", Config.CHECKIN_DOWNLOAD_BUDGET_MS, download_photo(bot, message))
+
+    loop = asyncio.get_running_loop()
+    payloads = await _stage(
+        "decode", Config.CHECKIN_DECODE_BUDGET_MS,
+        loop.run_in_executor(_decode_executor, decode_qr, image_bytes)
+    )
+
+    for payload in payloads:
+        if payload.strip():
+            return payload
+    return None
+
+@dataclass
+class CachedTicket:
+    """Check-in uchun kerakli bilet ma'lumotlari (4 jadval join natijasi)"""
+    ticket_pk: int
+    ticket_id: str
+    booking_id: int
+    court_id: int
+    court_name: str
+    booking_date: datetime
+    start_time: datetime
+    end_time: datetime
+    customer_name: str
+    phone: str
+    amount: float
+
+    @classmethod
+    def from_row(cls, row) -> "CachedTicket":
+        return cls(
+            ticket_pk=row.ticket_pk,
+            ticket_id=row.ticket_id,
+            booking_id=row.booking_id,
+            court_id=row.court_id,
+            court_name=row.court_name,
+            booking_date=row.booking_date,
+            start_time=row.start_time,
+            end_time=row.end_time,
+            customer_name=f"{row.first_name} {row.last_name or ''}".strip(),
+            phone=row.phone_number,
+            amount=row.final_amount
+        )
+
+def ticket_query():
+    """Bilet, bron, kort va mijoz ma'lumotlari (kesh va kesh topmaganda)"""
+    return (
+        select(
+            Ticket.id.label("ticket_pk"), Ticket.ticket_id, Ticket.status, Ticket.used_at,
+            Booking.id.label("booking_id"), Booking.court_id, Booking.booking_date,
+            Booking.start_time, Booking.end_time, Booking.final_amount,
+            Court.name.label("court_name"),
+            User.first_name, User.last_name, User.phone_number
+        )
+        .join(Booking, Ticket.booking_id == Booking.id)
+        .join(Court, Booking.court_id == Court.id)
+        .join(User, Booking.user_id == User.id)
+    )
+
+class CheckinCache:
+    """
+    Bugungi ACTIVE biletlar keshi (booking_id va ticket_id bo'yicha)
+
+    Har kuni ertalab (CHECKIN_CACHE_PRELOAD_HOUR) qayta yuklanadi va yangi
+    biletlar berilganda to'ldiriladi. Onlayn rejimda biletni foydalanilgan deb
+    belgilash har doim bazada atomik UPDATE bilan bo'ladi, shuning uchun bir
+    nechta worker yoki eskirgan kesh ikki marta kiritmaydi. Ishlatilgan bilet
+    keshdan chiqariladi.
+
+    Oflayn rejim yoqilgan bo'lsa, kesh o'zgarganda imzolangan snapshot sifatida
+    diskka yoziladi (guard_mode.py) va baza ishlamaganda shundan tiklanadi.
+    """
+
+    def __init__(self):
+        self.day = None
+        self._by_booking: Dict[int, CachedTicket] = {}
+        self._by_ticket_id: Dict[str, CachedTicket] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._by_booking)
+
+    def get(self, booking_id: int = None, ticket_id: str = None) -> Optional[CachedTicket]:
+        if booking_id is not None:
+            return self._by_booking.get(booking_id)
+        return self._by_ticket_id.get(ticket_id)
+
+    def add(self, entry: CachedTicket):
+        """Bugungi bilet bo'lsa keshga qo'shish"""
+        if entry.start_time.date() != self.day:
+            return
+        self._by_booking[entry.booking_id] = entry
+        self._by_ticket_id[entry.ticket_id] = entry
+        self._dirty = True
+
+    def discard(self, booking_id: int):
+        entry = self._by_booking.pop(booking_id, None)
+        if entry:
+            self._by_ticket_id.pop(entry.ticket_id, None)
+            self._dirty = True
+
+    async def load(self, day: date = None):
+        """Kun biletlarini yuklash"""
+        day = day or get_uzbekistan_time().date()
+        day_start = datetime.combine(day, datetime.min.time())
+        async with async_session() as session:
+            result = await session.execute(
+                ticket_query().where(
+                    Ticket.status == TicketStatus.ACTIVE,
+                    Booking.start_time >= day_start,
+                    Booking.start_time < day_start + timedelta(days=1)
+                )
+            )
+            rows = result.all()
+
+        self.day = day
+        self._by_booking = {}
+        self._by_ticket_id = {}
+        for row in rows:
+            self.add(CachedTicket.from_row(row))
+        logger.info(f"Check-in keshi yuklandi: {day} - {len(rows)} bilet")
+        await self.save_snapshot()
+
+    async def save_snapshot(self):
+        """Keshni imzolangan snapshot sifatida saqlash (oflayn rejim uchun)"""
+        if not Config.GUARD_OFFLINE_ENABLED or self.day is None:
+            return
+        # Yozish paytidagi o'zgarishlar keyingi snapshot'ga tushadi
+        self._dirty = False
+        try:
+            await asyncio.to_thread(write_snapshot, self.day, list(self._by_booking.values()))
+        except OSError as e:
+            self._dirty = True
+            logger.warning(f"Qo'riqchi snapshot'i saqlanmadi: {e}")
+
+    async def restore_snapshot(self) -> bool:
+        """Baza ishlamaganda bugungi snapshot'dan tiklash"""
+        if not Config.GUARD_OFFLINE_ENABLED:
+            return False
+        day = get_uzbekistan_time().date()
+        tickets = await asyncio.to_thread(read_snapshot, day)
+        if tickets is None:
+            return False
+
+        self.day = day
+        self._by_booking = {}
+        self._by_ticket_id = {}
+        for ticket in tickets:
+            self.add(CachedTicket(**ticket))
+        self._dirty = False
+        logger.warning(f"Check-in keshi snapshot'dan tiklandi: {len(tickets)} bilet")
+        return True
+
+    def add_ticket(self, ticket: Ticket, booking: Booking, court: Court, user: User):
+        """Yangi berilgan biletni keshga qo'shish (bilet yaratilganda)"""
+        if ticket.status != TicketStatus.ACTIVE:
+            return
+        self.add(CachedTicket(
+            ticket_pk=ticket.id,
+            ticket_id=ticket.ticket_id,
+            booking_id=booking.id,
+            court_id=booking.court_id,
+            court_name=court.name,
+            booking_date=booking.booking_date,
+            start_time=booking.start_time,
+            end_time=booking.end_time,
+            customer_name=f"{user.first_name} {user.last_name or ''}".strip(),
+            phone=user.phone_number,
+            amount=booking.final_amount
+        ))
+
+    def start(self):
+        """Keshni yuklash va har kuni yangilash"""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        next_load = None
+        while True:
+            now = get_uzbekistan_time().replace(tzinfo=None)
+            if next_load is None or now >= next_load:
+                try:
+                    await self.load()
+                except Exception as e:
+                    logger.exception(f"Check-in keshini yuklashda xatolik: {e}")
+                    if self.day != now.date():
+                        await self.restore_snapshot()
+                    await asyncio.sleep(60)
+                    continue
+
+                next_load = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+                next_load += timedelta(hours=Config.CHECKIN_CACHE_PRELOAD_HOUR)
+            elif self._dirty:
+                await self.save_snapshot()
+
+            await asyncio.sleep(min(Config.GUARD_SNAPSHOT_INTERVAL, (next_load - now).total_seconds()))
+
+async def check_in_payload(payload: str, checked_by: int) -> CheckinResult:
+    """
+    QR ichidagi matn yoki qo'lda kiritilgan ID bo'yicha check-in
+
+    Imzolangan token avval bazasiz tekshiriladi (imzo va vaqt oralig'i), so'ng
+    bilet keshdan (bo'lmasa bazadan) olinadi. Eski JSON QR va bilet ID lari
+    ticket_id bo'yicha qidiriladi (yangi formatdagi ID ning tekshiruv belgisi
+    oldindan tekshiriladi).
+    """
+    now = get_uzbekistan_time().replace(tzinfo=None)
+    
+    if looks_like_ticket_token(payload):
+        token = decode_ticket_token(payload)
+        if token is None:
+            return CheckinResult(False, "❌ Soxta yoki buzilgan QR kod!")
+        window_error = checkin_window_error(token.start_time, now)
+        if window_error:
+            return CheckinResult(False, window_error)
+        return await _lookup(checked_by, now, token=token)
+    
+    ticket_id = extract_ticket_id(payload)
+    if not ticket_id:
+        return CheckinResult(False, "❌ Bilet topilmadi!")
+    ticket_id = normalize_ticket_id(ticket_id)
+    if TICKET_ID_SHAPE.match(ticket_id) and not validate_ticket_id(ticket_id):
+        # Yangi formatdagi ID da xato (odatda qo'lda yozishda) - bazaga murojaatsiz rad etiladi
+        return CheckinResult(False, "❌ Bilet ID noto'g'ri yozilgan. Qayta tekshirib kiriting.")
+    return await _lookup(checked_by, now, ticket_id=ticket_id)
+
+async def _lookup(checked_by: int, now: datetime, ticket_id: str = None, token: TicketToken = None) -> CheckinResult:
+    """Bazadagi check-in; baza sekin yoki ishlamayotgan bo'lsa - oflayn check-in"""
+    try:
+        return await _stage(
+            "lookup", Config.CHECKIN_LOOKUP_BUDGET_MS,
+            _check_in_ticket(checked_by, now, ticket_id=ticket_id, token=token)
+        )
+    except (CheckinTimeout, DBAPIError) as e:
+        if not Config.GUARD_OFFLINE_ENABLED or checkin_cache.day != now.date():
+            raise
+        logger.warning(f"Baza javob bermadi ({e!r}) - oflayn check-in")
+        return await _check_in_offline(checked_by, now, ticket_id=ticket_id, token=token)
+
+async def _check_in_offline(checked_by: int, now: datetime, ticket_id: str = None,
+                      token: TicketToken = None) -> CheckinResult:
+    """Keshdan tekshirib, USED o'tishini sinxronlash jurnaliga yozish"""
+    booking_id = token.booking_id if token else None
+    await guard_sync.load()
+    entry = checkin_cache.get(booking_id=booking_id, ticket_id=ticket_id)
+    if entry is None:
+        used_at = guard_sync.used_at(booking_id=booking_id, ticket_id=ticket_id)
+        if used_at:
+            return CheckinResult(False, _status_error(TicketStatus.USED, used_at))
+        return CheckinResult(False, "❌ Bilet bugungi faol biletlar ro'yxatida yo'q!")
+    
+    error = _entry_error(entry, now, token)
+    if error:
+        return CheckinResult(False, error)
+    
+    # Jurnalga yozish kutilayotganda ikkinchi skaner o'tib ketmasligi uchun avval keshdan chiqariladi
+    checkin_cache.discard(entry.booking_id)
+    try:
+        await guard_sync.record(entry.ticket_pk, entry.ticket_id, entry.booking_id, checked_by, now)
+    except Exception:
+        checkin_cache.add(entry)
+        raise
+    return CheckinResult(True, _success_text(entry, now) + "\n📴 Oflayn tekshirildi - baza tiklanganda sinxronlanadi")
+
+def _status_error(status: TicketStatus, used_at: Optional[datetime]) -> str:
+    if status == TicketStatus.USED:
+        return (
+            f"⚠️ Bilet allaqachon foydalanilgan!\n"
+            f"Foydalanilgan vaqt: {used_at.strftime('%d.%m.%Y %H:%M')}"
+        )
+    return f"❌ Bilet holati: {status.value}"
+
+def _entry_error(entry: CachedTicket, now: datetime, token: Optional[TicketToken]) -> Optional[str]:
+    if token is not None and (token.court_id != entry.court_id or token.start_time != entry.start_time):
+        # Bron o'zgartirilgan - eski QR endi yaroqsiz
+        return "❌ Bilet ma'lumotlari bronga mos emas!"
+    # Vaqtni tekshirish (start_time mahalliy vaqtda saqlanadi)
+    return checkin_window_error(entry.start_time, now)
+
+def _success_text(entry: CachedTicket, now: datetime) -> str:
+    return f"""
+✅ Bilet muvaffaqiyatli tekshirildi!
+
+🎫 Bilet ID: {entry.ticket_id}
+👤 Mijoz: {entry.customer_name}
+📱 Telefon: {entry.phone}
+🏟 Kort: {entry.court_name}
+📅 Sana: {entry.booking_date.strftime('%d.%m.%Y')}
+⏰ Vaqt: {entry.start_time.strftime('%H:%M')}-{entry.end_time.strftime('%H:%M')}
+💰 Narx: {format_currency(entry.amount)}
+
+✅ Check-in: {now.strftime('%H:%M')}
+        """
+
+async def _check_in_ticket(checked_by: int, now: datetime, ticket_id: str = None,
+                           token: TicketToken = None) -> CheckinResult:
+    entry = checkin_cache.get(booking_id=token.booking_id if token else None, ticket_id=ticket_id)
+    
+    async with async_session() as session:
+        if entry is None:
+            # Keshda yo'q (boshqa kun yoki boshqa workerda berilgan bilet)
+            query = ticket_query()
+            if token is not None:
+                query = query.where(Ticket.booking_id == token.booking_id)
+            else:
+                query = query.where(Ticket.ticket_id == ticket_id)
+            row = (await session.execute(query)).first()
+            
+            if not row:
+                return CheckinResult(False, "❌ Bilet topilmadi!")
+            if row.status != TicketStatus.ACTIVE:
+                return CheckinResult(False, _status_error(row.status, row.used_at))
+            
+            entry = CachedTicket.from_row(row)
+            checkin_cache.add(entry)
+        
+        error = _entry_error(entry, now, token)
+        if error:
+            return CheckinResult(False, error)
+        
+        # Biletni foydalanilgan deb belgilash: faqat hali ACTIVE bo'lsa (ikki marta skanerlash rad etiladi)
+        result = await session.execute(
+            update(Ticket)
+            .where(Ticket.id == entry.ticket_pk, Ticket.status == TicketStatus.ACTIVE)
+            .values(status=TicketStatus.USED, used_at=now, checked_in_by=checked_by)
+            .returning(Ticket.id)
+            .execution_options(synchronize_session=False)
+        )
+        if result.first() is None:
+            await session.rollback()
+            current = (await session.execute(
+                select(Ticket.status, Ticket.used_at).where(Ticket.id == entry.ticket_pk)
+            )).first()
+            checkin_cache.discard(entry.booking_id)
+            if current is None:
+                return CheckinResult(False, "❌ Bilet topilmadi!")
+            return CheckinResult(False, _status_error(current.status, current.used_at))
+        
+        await session.commit()
+    
+    # Ishlatilgan bilet keshdan chiqariladi (snapshot ham yangilanadi)
+    checkin_cache.discard(entry.booking_id)
+    return CheckinResult(True, _success_text(entry, now))
+
+STAGE_TIMEOUT_TEXTS = {
+    'download': "⏱ Rasm yuklanmadi. Qayta yuboring yoki bilet ID sini yozing.",
+    'decode': "⏱ QR kod o'qilmadi. Yaqinroqdan qayta suratga oling yoki bilet ID sini yozing.",
+    'lookup': "⏱ Baza javob bermadi. Bir necha soniyadan keyin qayta urinib ko'ring.",
+}
+
+async def check_in_photo(bot: Bot, message: Message, checked_by: int) -> CheckinResult:
+    """QR rasm bo'yicha to'liq check-in"""
+    if not decoder_available():
+        return CheckinResult(False, "⚠️ QR dekoder o'rnatilmagan. Bilet ID sini matn sifatida yuboring.")
+
+    try:
+        payload = await read_qr_payload(bot, message)
+        if not payload:
+            return CheckinResult(False, "❌ Rasmda QR kod topilmadi. Qayta suratga oling yoki bilet ID sini yozing.")
+        return await check_in_payload(payload, checked_by)
+    except CheckinTimeout as e:
+        logger.warning(f"Check-in {e.stage} bosqichi vaqt limitidan oshdi")
+        return CheckinResult(False, STAGE_TIMEOUT_TEXTS[e.stage])
+
+# Global check-in keshi (bot.main da ishga tushiriladi)
+checkin_cache = CheckinCache()
@@ -39,17 +39,25 @@ class Config:
     REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
     REDIS_DB = int(os.getenv("REDIS_DB", "0"))
     
+    # Event bus: memory, redis yoki postgres (bir nechta worker uchun)
+    EVENT_BUS_BACKEND = os.getenv("EVENT_BUS_BACKEND", "memory")
+    EVENT_BUS_CHANNEL = os.getenv("EVENT_BUS_CHANNEL", "tennis_bot_events")
+    
     # To'lov tizimlari
     # Payme
     PAYME_MERCHANT_ID = os.getenv("PAYME_MERCHANT_ID")
     PAYME_SECRET_KEY = os.getenv("PAYME_SECRET_KEY")
     PAYME_TEST_MODE = os.getenv("PAYME_TEST_MODE", "True").lower() == "true"
+    PAYME_API_URL = os.getenv("PAYME_API_URL")  # Simulyator yoki proxy uchun (bo'sh bo'lsa standart URL)
+    PAYME_STATEMENT_INTERVAL = float(os.getenv("PAYME_STATEMENT_INTERVAL", "5"))  # GetStatement oralig'i (sekund)
+    PAYME_STATEMENT_LOOKBACK_HOURS = int(os.getenv("PAYME_STATEMENT_LOOKBACK_HOURS", "24"))
     
     # Click
     CLICK_MERCHANT_ID = os.getenv("CLICK_MERCHANT_ID")
     CLICK_SERVICE_ID = os.getenv("CLICK_SERVICE_ID")
     CLICK_SECRET_KEY = os.getenv("CLICK_SECRET_KEY")
     CLICK_TEST_MODE = os.getenv("CLICK_TEST_MODE", "True").lower() == "true"
+    CLICK_API_URL = os.getenv("CLICK_API_URL")
     
     # Uzum Pay
     UZUM_MERCHANT_ID = os.getenv("UZUM_MERCHANT_ID")
@@ -68,11 +76,42 @@ class Config:
     DEFAULT_LANGUAGE = os.getenv("DEFAULT_LANGUAGE", "uz")
     TIMEZONE = os.getenv("TIMEZONE", "Asia/Tashkent")
     BOOKING_HOLD_MINUTES = int(os.getenv("BOOKING_HOLD_MINUTES", "5"))
+    # Navbat (waitlist): bo'shagan slot navbatdagi birinchi mijozga shu muddatga ushlab turiladi
+    WAITLIST_OFFER_MINUTES = int(os.getenv("WAITLIST_OFFER_MINUTES", "5"))
+    WAITLIST_SWEEP_INTERVAL = float(os.getenv("WAITLIST_SWEEP_INTERVAL", "10"))  # sekund
     CANCELLATION_HOURS = int(os.getenv("CANCELLATION_HOURS", "6"))
     
     # VAQTINCHA REJIM - To'lovni qo'lda tasdiqlash
     MANUAL_PAYMENT_MODE = os.getenv("MANUAL_PAYMENT_MODE", "True").lower() == "true"
     
+    # To'lov provayderlari HTTP klienti
+    PAYMENT_HTTP_CONNECT_TIMEOUT = float(os.getenv("PAYMENT_HTTP_CONNECT_TIMEOUT", "3"))  # sekund
+    PAYMENT_HTTP_READ_TIMEOUT = float(os.getenv("PAYMENT_HTTP_READ_TIMEOUT", "10"))  # sekund
+    PAYMENT_HTTP_POOL_SIZE = int(os.getenv("PAYMENT_HTTP_POOL_SIZE", "20"))
+    PAYMENT_HTTP_RETRIES = int(os.getenv("PAYMENT_HTTP_RETRIES", "2"))
+    PAYMENT_HTTP_BACKOFF = float(os.getenv("PAYMENT_HTTP_BACKOFF", "0.2"))  # sekund
+    PAYMENT_CIRCUIT_FAILURES = int(os.getenv("PAYMENT_CIRCUIT_FAILURES", "5"))
+    PAYMENT_CIRCUIT_RESET_SECONDS = float(os.getenv("PAYMENT_CIRCUIT_RESET_SECONDS", "30"))
+    
+    # To'lov holatlarini solishtirish (reconciliation)
+    PAYMENT_RECONCILE_INTERVAL = float(os.getenv("PAYMENT_RECONCILE_INTERVAL", "5"))  # sekund
+    PAYMENT_RECONCILE_MAX_BACKOFF = float(os.getenv("PAYMENT_RECONCILE_MAX_BACKOFF", "120"))  # sekund
+    PAYMENT_RECONCILE_BATCH_SIZE = int(os.getenv("PAYMENT_RECONCILE_BATCH_SIZE", "50"))
+    PAYMENT_RECONCILE_CONCURRENCY = int(os.getenv("PAYMENT_RECONCILE_CONCURRENCY", "10"))
+    PAYMENT_DEADLINE_MINUTES = int(os.getenv("PAYMENT_DEADLINE_MINUTES", "30"))
+    # Webhook'lar ishlaganda provayderlarni so'rab turish shart emas (faqat deadline tekshiriladi)
+    PAYMENT_POLLING_ENABLED = os.getenv("PAYMENT_POLLING_ENABLED", "True").lower() == "true"
+    
+    # Transactional outbox (bilet berish va bildirishnomalar)
+    OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "8"))
+    OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+    OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "2"))  # sekund
+    OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "120"))  # sekund
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+    OUTBOX_MAX_BACKOFF = float(os.getenv("OUTBOX_MAX_BACKOFF", "300"))  # sekund
+    # Bir vaqtda provayderga yuboriladigan qaytarish so'rovlari
+    REFUND_CONCURRENCY = int(os.getenv("REFUND_CONCURRENCY", "4"))
+    
     # Narxlar (so'mda)
     BASE_PRICE_PEAK = float(os.getenv("BASE_PRICE_PEAK", "50000"))
     BASE_PRICE_OFFPEAK = float(os.getenv("BASE_PRICE_OFFPEAK", "30000"))
@@ -85,15 +124,76 @@ class Config:
     PEAK_END_HOUR = int(os.getenv("PEAK_END_HOUR", "22"))
     COURT_OPEN_HOUR = int(os.getenv("COURT_OPEN_HOUR", "6"))
     COURT_CLOSE_HOUR = int(os.getenv("COURT_CLOSE_HOUR", "23"))
+    BOOKINGS_PAGE_SIZE = int(os.getenv("BOOKINGS_PAGE_SIZE", "5"))  # "Buyurtmalarim" sahifasi
     
     # Fayl yo'llari
     UPLOAD_PATH = os.getenv("UPLOAD_PATH", "./uploads")
     REPORTS_PATH = os.getenv("REPORTS_PATH", "./reports")
     TICKETS_PATH = os.getenv("TICKETS_PATH", "./tickets")
+    PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "2"))  # bilet PDF jarayonlari
+    PDF_RENDER_CHUNK_SIZE = int(os.getenv("PDF_RENDER_CHUNK_SIZE", "50"))  # bitta vazifadagi PDF lar
+    
+    # Bilet rasmlari (asset store): local yoki s3
+    ASSET_STORE_BACKEND = os.getenv("ASSET_STORE_BACKEND", "local")
+    ASSET_STORE_MAX_MB = int(os.getenv("ASSET_STORE_MAX_MB", "200"))  # local diskdagi chegara
+    ASSET_STORE_BUCKET = os.getenv("ASSET_STORE_BUCKET")
+    ASSET_STORE_PREFIX = os.getenv("ASSET_STORE_PREFIX", "tickets/")
+    ASSET_STORE_ENDPOINT_URL = os.getenv("ASSET_STORE_ENDPOINT_URL")  # S3 mos servislar uchun
     
     # Logging
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_DIR = os.getenv("LOG_DIR", "logs")
     LOG_FILE = os.getenv("LOG_FILE", "bot.log")
+    AUDIT_LOG_FILE = os.getenv("AUDIT_LOG_FILE", "audit.log")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # json yoki text
+    DB_ECHO = os.getenv("DB_ECHO", "False").lower() == "true"
+    
+    # HTTP server (to'lov webhook'lari va /metrics)
+    HTTP_HOST = os.getenv("HTTP_HOST", os.getenv("METRICS_HOST", "0.0.0.0"))
+    HTTP_PORT = int(os.getenv("PORT", os.getenv("METRICS_PORT", "9100")))
+    WEBHOOKS_ENABLED = os.getenv("WEBHOOKS_ENABLED", "True").lower() == "true"
+    
+    # Monitoring (Prometheus /metrics)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+    
+    # Event loop watchdog
+    WATCHDOG_ENABLED = os.getenv("WATCHDOG_ENABLED", "True").lower() == "true"
+    WATCHDOG_INTERVAL = float(os.getenv("WATCHDOG_INTERVAL", "0.1"))
+    WATCHDOG_THRESHOLD_MS = int(os.getenv("WATCHDOG_THRESHOLD_MS", "250"))
+    
+    # Telegramga chiquvchi xabarlar navbati (flood limitlar)
+    TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))  # xabar/s
+    TELEGRAM_CHAT_INTERVAL = float(os.getenv("TELEGRAM_CHAT_INTERVAL", "1"))  # sekund
+    TELEGRAM_SEND_MAX_RETRIES = int(os.getenv("TELEGRAM_SEND_MAX_RETRIES", "3"))
+    
+    # Admin broadcast
+    BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", "1000"))  # qabul qiluvchilar partiyasi
+    BROADCAST_SEND_BATCH_SIZE = int(os.getenv("BROADCAST_SEND_BATCH_SIZE", "100"))
+    
+    # Check-in (QR tekshirish): bosqichlar uchun vaqt limiti
+    CHECKIN_DOWNLOAD_BUDGET_MS = int(os.getenv("CHECKIN_DOWNLOAD_BUDGET_MS", "500"))
+    CHECKIN_DECODE_BUDGET_MS = int(os.getenv("CHECKIN_DECODE_BUDGET_MS", "300"))
+    CHECKIN_LOOKUP_BUDGET_MS = int(os.getenv("CHECKIN_LOOKUP_BUDGET_MS", "200"))
+    CHECKIN_DECODE_WORKERS = int(os.getenv("CHECKIN_DECODE_WORKERS", "2"))
+    CHECKIN_MIN_PHOTO_SIDE = int(os.getenv("CHECKIN_MIN_PHOTO_SIDE", "600"))  # piksel
+    CHECKIN_CACHE_PRELOAD_HOUR = int(os.getenv("CHECKIN_CACHE_PRELOAD_HOUR", "5"))  # bugungi biletlar keshi
+    
+    # Qo'riqchi oflayn rejimi (baza sekinlashganda keshdan check-in)
+    GUARD_OFFLINE_ENABLED = os.getenv("GUARD_OFFLINE_ENABLED", "True").lower() == "true"
+    GUARD_SNAPSHOT_PATH = os.getenv("GUARD_SNAPSHOT_PATH", "./data/guard_snapshot.json")
+    GUARD_SNAPSHOT_INTERVAL = int(os.getenv("GUARD_SNAPSHOT_INTERVAL", "60"))  # sekund
+    GUARD_SYNC_LOG_PATH = os.getenv("GUARD_SYNC_LOG_PATH", "./data/guard_sync.jsonl")
+    GUARD_CONFLICTS_LOG_PATH = os.getenv("GUARD_CONFLICTS_LOG_PATH", "./data/guard_conflicts.jsonl")
+    GUARD_SYNC_INTERVAL = int(os.getenv("GUARD_SYNC_INTERVAL", "15"))  # sekund
+    GUARD_SYNC_BATCH_SIZE = int(os.getenv("GUARD_SYNC_BATCH_SIZE", "200"))
+    
+    # Bron eslatmalari (start_time dan necha soat oldin)
+    REMINDERS_ENABLED = os.getenv("REMINDERS_ENABLED", "True").lower() == "true"
+    REMINDER_HOURS = [int(hours) for hours in os.getenv("REMINDER_HOURS", "24,1").split(",") if hours.strip()]
+    REMINDER_BUCKET_SECONDS = int(os.getenv("REMINDER_BUCKET_SECONDS", "60"))
+    REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "200"))
+    REMINDER_GRACE_MINUTES = int(os.getenv("REMINDER_GRACE_MINUTES", "15"))  # kechikkan eslatma hali yuboriladi
+    REMINDER_REBUILD_MINUTES = int(os.getenv("REMINDER_REBUILD_MINUTES", "60"))
     
     @classmethod
     def get_timezone(cls):
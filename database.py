@@ -2,7 +2,7 @@ import os
 import asyncpg
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import String, Integer, BigInteger, DateTime, Boolean, Text, Float, ForeignKey, Enum
+from sqlalchemy import String, Integer, BigInteger, DateTime, Boolean, Text, Float, ForeignKey, Enum, Index
 from datetime import datetime
 from typing import Optional, List
 import enum
@@ -15,7 +15,8 @@ from config import Config
 DATABASE_URL = Config.get_database_url()
 
 # SQLAlchemy engine va session
-engine = create_async_engine(DATABASE_URL, echo=True)
+# SQL loglari Config.DB_ECHO orqali logging_setup da yoqiladi
+engine = create_async_engine(DATABASE_URL, echo=False)
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 class Base(DeclarativeBase):
@@ -57,6 +58,30 @@ class TicketStatus(enum.Enum):
     EXPIRED = "expired"
     CANCELLED = "cancelled"
 
+class OutboxStatus(enum.Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+
+class WaitlistStatus(enum.Enum):
+    WAITING = "waiting"
+    OFFERED = "offered"
+    ACCEPTED = "accepted"
+    EXPIRED = "expired"
+    CANCELLED = "cancelled"
+
+class BroadcastStatus(enum.Enum):
+    RUNNING = "running"
+    DONE = "done"
+    CANCELLED = "cancelled"
+
+class DeliveryStatus(enum.Enum):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    BLOCKED = "blocked"
+
 # Models
 class User(Base):
     __tablename__ = "users"
@@ -97,6 +122,10 @@ class Court(Base):
 
 class Booking(Base):
     __tablename__ = "bookings"
+    __table_args__ = (
+        # "Buyurtmalarim" sahifalari: (start_time, id) bo'yicha keyset
+        Index("ix_bookings_user_start", "user_id", "start_time", "id"),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
@@ -126,6 +155,11 @@ class Booking(Base):
 
 class Payment(Base):
     __tablename__ = "payments"
+    __table_args__ = (
+        # Webhook idempotentligi uchun kalitlar (NULL lar takrorlanishi mumkin)
+        Index("uq_payments_transaction_id", "transaction_id", unique=True),
+        Index("uq_payments_external_payment_id", "external_payment_id", unique=True),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     booking_id: Mapped[int] = mapped_column(Integer, ForeignKey("bookings.id"), unique=True, nullable=False)
@@ -138,6 +172,11 @@ class Payment(Base):
     payment_url: Mapped[Optional[str]] = mapped_column(Text)
     error_message: Mapped[Optional[str]] = mapped_column(Text)
     paid_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    # Provayder vaqtlari (millisekund, Payme protokoli bo'yicha)
+    provider_create_time: Mapped[Optional[int]] = mapped_column(BigInteger)
+    provider_perform_time: Mapped[Optional[int]] = mapped_column(BigInteger)
+    provider_cancel_time: Mapped[Optional[int]] = mapped_column(BigInteger)
+    cancel_reason: Mapped[Optional[int]] = mapped_column(Integer)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -202,12 +241,127 @@ class Settings(Base):
     updated_by: Mapped[Optional[int]] = mapped_column(BigInteger, ForeignKey("users.id"))
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class WaitlistEntry(Base):
+    """Band slot uchun navbat (court, slot boshlanishi); navbat tartibi - id"""
+    __tablename__ = "waitlist"
+    __table_args__ = (
+        Index("ix_waitlist_slot_status", "court_id", "slot_start", "status", "id"),
+        Index("ix_waitlist_booking", "booking_id"),
+    )
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    court_id: Mapped[int] = mapped_column(Integer, ForeignKey("courts.id"), nullable=False)
+    slot_start: Mapped[datetime] = mapped_column(DateTime, nullable=False)  # mahalliy vaqt
+    status: Mapped[WaitlistStatus] = mapped_column(Enum(WaitlistStatus), default=WaitlistStatus.WAITING)
+    # Taklif qilingan HOLD bron
+    booking_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("bookings.id"))
+    offered_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
 # Database funksiyalari
 async def create_tables():
     """Ma'lumotlar bazasi jadvallarini yaratish"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
+class OutboxMessage(Base):
+    """Holat o'zgarishi bilan bitta tranzaksiyada yoziladigan yon ta'sirlar (bilet, xabar)"""
+    __tablename__ = "outbox"
+    __table_args__ = (
+        Index("ix_outbox_status_available_at", "status", "available_at"),
+    )
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(50), nullable=False)
+    payload: Mapped[str] = mapped_column(Text, nullable=False)  # JSON
+    status: Mapped[OutboxStatus] = mapped_column(Enum(OutboxStatus), default=OutboxStatus.PENDING)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    available_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    locked_until: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    last_error: Mapped[Optional[str]] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    processed_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+
+class Broadcast(Base):
+    """Admin tomonidan barcha (yoki tanlangan) foydalanuvchilarga yuboriladigan xabar"""
+    __tablename__ = "broadcasts"
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    created_by: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    language: Mapped[Optional[str]] = mapped_column(String(5))  # None - barcha tillar
+    vip_only: Mapped[bool] = mapped_column(Boolean, default=False)
+    status: Mapped[BroadcastStatus] = mapped_column(Enum(BroadcastStatus), default=BroadcastStatus.RUNNING)
+    # Qabul qiluvchilar users.id bo'yicha tartibda yoziladi; qayta ishga tushishda shu joydan davom etadi
+    last_user_id: Mapped[int] = mapped_column(Integer, default=0)
+    recipients_ready: Mapped[bool] = mapped_column(Boolean, default=False)
+    total_count: Mapped[int] = mapped_column(Integer, default=0)
+    sent_count: Mapped[int] = mapped_column(Integer, default=0)
+    failed_count: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+
+class BroadcastDelivery(Base):
+    """Broadcast xabarining har bir qabul qiluvchiga yetkazilish holati"""
+    __tablename__ = "broadcast_deliveries"
+    __table_args__ = (
+        Index("uq_broadcast_deliveries_user", "broadcast_id", "user_id", unique=True),
+        Index("ix_broadcast_deliveries_status", "broadcast_id", "status"),
+    )
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    broadcast_id: Mapped[int] = mapped_column(Integer, ForeignKey("broadcasts.id"), nullable=False)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    status: Mapped[DeliveryStatus] = mapped_column(Enum(DeliveryStatus), default=DeliveryStatus.PENDING)
+    error: Mapped[Optional[str]] = mapped_column(Text)
+    sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+
+class BookingReminder(Base):
+    """Yuborilgan bron eslatmalari (qayta ishga tushganda takrorlanmasligi uchun)"""
+    __tablename__ = "booking_reminders"
+    __table_args__ = (
+        Index("uq_booking_reminders_kind", "booking_id", "kind", unique=True),
+    )
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    booking_id: Mapped[int] = mapped_column(Integer, ForeignKey("bookings.id"), nullable=False)
+    kind: Mapped[str] = mapped_column(String(10), nullable=False)  # "24h", "1h"
+    sent_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+# Mavjud jadvallarga qo'shilgan ustunlar va indekslar (create_all ularni qo'shmaydi)
+SCHEMA_COLUMNS = {
+    "payments": {
+        "provider_create_time": "BIGINT",
+        "provider_perform_time": "BIGINT",
+        "provider_cancel_time": "BIGINT",
+        "cancel_reason": "INTEGER",
+    },
+}
+SCHEMA_INDEXES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_payments_transaction_id ON payments (transaction_id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_payments_external_payment_id ON payments (external_payment_id)",
+    "CREATE INDEX IF NOT EXISTS ix_bookings_user_start ON bookings (user_id, start_time, id)",
+]
+
+async def ensure_schema():
+    """Yetishmayotgan ustun va indekslarni qo'shish (qayta ishga tushirishda xavfsiz)"""
+    from sqlalchemy import inspect, text
+    
+    def existing_columns(sync_conn, table):
+        return {column["name"] for column in inspect(sync_conn).get_columns(table)}
+    
+    async with engine.begin() as conn:
+        for table, columns in SCHEMA_COLUMNS.items():
+            existing = await conn.run_sync(existing_columns, table)
+            for name, ddl_type in columns.items():
+                if name not in existing:
+                    await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl_type}"))
+        
+        for statement in SCHEMA_INDEXES:
+            await conn.execute(text(statement))
+
 async def get_session():
     """Database session olish"""
     async with async_session() as session:
@@ -219,6 +373,7 @@ async def get_session():
 async def init_database():
     """Ma'lumotlar bazasini boshlang'ich ma'lumotlar bilan to'ldirish"""
     await create_tables()
+    await ensure_schema()
     
     async with async_session() as session:
         # Standart kortlarni yaratish
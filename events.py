@@ -0,0 +1,163 @@
+"""
+Ichki hodisalar shinasi (event bus): payment.paid, payment.failed, ...
+
+Backend Config.EVENT_BUS_BACKEND orqali tanlanadi:
+    memory    - bitta jarayon ichida (standart)
+    redis     - Redis pub/sub, bir nechta worker uchun
+    postgres  - PostgreSQL LISTEN/NOTIFY, qo'shimcha servis kerak emas
+
+Taqsimlangan backendlarda hodisa har bir workerga yetib boradi, shuning
+uchun obunachilar idempotent bo'lishi kerak.
+"""
+
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_PAID = "payment.paid"
+PAYMENT_FAILED = "payment.failed"
+
+EventHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+class EventBus:
+    """Jarayon ichidagi (in-memory) event bus"""
+
+    def __init__(self):
+        self._handlers: Dict[str, List[EventHandler]] = defaultdict(list)
+        self._tasks: Set[asyncio.Task] = set()
+
+    def subscribe(self, event_type: str, handler: EventHandler):
+        """Hodisaga obuna bo'lish"""
+        self._handlers[event_type].append(handler)
+
+    async def publish(self, event_type: str, payload: Dict[str, Any]):
+        """Hodisani e'lon qilish (obunachilar alohida task'larda ishlaydi)"""
+        self._dispatch(event_type, payload)
+
+    def _dispatch(self, event_type: str, payload: Dict[str, Any]):
+        for handler in self._handlers.get(event_type, []):
+            task = asyncio.create_task(self._run_handler(handler, event_type, payload))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_handler(self, handler: EventHandler, event_type: str, payload: Dict[str, Any]):
+        try:
+            await handler(payload)
+        except Exception:
+            logger.exception(f"Event handler xatosi: {event_type} {getattr(handler, '__name__', handler)}")
+
+    async def start(self):
+        """Backend ulanishini ochish"""
+        pass
+
+    async def drain(self):
+        """Ishlayotgan obunachilar tugashini kutish"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def stop(self):
+        """Ishlayotgan obunachilarni kutib, ulanishni yopish"""
+        await self.drain()
+
+    @staticmethod
+    def _encode(event_type: str, payload: Dict[str, Any]) -> str:
+        return json.dumps({'type': event_type, 'payload': payload}, default=str)
+
+    def _receive(self, message: str):
+        """Tashqi backenddan kelgan xabarni obunachilarga tarqatish"""
+        try:
+            event = json.loads(message)
+            self._dispatch(event['type'], event.get('payload', {}))
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"Noto'g'ri event xabari: {message!r}")
+
+class RedisEventBus(EventBus):
+    """Redis pub/sub orqali workerlar o'rtasida hodisa almashish"""
+
+    def __init__(self, url: str = None, channel: str = None):
+        super().__init__()
+        self.url = url or Config.REDIS_URL
+        self.channel = channel or Config.EVENT_BUS_CHANNEL
+        self._redis = None
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(self.url)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(self.channel)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        async for message in self._pubsub.listen():
+            data = message.get('data')
+            if isinstance(data, bytes):
+                data = data.decode()
+            self._receive(data)
+
+    async def publish(self, event_type: str, payload: Dict[str, Any]):
+        # O'zimizga ham pub/sub orqali qaytib keladi
+        await self._redis.publish(self.channel, self._encode(event_type, payload))
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+        if self._pubsub:
+            await self._pubsub.unsubscribe(self.channel)
+            await self._pubsub.close()
+        if self._redis:
+            await self._redis.close()
+        await super().stop()
+
+class PostgresEventBus(EventBus):
+    """PostgreSQL LISTEN/NOTIFY orqali workerlar o'rtasida hodisa almashish"""
+
+    def __init__(self, dsn: str = None, channel: str = None):
+        super().__init__()
+        # asyncpg SQLAlchemy dialekt prefiksini tushunmaydi
+        self.dsn = (dsn or Config.get_database_url()).replace("postgresql+asyncpg://", "postgresql://")
+        self.channel = channel or Config.EVENT_BUS_CHANNEL
+        self._listen_conn = None
+        self._pool = None
+
+    async def start(self):
+        import asyncpg
+
+        self._listen_conn = await asyncpg.connect(self.dsn)
+        await self._listen_conn.add_listener(self.channel, self._on_notify)
+        self._pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=2)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self._receive(payload)
+
+    async def publish(self, event_type: str, payload: Dict[str, Any]):
+        await self._pool.execute("SELECT pg_notify($1, $2)", self.channel, self._encode(event_type, payload))
+
+    async def stop(self):
+        if self._listen_conn:
+            await self._listen_conn.remove_listener(self.channel, self._on_notify)
+            await self._listen_conn.close()
+        if self._pool:
+            await self._pool.close()
+        await super().stop()
+
+def create_event_bus(backend: str = None) -> EventBus:
+    """Konfiguratsiya bo'yicha event bus yaratish"""
+    backend = (backend or Config.EVENT_BUS_BACKEND).lower()
+    if backend == "redis":
+        return RedisEventBus()
+    if backend in ("postgres", "postgresql"):
+        return PostgresEventBus()
+    return EventBus()
+
+# Global event bus
+event_bus = create_event_bus()
@@ -0,0 +1,287 @@
+"""
+Qo'riqchi rejimi: baza sekinlashganda ham kirishni to'xtatmaslik
+
+    - Snapshot: bugungi faol biletlar (check-in keshi) imzolangan JSON fayl
+      sifatida diskka yoziladi. Bot baza ishlamayotgan paytda qayta ishga
+      tushsa, kesh shu fayldan tiklanadi (imzo va sana tekshiriladi).
+    - Oflayn check-in: lookup bosqichi vaqt limitidan oshsa yoki baza xato
+      bersa, bilet keshdan tekshiriladi va USED o'tishi sinxronlash jurnaliga
+      (JSONL, har yozuvdan keyin fsync) qo'shiladi. Disk bilan ishlash
+      event loop'ni to'xtatmaslik uchun alohida thread'da bajariladi.
+    - Sinxronlash: jurnal partiyalab bitta shartli UPDATE bilan bazaga
+      yoziladi. Bazada bilet allaqachon boshqa qo'riqchi tomonidan ishlatilgan
+      yoki bekor qilingan bo'lsa - bu konflikt sifatida alohida jurnalga
+      yoziladi va logga chiqariladi.
+"""
+
+import asyncio
+import dataclasses
+import hashlib
+import hmac
+import json
+import logging
+import os
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import case, select, update
+from sqlalchemy.exc import DBAPIError
+
+from config import Config
+from database import async_session, Ticket, TicketStatus
+from metrics import GUARD_OFFLINE_CHECKINS, GUARD_SYNC_CONFLICTS, GUARD_SYNC_PENDING
+from utils import get_uzbekistan_time
+
+logger = logging.getLogger(__name__)
+
+def _signing_key() -> bytes:
+    return hmac.new(Config.SECRET_KEY.encode("utf-8"), b"guard-snapshot", hashlib.sha256).digest()
+
+def _sign(day: str, tickets: List[Dict[str, Any]]) -> str:
+    body = json.dumps({"day": day, "tickets": tickets}, sort_keys=True, ensure_ascii=False, default=str)
+    return hmac.new(_signing_key(), body.encode("utf-8"), hashlib.sha256).hexdigest()
+
+def _write_atomic(path: str, content: str):
+    """Faylni yarim yozilgan holatda qoldirmasdan almashtirish"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def write_snapshot(day: date, entries: Iterable[Any], path: str = None):
+    """Kun biletlarini imzolangan snapshot sifatida saqlash (entries - dataclass'lar)"""
+    tickets = [
+        {key: value.isoformat() if isinstance(value, datetime) else value
+         for key, value in dataclasses.asdict(entry).items()}
+        for entry in entries
+    ]
+    day_str = day.isoformat()
+    _write_atomic(path or Config.GUARD_SNAPSHOT_PATH, json.dumps({
+        "day": day_str,
+        "created_at": get_uzbekistan_time().isoformat(),
+        "tickets": tickets,
+        "signature": _sign(day_str, tickets)
+    }, ensure_ascii=False))
+
+def read_snapshot(day: date, path: str = None) -> Optional[List[Dict[str, Any]]]:
+    """Snapshot'ni o'qish; boshqa kun, buzilgan yoki imzosi noto'g'ri bo'lsa - None"""
+    path = path or Config.GUARD_SNAPSHOT_PATH
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Qo'riqchi snapshot'i o'qilmadi: {e}")
+        return None
+
+    if data.get("day") != day.isoformat():
+        return None
+    if not hmac.compare_digest(str(data.get("signature", "")), _sign(data["day"], data.get("tickets", []))):
+        logger.error("Qo'riqchi snapshot'i imzosi noto'g'ri - e'tiborsiz qoldirildi")
+        return None
+
+    return [
+        {key: datetime.fromisoformat(value) if key in ("booking_date", "start_time", "end_time") else value
+         for key, value in ticket.items()}
+        for ticket in data["tickets"]
+    ]
+
+class GuardSyncLog:
+    """Oflayn check-in'lar jurnali va ularni bazaga sinxronlovchi"""
+
+    def __init__(self, path: str = None, conflicts_path: str = None,
+                 batch_size: int = None, interval: float = None):
+        self.path = path or Config.GUARD_SYNC_LOG_PATH
+        self.conflicts_path = conflicts_path or Config.GUARD_CONFLICTS_LOG_PATH
+        self.batch_size = batch_size or Config.GUARD_SYNC_BATCH_SIZE
+        self.interval = interval or Config.GUARD_SYNC_INTERVAL
+
+        self._pending: List[Dict[str, Any]] = []
+        # Oflayn ishlatilgan biletlar (ikki marta kiritmaslik uchun): booking_id / ticket_id -> used_at
+        self._used_bookings: Dict[int, datetime] = {}
+        self._used_tickets: Dict[str, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._loaded = False
+        # Jurnal faylini o'zgartirishlar (qo'shish / qayta yozish) navbat bilan
+        self._lock = asyncio.Lock()
+
+    async def load(self):
+        """Jurnalni bir marta o'qish (start() yoki birinchi oflayn check-in'da)"""
+        if self._loaded:
+            return
+        async with self._lock:
+            if not self._loaded:
+                await asyncio.to_thread(self._load)
+                self._loaded = True
+
+    def _load(self):
+        """Qayta ishga tushganda sinxronlanmagan yozuvlarni tiklash"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Oxirgi qator yozilayotganda uzilgan bo'lishi mumkin
+                continue
+            self._remember(record)
+
+        if self._pending:
+            logger.warning(f"Sinxronlanmagan oflayn check-in'lar: {len(self._pending)}")
+        GUARD_SYNC_PENDING.set(len(self._pending))
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def used_at(self, booking_id: int = None, ticket_id: str = None) -> Optional[datetime]:
+        """Bilet oflayn ishlatilgan vaqti (ishlatilmagan bo'lsa - None)"""
+        if booking_id is not None:
+            return self._used_bookings.get(booking_id)
+        return self._used_tickets.get(ticket_id)
+
+    def _remember(self, record: Dict[str, Any]):
+        used_at = datetime.fromisoformat(record["used_at"])
+        self._pending.append(record)
+        self._used_bookings[record["booking_id"]] = used_at
+        self._used_tickets[record["ticket_id"]] = used_at
+
+    async def record(self, ticket_pk: int, ticket_id: str, booking_id: int, checked_by: int, used_at: datetime):
+        """Oflayn USED o'tishini jurnalga yozish (diskka yozilgach qaytadi)"""
+        record = {
+            "ticket_pk": ticket_pk,
+            "ticket_id": ticket_id,
+            "booking_id": booking_id,
+            "checked_by": checked_by,
+            "used_at": used_at.isoformat()
+        }
+        await self.load()
+        async with self._lock:
+            await asyncio.to_thread(self._append, record)
+            self._remember(record)
+        GUARD_OFFLINE_CHECKINS.inc()
+        GUARD_SYNC_PENDING.set(len(self._pending))
+
+    def _append(self, record: Dict[str, Any]):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite(self, records: List[Dict[str, Any]]):
+        _write_atomic(self.path, "".join(json.dumps(record) + "\n" for record in records))
+
+    def _conflict(self, record: Dict[str, Any], status: Optional[TicketStatus],
+                  used_at: Optional[datetime], checked_in_by: Optional[int]) -> Dict[str, Any]:
+        conflict = dict(
+            record,
+            db_status=status.value if status else None,
+            db_used_at=used_at.isoformat() if used_at else None,
+            db_checked_in_by=checked_in_by,
+            detected_at=get_uzbekistan_time().isoformat()
+        )
+        GUARD_SYNC_CONFLICTS.inc()
+        logger.warning(
+            f"Oflayn check-in konflikti: bilet {record['ticket_id']} "
+            f"(bazada: {conflict['db_status']}, {conflict['db_used_at']})"
+        )
+        return conflict
+
+    def _write_conflicts(self, conflicts: List[Dict[str, Any]]):
+        os.makedirs(os.path.dirname(self.conflicts_path) or ".", exist_ok=True)
+        with open(self.conflicts_path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(conflict) + "\n" for conflict in conflicts)
+
+    async def sync_once(self) -> int:
+        """Bitta partiyani bazaga yozish; qayta ishlangan yozuvlar soni"""
+        await self.load()
+        batch = self._pending[:self.batch_size]
+        if not batch:
+            return 0
+
+        records = {record["ticket_pk"]: record for record in batch}
+        used_at = {pk: datetime.fromisoformat(record["used_at"]) for pk, record in records.items()}
+        checked_by = {pk: record["checked_by"] for pk, record in records.items()}
+
+        async with async_session() as session:
+            # Faqat hali ACTIVE biletlar o'zgaradi - qolganlari konflikt nomzodlari
+            result = await session.execute(
+                update(Ticket)
+                .where(Ticket.id.in_(records), Ticket.status == TicketStatus.ACTIVE)
+                .values(
+                    status=TicketStatus.USED,
+                    used_at=case(used_at, value=Ticket.id),
+                    checked_in_by=case(checked_by, value=Ticket.id)
+                )
+                .returning(Ticket.id)
+                .execution_options(synchronize_session=False)
+            )
+            applied = set(result.scalars())
+
+            rest = [pk for pk in records if pk not in applied]
+            current = {}
+            if rest:
+                result = await session.execute(
+                    select(Ticket.id, Ticket.status, Ticket.used_at, Ticket.checked_in_by)
+                    .where(Ticket.id.in_(rest))
+                )
+                current = {row.id: row for row in result}
+            await session.commit()
+
+        conflicts = []
+        for pk in rest:
+            row = current.get(pk)
+            if (row is not None and row.status == TicketStatus.USED
+                    and row.checked_in_by == checked_by[pk] and row.used_at == used_at[pk]):
+                # Avvalgi sinxronlash yozilgan, lekin jurnal tozalanmay qolgan
+                continue
+            if row is None:
+                conflicts.append(self._conflict(records[pk], None, None, None))
+            else:
+                conflicts.append(self._conflict(records[pk], row.status, row.used_at, row.checked_in_by))
+        if conflicts:
+            await asyncio.to_thread(self._write_conflicts, conflicts)
+
+        async with self._lock:
+            del self._pending[:len(batch)]
+            await asyncio.to_thread(self._rewrite, list(self._pending))
+        for record in batch:
+            # Endi bazada USED - keyingi skanerlar baza (yoki keshdan chiqarilgan) orqali rad etiladi
+            self._used_bookings.pop(record["booking_id"], None)
+            self._used_tickets.pop(record["ticket_id"], None)
+        GUARD_SYNC_PENDING.set(len(self._pending))
+        logger.info(f"Oflayn check-in'lar sinxronlandi: {len(applied)} ta, konflikt nomzodlari: {len(rest)}")
+        return len(batch)
+
+    def start(self):
+        """Jurnalni yuklash va sinxronlashni fon rejimida ishga tushirish"""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                while await self.sync_once():
+                    pass
+            except DBAPIError as e:
+                # Baza hali tiklanmagan - jurnal saqlanib qoladi
+                logger.warning(f"Oflayn check-in'larni sinxronlab bo'lmadi: {e}")
+            except Exception as e:
+                logger.exception(f"Guard sync error: {e}")
+            await asyncio.sleep(self.interval)
+
+# Global sinxronlash jurnali (bot.main da ishga tushiriladi)
+guard_sync = GuardSyncLog()
@@ -0,0 +1,162 @@
+"""
+To'lov provayderlari uchun umumiy HTTP klient (timeout, retry, circuit breaker)
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class CircuitOpenError(Exception):
+    """Provayder vaqtincha o'chirilgan (circuit breaker ochiq)"""
+    pass
+
+class RetryableHTTPError(Exception):
+    """Qayta urinish mumkin bo'lgan HTTP javob (5xx)"""
+    pass
+
+class CircuitBreaker:
+    """
+    Ketma-ket xatolardan keyin provayderga so'rovlarni to'xtatish
+
+    `failure_threshold` ta ketma-ket xatodan so'ng `reset_timeout` sekund
+    davomida so'rovlar darhol CircuitOpenError bilan qaytariladi. Keyin
+    bitta sinov so'roviga ruxsat beriladi (half-open).
+    """
+
+    def __init__(self, name: str, failure_threshold: int = None, reset_timeout: float = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or Config.PAYMENT_CIRCUIT_FAILURES
+        self.reset_timeout = reset_timeout or Config.PAYMENT_CIRCUIT_RESET_SECONDS
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """So'rovdan oldin: circuit ochiq bo'lsa xato; sinov so'rovi bo'lsa True"""
+        state = self.state
+        if state == "open" or (state == "half_open" and self._trial_in_flight):
+            raise CircuitOpenError(f"{self.name} vaqtincha mavjud emas")
+        if state == "half_open":
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def release_trial(self):
+        """Sinov so'rovi natijasiz tugadi (bekor qilindi) - keyingi so'rov yana sinov bo'ladi"""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_in_flight or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._trial_in_flight:
+                logger.warning(f"Circuit breaker ochildi: {self.name} ({self.failures} ta xato)")
+            self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+class ResilientHttpClient:
+    """
+    Bitta provayder uchun HTTP klient
+
+    O'z connection pool'i (keep-alive, DNS kesh), aniq connect/read
+    timeout'lari, idempotent so'rovlar uchun jitter bilan retry va circuit
+    breaker'ga ega.
+    """
+
+    def __init__(self, name: str, pool_size: int = None, connect_timeout: float = None,
+                 read_timeout: float = None, retries: int = None, backoff: float = None,
+                 breaker: CircuitBreaker = None):
+        self.name = name
+        self.pool_size = pool_size or Config.PAYMENT_HTTP_POOL_SIZE
+        self.connect_timeout = connect_timeout or Config.PAYMENT_HTTP_CONNECT_TIMEOUT
+        self.read_timeout = read_timeout or Config.PAYMENT_HTTP_READ_TIMEOUT
+        self.retries = Config.PAYMENT_HTTP_RETRIES if retries is None else retries
+        self.backoff = backoff or Config.PAYMENT_HTTP_BACKOFF
+        self.breaker = breaker or CircuitBreaker(name)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Sessiyani birinchi so'rovda yaratish (event loop ichida)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                ttl_dns_cache=300,
+                keepalive_timeout=30
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=self.connect_timeout + self.read_timeout,
+                connect=self.connect_timeout,
+                sock_read=self.read_timeout
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    async def request_json(self, method: str, url: str, idempotent: bool = False, **kwargs) -> Any:
+        """
+        So'rov yuborish va JSON javobni qaytarish
+
+        Faqat idempotent so'rovlar tarmoq xatosi, timeout yoki 5xx da qayta
+        yuboriladi. Circuit breaker bitta chaqiruvni (barcha urinishlar
+        bilan) bitta natija sifatida hisoblaydi.
+        """
+        trial = self.breaker.before_call()
+        attempts = 1 + self.retries if idempotent else 1
+
+        try:
+            for attempt in range(attempts):
+                try:
+                    async with self._get_session().request(method, url, **kwargs) as response:
+                        if response.status >= 500:
+                            raise RetryableHTTPError(f"{self.name}: HTTP {response.status}")
+                        data = await response.json(content_type=None)
+                    self.breaker.record_success()
+                    return data
+
+                except (aiohttp.ClientError, asyncio.TimeoutError, RetryableHTTPError) as e:
+                    if attempt + 1 >= attempts:
+                        self.breaker.record_failure()
+                        raise
+                    # Full jitter: 0..backoff*2^attempt
+                    delay = random.uniform(0, self.backoff * (2 ** attempt))
+                    logger.debug(f"{self.name} so'rovi qayta yuboriladi ({attempt + 1}/{attempts - 1}): {e}")
+                    await asyncio.sleep(delay)
+
+                except Exception:
+                    # Noto'g'ri JSON va boshqa kutilmagan javoblar
+                    self.breaker.record_failure()
+                    raise
+        finally:
+            # CancelledError (timeout, shutdown) natija yozmaydi - half-open qotib qolmasligi kerak
+            if trial:
+                self.breaker.release_trial()
+
+    async def post_json(self, url: str, payload: Dict, headers: Dict = None,
+                        idempotent: bool = False) -> Any:
+        """JSON POST so'rovi"""
+        return await self.request_json("POST", url, idempotent=idempotent, json=payload, headers=headers)
+
+    async def close(self):
+        """Sessiyani yopish"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
@@ -5,7 +5,7 @@ Telegram bot uchun klaviaturalar
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from localization import get_text, get_available_languages
 import calendar
 
@@ -262,6 +262,12 @@ def get_my_bookings_keyboard(lang: str = "uz") -> InlineKeyboardMarkup:
             callback_data="bookings:history"
         )
     )
+    builder.row(
+        InlineKeyboardButton(
+            text=get_text("cancelled_bookings", lang),
+            callback_data="bookings:cancelled"
+        )
+    )
     
     # Orqaga tugmasi
     builder.row(
@@ -270,6 +276,38 @@ def get_my_bookings_keyboard(lang: str = "uz") -> InlineKeyboardMarkup:
     
     return builder.as_markup()
 
+def get_bookings_page_keyboard(view: str, items: List[Tuple[int, str]], prev_cursor: Optional[str],
+                               next_cursor: Optional[str], lang: str = "uz") -> InlineKeyboardMarkup:
+    """
+    Bronlar sahifasi klaviaturasi (keyset sahifalash)
+    
+    items - (booking_id, tugma matni); cursor - "YYYYmmddHHMMSS:id"
+    """
+    builder = InlineKeyboardBuilder()
+    
+    for booking_id, label in items:
+        builder.row(
+            InlineKeyboardButton(text=label, callback_data=f"booking:view:{booking_id}")
+        )
+    
+    buttons = []
+    if prev_cursor:
+        buttons.append(
+            InlineKeyboardButton(text=get_text("previous", lang), callback_data=f"bookings:{view}:p:{prev_cursor}")
+        )
+    if next_cursor:
+        buttons.append(
+            InlineKeyboardButton(text=get_text("next", lang), callback_data=f"bookings:{view}:n:{next_cursor}")
+        )
+    if buttons:
+        builder.row(*buttons)
+    
+    builder.row(
+        InlineKeyboardButton(text=get_text("back", lang), callback_data="back:bookings")
+    )
+    
+    return builder.as_markup()
+
 def get_booking_actions_keyboard(booking_id: int, can_cancel: bool = True, 
                                 lang: str = "uz") -> InlineKeyboardMarkup:
     """Bron amallar klaviaturasi"""
@@ -297,6 +335,78 @@ def get_booking_actions_keyboard(booking_id: int, can_cancel: bool = True,
     
     return builder.as_markup()
 
+def get_cancel_booking_keyboard(booking_id: int, lang: str = "uz") -> InlineKeyboardMarkup:
+    """Bron bekor qilishni tasdiqlash klaviaturasi"""
+    builder = InlineKeyboardBuilder()
+    
+    builder.row(
+        InlineKeyboardButton(
+            text=get_text("cancel_booking_yes", lang),
+            callback_data=f"booking:cancel_yes:{booking_id}"
+        )
+    )
+    builder.row(
+        InlineKeyboardButton(text=get_text("back", lang), callback_data=f"booking:view:{booking_id}")
+    )
+    
+    return builder.as_markup()
+
+def get_waitlist_hours_keyboard(court_id: int, day: datetime, hours: List[int],
+                                lang: str = "uz") -> InlineKeyboardMarkup:
+    """Band soatlar - navbatga yozilish klaviaturasi"""
+    builder = InlineKeyboardBuilder()
+    
+    buttons = [
+        InlineKeyboardButton(
+            text=f"{hour:02d}:00",
+            callback_data=f"waitlist:join:{court_id}:{day.strftime('%Y%m%d')}:{hour}"
+        )
+        for hour in hours
+    ]
+    for i in range(0, len(buttons), 3):
+        builder.row(*buttons[i:i+3])
+    
+    builder.row(
+        InlineKeyboardButton(text=get_text("back", lang), callback_data="back:date")
+    )
+    
+    return builder.as_markup()
+
+def get_waitlist_joined_keyboard(entry_id: int, lang: str = "uz") -> InlineKeyboardMarkup:
+    """Navbatga yozilgandan keyingi klaviatura"""
+    builder = InlineKeyboardBuilder()
+    
+    builder.row(
+        InlineKeyboardButton(
+            text=get_text("waitlist_leave", lang),
+            callback_data=f"waitlist:leave:{entry_id}"
+        )
+    )
+    builder.row(
+        InlineKeyboardButton(text=get_text("back", lang), callback_data="back:main")
+    )
+    
+    return builder.as_markup()
+
+def get_waitlist_offer_keyboard(booking_id: int, lang: str = "uz") -> InlineKeyboardMarkup:
+    """Navbat taklifi: to'lash yoki rad etish"""
+    builder = InlineKeyboardBuilder()
+    
+    builder.row(
+        InlineKeyboardButton(
+            text=get_text("waitlist_accept", lang),
+            callback_data=f"waitlist:accept:{booking_id}"
+        )
+    )
+    builder.row(
+        InlineKeyboardButton(
+            text=get_text("waitlist_decline", lang),
+            callback_data=f"waitlist:decline:{booking_id}"
+        )
+    )
+    
+    return builder.as_markup()
+
 def get_profile_keyboard(lang: str = "uz") -> InlineKeyboardMarkup:
     """Profil klaviaturasi"""
     builder = InlineKeyboardBuilder()
@@ -352,6 +462,16 @@ def get_admin_main_keyboard(lang: str = "uz") -> InlineKeyboardMarkup:
         )
     )
     builder.row(
+        InlineKeyboardButton(
+            text=get_text("admin_qr_check", lang),
+            callback_data="admin:qr_check"
+        )
+    )
+    builder.row(
+        InlineKeyboardButton(
+            text=get_text("admin_broadcast", lang),
+            callback_data="admin:broadcast"
+        ),
         InlineKeyboardButton(
             text=get_text("admin_settings", lang),
             callback_data="admin:settings"
@@ -77,6 +77,8 @@ TEXTS = {
         "booking_history": "📜 Tarix",
         "no_active_bookings": "🚫 Sizda faol bronlar yo'q",
         "no_booking_history": "🚫 Sizda bron tarixi yo'q",
+        "cancelled_bookings": "❌ Bekor qilinganlar",
+        "no_cancelled_bookings": "🚫 Sizda bekor qilingan bronlar yo'q",
         "booking_info": """
 🎫 Bron #{booking_id}
 
@@ -89,7 +91,27 @@ TEXTS = {
 {additional_info}
         """,
         "show_ticket": "🎫 Biletni ko'rsatish",
+        "ticket_not_found": "❌ Bu bron uchun bilet hali tayyor emas.",
         "cancel_booking_btn": "❌ Bronni bekor qilish",
+        "cancel_booking_confirm": "❓ {date} {time} dagi {court_name} bronini bekor qilasizmi?\n\nBekor qilish boshlanishiga {hours} soatdan ko'proq vaqt qolganda mumkin.",
+        "cancel_booking_yes": "✅ Ha, bekor qilish",
+        "cancellation_not_allowed": "❌ Bu bronni bekor qilib bo'lmaydi: boshlanishiga {hours} soatdan kam vaqt qolgan yoki bron allaqachon bekor qilingan.",
+        "booking_cancelled_by_user": "✅ Bron bekor qilindi. Vaqt boshqa mijozlar uchun bo'shatildi.",
+        "refund_pending": "💸 To'lov qaytarilmoqda - tayyor bo'lganda xabar beramiz.",
+        "refund_completed": "💸 {amount:,.0f} so'm to'lovingiz qaytarildi.",
+        "refund_manual": "💸 To'lovingiz administrator tomonidan qaytariladi.",
+        "admin_refund_required": "⚠️ Qo'lda qaytarish kerak: to'lov #{payment_id} ({method}), bron #{booking_id}, {amount:,.0f} so'm.",
+        
+        # Navbat (waitlist)
+        "waitlist_prompt": "⏳ Band soatni tanlab navbatga yoziling - vaqt bo'shasa, birinchi bo'lib sizga taklif qilamiz.",
+        "waitlist_joined": "✅ Siz {date} {time} ({court_name}) navbatidasiz: {position}-o'rin.\n\nSlot bo'shasa, sizga {minutes} daqiqa ushlab turamiz.",
+        "waitlist_left": "✅ Siz navbatdan chiqdingiz.",
+        "waitlist_leave": "🚪 Navbatdan chiqish",
+        "waitlist_offer": "🎾 {date} {time} ({court_name}) bo'shadi!\n\nSlot siz uchun {minutes} daqiqa ushlab turiladi. Narx: {amount:,.0f} so'm.",
+        "waitlist_accept": "💳 To'lash",
+        "waitlist_decline": "❌ Rad etish",
+        "waitlist_declined": "Taklif rad etildi - slot navbatdagi keyingi mijozga o'tdi.",
+        "hold_expired": "⌛ Slotni ushlab turish muddati tugagan - vaqtni qaytadan tanlang.",
         
         # Profil
         "profile_info": """
@@ -155,6 +177,8 @@ TEXTS = {
         "admin_courts": "🏟 Kortlar",
         "admin_reports": "📈 Hisobotlar",
         "admin_settings": "⚙️ Sozlamalar",
+        "admin_broadcast": "📢 Xabar yuborish",
+        "admin_qr_check": "🎫 QR tekshirish",
         
         # Qoidalar va yordam
         "rules_text": """
@@ -187,6 +211,7 @@ TEXTS = {
         # Bildirishnomalar
         "booking_reminder_24h": "⏰ Eslatma: Sizning bronigiz ertaga {time} da {court_name} kortida.",
         "booking_reminder_2h": "⏰ Eslatma: Sizning bronigiz 2 soatdan so'ng {court_name} kortida boshlanadi.",
+        "booking_reminder_1h": "⏰ Eslatma: Sizning bronigiz 1 soatdan so'ng ({time}) {court_name} kortida boshlanadi.",
         "booking_cancelled": "❌ Sizning {date} {time} dagi bronigiz bekor qilindi.",
         "payment_reminder": "💳 Eslatma: {amount:,.0f} so'm miqdoridagi to'lovingiz kutilmoqda.",
     },
@@ -234,6 +259,31 @@ TEXTS = {
         "confirm_booking": "✅ Подтвердить бронь",
         "cancel_booking": "❌ Отменить",
         
+        # Уведомления
+        "booking_reminder_24h": "⏰ Напоминание: ваша бронь завтра в {time} на корте {court_name}.",
+        "booking_reminder_1h": "⏰ Напоминание: ваша бронь начнётся через 1 час ({time}) на корте {court_name}.",
+        "ticket_not_found": "❌ Билет для этой брони ещё не готов.",
+        "cancel_booking_btn": "❌ Отменить бронь",
+        "cancel_booking_confirm": "❓ Отменить бронь {court_name} на {date} {time}?\n\nОтмена возможна не позднее чем за {hours} ч. до начала.",
+        "cancel_booking_yes": "✅ Да, отменить",
+        "cancellation_not_allowed": "❌ Эту бронь нельзя отменить: до начала осталось меньше {hours} ч. или бронь уже отменена.",
+        "booking_cancelled_by_user": "✅ Бронь отменена. Время освобождено для других клиентов.",
+        "refund_pending": "💸 Оплата возвращается - сообщим, когда будет готово.",
+        "refund_completed": "💸 Ваш платёж {amount:,.0f} сум возвращён.",
+        "refund_manual": "💸 Ваш платёж вернёт администратор.",
+        "admin_refund_required": "⚠️ Нужен ручной возврат: платёж #{payment_id} ({method}), бронь #{booking_id}, {amount:,.0f} сум.",
+        
+        # Лист ожидания
+        "waitlist_prompt": "⏳ Выберите занятый час и встаньте в очередь - если время освободится, мы предложим его вам первым.",
+        "waitlist_joined": "✅ Вы в очереди на {date} {time} ({court_name}): {position}-е место.\n\nКогда слот освободится, мы придержим его для вас на {minutes} мин.",
+        "waitlist_left": "✅ Вы вышли из очереди.",
+        "waitlist_leave": "🚪 Выйти из очереди",
+        "waitlist_offer": "🎾 {date} {time} ({court_name}) освободилось!\n\nСлот придержан для вас на {minutes} мин. Цена: {amount:,.0f} сум.",
+        "waitlist_accept": "💳 Оплатить",
+        "waitlist_decline": "❌ Отказаться",
+        "waitlist_declined": "Вы отказались - слот передан следующему в очереди.",
+        "hold_expired": "⌛ Время удержания слота истекло - выберите время заново.",
+        
         # Остальные переводы...
         # (Для экономии места показываю только часть, в реальном проекте нужно перевести все)
     }
@@ -0,0 +1,186 @@
+"""
+Logging sozlash: QueueHandler/QueueListener va strukturali (JSON) loglar
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from config import Config
+
+# Joriy update konteksti (har bir asyncio task uchun alohida)
+update_id_var: ContextVar[Optional[int]] = ContextVar("update_id", default=None)
+user_id_var: ContextVar[Optional[int]] = ContextVar("user_id", default=None)
+handler_var: ContextVar[Optional[str]] = ContextVar("handler", default=None)
+
+AUDIT_LOGGER_NAME = "audit"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+class LogContextMiddleware(BaseMiddleware):
+    """
+    Update ID, foydalanuvchi va handler nomini contextvar'larga yozish
+
+    Outer (dp.update) middleware sifatida update_id/user_id ni, inner
+    (message/callback_query) sifatida handler nomini o'rnatadi.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        tokens = []
+        handler_object = data.get("handler")
+        if handler_object is not None:
+            name = getattr(handler_object.callback, "__name__", "unknown")
+            tokens.append((handler_var, handler_var.set(name)))
+        else:
+            update = data.get("event_update")
+            from_user = data.get("event_from_user")
+            tokens.append((update_id_var, update_id_var.set(getattr(update, "update_id", None))))
+            tokens.append((user_id_var, user_id_var.set(getattr(from_user, "id", None))))
+
+        try:
+            return await handler(event, data)
+        finally:
+            for var, token in reversed(tokens):
+                var.reset(token)
+
+class ContextFilter(logging.Filter):
+    """Log yozuviga update kontekstini qo'shish (yozuv yaratilgan thread'da)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "update_id"):
+            record.update_id = update_id_var.get()
+        if not hasattr(record, "user_id"):
+            record.user_id = user_id_var.get()
+        if not hasattr(record, "handler"):
+            record.handler = handler_var.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """Log yozuvini bitta qatorli JSON ga aylantirish"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, Config.get_timezone()).isoformat(timespec="milliseconds"),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in ("update_id", "user_id", "handler"):
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+
+        audit = getattr(record, "audit", None)
+        if audit:
+            entry.update(audit)
+
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class AuditFilter(logging.Filter):
+    """Faqat audit yozuvlarini o'tkazish"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.name == AUDIT_LOGGER_NAME
+
+class NonAuditFilter(logging.Filter):
+    """Audit yozuvlarini asosiy log'lardan chiqarish (ular audit faylida)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.name != AUDIT_LOGGER_NAME
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """
+    Navbat bitta jarayon ichida - yozuv pickle qilinmaydi
+
+    Standart prepare() yozuvni formatlab exc_info ni tozalaydi; bu yerda
+    faqat xabar argumentlari birlashtiriladi, formatlash listener'da
+    (JsonFormatter exc_info ni alohida maydonga yozadi).
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+def _make_formatter() -> logging.Formatter:
+    if Config.LOG_FORMAT == "json":
+        return JsonFormatter()
+    return logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+def setup_logging():
+    """
+    Root logger ni QueueHandler orqali sozlash
+
+    Handlerlar (fayl, stdout, audit fayl) QueueListener background thread'ida
+    ishlaydi, event loop faqat yozuvni navbatga qo'yadi.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    os.makedirs(Config.LOG_DIR, exist_ok=True)
+    formatter = _make_formatter()
+
+    file_handler = logging.FileHandler(os.path.join(Config.LOG_DIR, Config.LOG_FILE), encoding="utf-8")
+    file_handler.setFormatter(formatter)
+    file_handler.addFilter(NonAuditFilter())
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+    stream_handler.addFilter(NonAuditFilter())
+
+    audit_handler = logging.FileHandler(os.path.join(Config.LOG_DIR, Config.AUDIT_LOG_FILE), encoding="utf-8")
+    audit_handler.setFormatter(JsonFormatter())
+    audit_handler.addFilter(AuditFilter())
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    queue_handler = LocalQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(getattr(logging, Config.LOG_LEVEL, logging.INFO))
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, file_handler, stream_handler, audit_handler,
+        respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(stop_logging)
+
+    # Aiogram loglarini kamaytirish
+    logging.getLogger("aiogram").setLevel(logging.WARNING)
+    logging.getLogger("aiohttp").setLevel(logging.WARNING)
+    
+    # SQL loglari ham navbat orqali o'tadi (engine echo o'z stdout handlerini qo'shardi)
+    if Config.DB_ECHO:
+        logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
+
+def stop_logging():
+    """Navbatdagi yozuvlarni yakunlab, listener ni to'xtatish"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
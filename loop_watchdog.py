@@ -0,0 +1,130 @@
+"""
+Event loop watchdog: loop kechikishini o'lchash va sekin callbacklarni aniqlash
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from config import Config
+from metrics import EVENT_LOOP_LAG, SLOW_CALLBACKS
+
+logger = logging.getLogger(__name__)
+
+# asyncio.Task -> hozir bajarilayotgan update ma'lumotlari
+_active_updates: Dict[asyncio.Task, Dict[str, Any]] = {}
+
+class UpdateTrackingMiddleware(BaseMiddleware):
+    """Qaysi task qaysi update/handlerni bajarayotganini eslab qolish"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        task = asyncio.current_task()
+        if task is None:
+            return await handler(event, data)
+
+        update = data.get("event_update")
+        from_user = data.get("event_from_user")
+        handler_object = data.get("handler")
+        previous = _active_updates.get(task)
+        _active_updates[task] = {
+            'update_id': getattr(update, "update_id", None),
+            'user_id': getattr(from_user, "id", None),
+            'handler': getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        }
+        try:
+            return await handler(event, data)
+        finally:
+            if previous is None:
+                _active_updates.pop(task, None)
+            else:
+                _active_updates[task] = previous
+
+class LoopWatchdog:
+    """
+    Event loop ni kuzatuvchi watchdog
+
+    Loop ichidagi heartbeat har `interval` soniyada vaqtni yangilaydi va
+    kechikishni metrikaga yozadi. Alohida thread heartbeat kechiksa (loop
+    sinxron kod bilan bloklangan bo'lsa), loop thread'ining joriy stack'ini
+    va uni chaqirgan update/handlerni logga yozadi.
+    """
+
+    def __init__(self, threshold: float = None, interval: float = None):
+        self.threshold = threshold if threshold is not None else Config.WATCHDOG_THRESHOLD_MS / 1000.0
+        self.interval = interval if interval is not None else Config.WATCHDOG_INTERVAL
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = time.monotonic()
+        self._reported_beat: Optional[float] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        """Watchdog ni joriy event loop uchun ishga tushirish"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop_event.clear()
+
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        """Watchdog ni to'xtatish"""
+        self._stop_event.set()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            EVENT_LOOP_LAG.observe(max(0.0, loop.time() - started - self.interval))
+            self._last_beat = time.monotonic()
+
+    def _watch(self):
+        check_every = max(0.01, min(self.interval, self.threshold) / 2)
+        while not self._stop_event.wait(check_every):
+            last_beat = self._last_beat
+            stalled = time.monotonic() - last_beat - self.interval
+            if stalled >= self.threshold and self._reported_beat != last_beat:
+                # Bitta bloklanishni faqat bir marta qayd qilish
+                self._reported_beat = last_beat
+                self._report(stalled)
+
+    def _report(self, stalled: float):
+        """Bloklangan loop stack'ini va kontekstini logga yozish"""
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame else "<stack mavjud emas>\n"
+
+        task = asyncio.current_task(self._loop)
+        context = _active_updates.get(task) if task else None
+        if context:
+            source = f"update={context['update_id']} user={context['user_id']} handler={context['handler']}"
+            handler_name = context['handler']
+        else:
+            source = f"task={task.get_name() if task else 'callback'}"
+            handler_name = "background"
+
+        SLOW_CALLBACKS.labels(handler_name).inc()
+        logger.warning(
+            f"Event loop {stalled * 1000:.0f}ms dan beri bloklangan ({source})\n{stack}"
+        )
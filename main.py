@@ -3,14 +3,11 @@ Asosiy ishga tushirish fayli
 """
 
 import asyncio
-import logging
 from bot import main
+from logging_setup import setup_logging
 
 if __name__ == "__main__":
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
+    setup_logging()
     
     try:
         asyncio.run(main())
@@ -0,0 +1,182 @@
+"""
+Prometheus metrikalari va /metrics handler
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HANDLER_LATENCY = Histogram(
+    "bot_handler_latency_seconds",
+    "Handler bajarilish vaqti",
+    ["router", "handler", "prefix"],
+    buckets=LATENCY_BUCKETS
+)
+HANDLER_ERRORS = Counter(
+    "bot_handler_errors_total",
+    "Handlerda yuz bergan xatolar",
+    ["router", "handler", "prefix"]
+)
+DB_QUERIES = Counter(
+    "db_queries_total",
+    "Bajarilgan SQL so'rovlar soni",
+    ["operation"]
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "SQL so'rov bajarilish vaqti",
+    ["operation"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+PAYMENT_PROVIDER_LATENCY = Histogram(
+    "payment_provider_latency_seconds",
+    "To'lov provayderi chaqiruvlari vaqti",
+    ["provider", "operation", "outcome"],
+    buckets=LATENCY_BUCKETS
+)
+TICKET_RENDER_SECONDS = Histogram(
+    "ticket_render_seconds",
+    "Bilet (QR va rasm) yaratish vaqti",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Event loop kechikishi",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+SLOW_CALLBACKS = Counter(
+    "event_loop_slow_callbacks_total",
+    "Event loop ni chegaradan uzoq bloklagan callbacklar",
+    ["handler"]
+)
+CHECKIN_STAGE_SECONDS = Histogram(
+    "checkin_stage_seconds",
+    "Check-in bosqichlari vaqti (download, decode, lookup)",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+TELEGRAM_SEND_QUEUE_DEPTH = Gauge(
+    "telegram_send_queue_depth",
+    "Yuborilishini kutayotgan xabarlar",
+    ["priority"]
+)
+TELEGRAM_RETRY_AFTER = Counter(
+    "telegram_retry_after_total",
+    "Telegram flood limit (RetryAfter) javoblari"
+)
+
+def get_event_prefix(event: TelegramObject) -> str:
+    """Metrika uchun event prefiksi (label kardinalligi cheklangan)"""
+    if isinstance(event, CallbackQuery):
+        data = event.data or ""
+        # "date:2024-12-01" -> "date", "time_10_00" -> "time"
+        prefix = data.split(":", 1)[0].split("_", 1)[0]
+        return prefix[:32] or "empty"
+
+    if isinstance(event, Message):
+        if event.text:
+            return "command" if event.text.startswith("/") else "text"
+        if event.contact:
+            return "contact"
+        if event.photo:
+            return "photo"
+        return "other"
+
+    return type(event).__name__.lower()
+
+class MetricsMiddleware(BaseMiddleware):
+    """Handler kechikishini router, handler va callback prefiksi bo'yicha o'lchash"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        event_router = data.get("event_router")
+        labels = (
+            getattr(event_router, "name", "unknown"),
+            getattr(getattr(handler_object, "callback", None), "__name__", "unknown"),
+            get_event_prefix(event)
+        )
+
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.labels(*labels).inc()
+            raise
+        finally:
+            HANDLER_LATENCY.labels(*labels).observe(time.perf_counter() - started)
+
+def _statement_operation(statement: str) -> str:
+    """SQL so'rov turi (SELECT, INSERT, ...)"""
+    parts = statement.lstrip().split(None, 1)
+    operation = parts[0].upper() if parts else "OTHER"
+    if operation in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"):
+        return operation
+    return "OTHER"
+
+def instrument_engine(engine):
+    """SQLAlchemy engine ga so'rov hisoblagichlarini ulash"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started_at"].pop()
+        operation = _statement_operation(statement)
+        DB_QUERIES.labels(operation).inc()
+        DB_QUERY_DURATION.labels(operation).observe(time.perf_counter() - started)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _on_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_started_at"):
+            conn.info["query_started_at"].pop()
+        DB_QUERIES.labels("ERROR").inc()
+
+@contextmanager
+def track_payment_call(provider: str, operation: str):
+    """To'lov provayderi chaqiruvini o'lchash"""
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        PAYMENT_PROVIDER_LATENCY.labels(provider, operation, outcome).observe(time.perf_counter() - started)
+
+async def metrics_handler(request):
+    """GET /metrics"""
+    from aiohttp import web
+    return web.Response(body=generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+GUARD_OFFLINE_CHECKINS = Counter(
+    "guard_offline_checkins_total",
+    "Baza javob bermaganda keshdan qilingan check-in'lar"
+)
+
+GUARD_SYNC_PENDING = Gauge(
+    "guard_sync_pending",
+    "Bazaga sinxronlanmagan oflayn check-in'lar"
+)
+
+GUARD_SYNC_CONFLICTS = Counter(
+    "guard_sync_conflicts_total",
+    "Sinxronlashda bazadagi holat bilan mos kelmagan oflayn check-in'lar"
+)
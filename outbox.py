@@ -0,0 +1,197 @@
+"""
+Transactional outbox: bilet berish va bildirishnomalar
+
+Yon ta'sirlar (bilet yaratish, xabar yuborish) to'lov holati o'zgarishi
+bilan BIR tranzaksiyada `outbox` jadvaliga yoziladi va alohida worker pool
+tomonidan bajariladi. Jarayon commit dan keyin to'xtab qolsa ham, yozuv
+saqlanib qoladi va keyingi ishga tushishda bajariladi (at-least-once).
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import Config
+from database import async_session, OutboxMessage, OutboxStatus
+
+logger = logging.getLogger(__name__)
+
+# Outbox yozuv turlari
+TICKET_ISSUE = "ticket.issue"
+NOTIFY_PAYMENT_SUCCESS = "notify.payment_success"
+NOTIFY_PAYMENT_FAILED = "notify.payment_failed"
+REFUND_PAYMENT = "payment.refund"
+
+OutboxHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+def enqueue(session: AsyncSession, kind: str, payload: Dict[str, Any]):
+    """Outbox yozuvini joriy tranzaksiyaga qo'shish (commit chaqiruvchida)"""
+    session.add(OutboxMessage(
+        kind=kind,
+        payload=json.dumps(payload, default=str),
+        available_at=datetime.utcnow()
+    ))
+
+def enqueue_payment_paid(session: AsyncSession, booking_id: int):
+    """To'lov tasdiqlandi: bilet va muvaffaqiyat xabari"""
+    enqueue(session, NOTIFY_PAYMENT_SUCCESS, {'booking_id': booking_id})
+    enqueue(session, TICKET_ISSUE, {'booking_id': booking_id})
+
+def enqueue_payment_failed(session: AsyncSession, booking_id: int):
+    """To'lov bekor qilindi: foydalanuvchiga xabar"""
+    enqueue(session, NOTIFY_PAYMENT_FAILED, {'booking_id': booking_id})
+
+def enqueue_refund(session: AsyncSession, booking_id: int, payment_id: int):
+    """Bron bekor qilindi: to'lovni provayder orqali qaytarish"""
+    enqueue(session, REFUND_PAYMENT, {'booking_id': booking_id, 'payment_id': payment_id})
+
+class OutboxWorker:
+    """
+    Outbox yozuvlarini bajaruvchi worker pool
+
+    Yozuvlar partiyalab `FOR UPDATE SKIP LOCKED` bilan egallanadi (bir nechta
+    jarayon bir yozuvni ikki marta olmaydi), `concurrency` tagacha parallel
+    bajariladi. Xato bo'lsa eksponensial backoff bilan qayta uriniladi,
+    `max_attempts` dan keyin FAILED bo'ladi. PROCESSING holatida qotib
+    qolgan yozuvlar (`lease` tugagach) qayta olinadi.
+    """
+
+    def __init__(self, concurrency: int = None, batch_size: int = None,
+                 poll_interval: float = None, lease_seconds: float = None,
+                 max_attempts: int = None):
+        self.concurrency = concurrency or Config.OUTBOX_CONCURRENCY
+        self.batch_size = batch_size or Config.OUTBOX_BATCH_SIZE
+        self.poll_interval = poll_interval or Config.OUTBOX_POLL_INTERVAL
+        self.lease = timedelta(seconds=lease_seconds or Config.OUTBOX_LEASE_SECONDS)
+        self.max_attempts = max_attempts or Config.OUTBOX_MAX_ATTEMPTS
+        self.max_backoff = Config.OUTBOX_MAX_BACKOFF
+
+        self._handlers: Dict[str, OutboxHandler] = {}
+        self._wake_event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, kind: str, handler: OutboxHandler):
+        """Yozuv turi uchun handler"""
+        self._handlers[kind] = handler
+
+    def start(self):
+        """Workerni ishga tushirish"""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Workerni to'xtatish (egallangan yozuvlar lease tugagach qayta olinadi)"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def wake(self):
+        """Keyingi so'rovni kutmasdan navbatni tekshirish"""
+        self._wake_event.set()
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await self.run_once()
+            except Exception as e:
+                logger.exception(f"Outbox worker error: {e}")
+                processed = 0
+
+            # Partiya to'la bo'lsa, navbatda yana yozuvlar bor
+            if processed >= self.batch_size:
+                continue
+
+            try:
+                await asyncio.wait_for(self._wake_event.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake_event.clear()
+
+    async def _claim(self) -> List[Tuple[int, str, str, int]]:
+        """Bajarilishi kerak bo'lgan yozuvlarni egallash"""
+        now = datetime.utcnow()
+        async with async_session() as session:
+            result = await session.execute(
+                select(OutboxMessage.id, OutboxMessage.kind, OutboxMessage.payload, OutboxMessage.attempts)
+                .where(or_(
+                    and_(OutboxMessage.status == OutboxStatus.PENDING, OutboxMessage.available_at <= now),
+                    and_(OutboxMessage.status == OutboxStatus.PROCESSING, OutboxMessage.locked_until < now)
+                ))
+                .order_by(OutboxMessage.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            rows = result.all()
+            if rows:
+                await session.execute(
+                    update(OutboxMessage)
+                    .where(OutboxMessage.id.in_([row.id for row in rows]))
+                    .values(status=OutboxStatus.PROCESSING, locked_until=now + self.lease)
+                    .execution_options(synchronize_session=False)
+                )
+            await session.commit()
+        return rows
+
+    async def run_once(self) -> int:
+        """Bitta partiyani bajarish; bajarilgan yozuvlar soni"""
+        rows = await self._claim()
+        if not rows:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def process(row) -> Tuple[int, int, Optional[str]]:
+            async with semaphore:
+                handler = self._handlers.get(row.kind)
+                if handler is None:
+                    return row.id, row.attempts, f"Handler topilmadi: {row.kind}"
+                try:
+                    await handler(json.loads(row.payload))
+                    return row.id, row.attempts, None
+                except Exception as e:
+                    logger.warning(f"Outbox {row.kind} #{row.id} xatosi (urinish {row.attempts + 1}): {e}")
+                    return row.id, row.attempts, f"{type(e).__name__}: {e}"
+
+        results = await asyncio.gather(*(process(row) for row in rows))
+        await self._finish(results)
+        return len(rows)
+
+    async def _finish(self, results: List[Tuple[int, int, Optional[str]]]):
+        """Natijalarni bitta tranzaksiyada yozish"""
+        now = datetime.utcnow()
+        async with async_session() as session:
+            done = [message_id for message_id, _, error in results if error is None]
+            if done:
+                await session.execute(
+                    update(OutboxMessage)
+                    .where(OutboxMessage.id.in_(done))
+                    .values(status=OutboxStatus.DONE, processed_at=now, locked_until=None)
+                    .execution_options(synchronize_session=False)
+                )
+
+            for message_id, attempts, error in results:
+                if error is None:
+                    continue
+                attempts += 1
+                if attempts >= self.max_attempts:
+                    values = {'status': OutboxStatus.FAILED, 'processed_at': now}
+                    logger.error(f"Outbox #{message_id} {attempts} urinishdan keyin FAILED: {error}")
+                else:
+                    delay = min(self.poll_interval * (2 ** attempts), self.max_backoff)
+                    values = {'status': OutboxStatus.PENDING, 'available_at': now + timedelta(seconds=delay)}
+                await session.execute(
+                    update(OutboxMessage)
+                    .where(OutboxMessage.id == message_id)
+                    .values(attempts=attempts, last_error=error, locked_until=None, **values)
+                    .execution_options(synchronize_session=False)
+                )
+
+            await session.commit()
+
+# Global outbox worker
+outbox_worker = OutboxWorker()
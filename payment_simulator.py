@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+To'lov provayderlari simulyatori (Payme, Click)
+
+payments.py ishlatadigan endpointlarni lokal aiohttp serverda taqlid qiladi:
+    POST /payme                  Payme JSON-RPC (GetStatement, CheckTransaction, ...)
+    POST /click/invoice/status   Click invoice holati
+    POST /_sim/pay               "Foydalanuvchi to'ladi" - tranzaksiya yaratish va
+                                 (berilgan bo'lsa) botning webhook'lariga yuborish
+
+Kechikish, jitter va xato (HTTP 503) ulushi sozlanadi. Uzum Pay uchun
+payments.py hozircha HTTP so'rov yubormaydi, shuning uchun endpoint yo'q.
+
+Ishga tushirish:
+    # Botni simulyatorga ulash: PAYME_API_URL=http://127.0.0.1:8700/payme
+    #                           CLICK_API_URL=http://127.0.0.1:8700/click
+    python payment_simulator.py serve --port 8700 --webhook-url http://127.0.0.1:9100
+
+    # PaymentManager throughput benchmark (simulyator shu jarayonda)
+    python payment_simulator.py bench --payments 2000 --concurrency 100 --latency-ms 80 --error-rate 0.05
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from benchmark import prepare_environment, percentile
+
+PAYME_STATE_CREATED = 1
+PAYME_STATE_PERFORMED = 2
+PAYME_STATE_CANCELLED = -1
+
+CLICK_INVOICE_PAID = 2
+CLICK_INVOICE_CANCELLED = -1
+CLICK_INVOICE_PENDING = 0
+
+class PaymentProviderSimulator:
+    """Payme va Click API larini taqlid qiluvchi HTTP server"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 jitter: float = 0.0, error_rate: float = 0.0, webhook_url: str = None,
+                 payme_key: str = None, click_secret: str = None, click_service_id: str = None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.webhook_url = webhook_url.rstrip("/") if webhook_url else None
+        self.payme_key = payme_key or ""
+        self.click_secret = click_secret or ""
+        self.click_service_id = click_service_id or "1"
+
+        # order_id -> Payme tranzaksiyasi, invoice_id -> Click invoice
+        self.payme_transactions: Dict[str, Dict] = {}
+        self.click_invoices: Dict[str, Dict] = {}
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.injected_errors = 0
+        self.webhook_results: Dict[str, int] = defaultdict(int)
+        self._runner = None
+        self._webhook_session = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        """Serverni ishga tushirish"""
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_post("/payme", self._handle_payme)
+        app.router.add_post("/click/invoice/status", self._handle_click_status)
+        app.router.add_post("/_sim/pay", self._handle_sim_pay)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+
+        # port=0 bo'lsa, OS tanlagan portni olish
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """Serverni to'xtatish"""
+        if self._webhook_session:
+            await self._webhook_session.close()
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _simulate_network(self) -> bool:
+        """Kechikish qo'shish; xato kiritilishi kerak bo'lsa True"""
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            self.injected_errors += 1
+            return True
+        return False
+
+    # --- Ma'lumotlar ------------------------------------------------------
+
+    def add_payme_transaction(self, order_id: str, amount: float, state: int = PAYME_STATE_PERFORMED) -> Dict:
+        """Payme tranzaksiyasini qo'shish (amount so'mda)"""
+        now_ms = int(time.time() * 1000)
+        transaction = {
+            'id': f"{random.getrandbits(96):024x}",
+            'time': now_ms,
+            'amount': round(amount * 100),
+            'account': {'order_id': str(order_id)},
+            'create_time': now_ms,
+            'perform_time': now_ms if state == PAYME_STATE_PERFORMED else 0,
+            'cancel_time': now_ms if state < 0 else 0,
+            'transaction': str(order_id),
+            'state': state,
+            'reason': None
+        }
+        self.payme_transactions[str(order_id)] = transaction
+        return transaction
+
+    def add_click_invoice(self, invoice_id: str, amount: float, status: int = CLICK_INVOICE_PAID) -> Dict:
+        """Click invoice qo'shish"""
+        invoice = {
+            'invoice_id': str(invoice_id),
+            'payment_id': random.randint(10**8, 10**9),
+            'amount': round(amount * 100),
+            'invoice_status': status
+        }
+        self.click_invoices[str(invoice_id)] = invoice
+        return invoice
+
+    # --- Provayder API lari -------------------------------------------------
+
+    async def _handle_payme(self, request):
+        from aiohttp import web
+
+        data = await request.json()
+        method = data.get('method')
+        self.calls[f"payme.{method}"] += 1
+        if await self._simulate_network():
+            return web.Response(status=503)
+
+        params = data.get('params', {})
+        if method == 'GetStatement':
+            start, end = params.get('from', 0), params.get('to', 0)
+            transactions = [
+                t for t in self.payme_transactions.values()
+                if start <= t['create_time'] <= end
+            ]
+            return web.json_response({'id': data.get('id'), 'result': {'transactions': transactions}})
+
+        if method == 'CheckTransaction':
+            for transaction in self.payme_transactions.values():
+                if transaction['id'] == params.get('id'):
+                    return web.json_response({'id': data.get('id'), 'result': transaction})
+            return web.json_response({'id': data.get('id'), 'error': {'code': -31003, 'message': 'Transaction not found'}})
+
+        return web.json_response({'id': data.get('id'), 'error': {'code': -32601, 'message': 'Method not found'}})
+
+    async def _handle_click_status(self, request):
+        from aiohttp import web
+
+        self.calls["click.invoice_status"] += 1
+        data = await request.json()
+        if await self._simulate_network():
+            return web.Response(status=503)
+
+        invoice = self.click_invoices.get(str(data.get('invoice_id')))
+        if invoice is None:
+            return web.json_response({'error_code': -5, 'error_note': 'Invoice not found'})
+        return web.json_response({'error_code': 0, **invoice})
+
+    async def _handle_sim_pay(self, request):
+        """POST /_sim/pay {"provider": "payme"|"click", "order_id": ..., "amount": ...}"""
+        from aiohttp import web
+
+        data = await request.json()
+        provider = data.get('provider', 'payme')
+        order_id = str(data['order_id'])
+        amount = float(data['amount'])
+
+        if provider == 'payme':
+            transaction = self.add_payme_transaction(order_id, amount, PAYME_STATE_CREATED)
+            results = await self._send_payme_webhooks(transaction)
+            transaction['state'] = PAYME_STATE_PERFORMED
+            transaction['perform_time'] = int(time.time() * 1000)
+        elif provider == 'click':
+            invoice = self.add_click_invoice(order_id, amount, CLICK_INVOICE_PENDING)
+            results = await self._send_click_webhooks(order_id, invoice)
+            invoice['invoice_status'] = CLICK_INVOICE_PAID
+        else:
+            return web.json_response({'error': f"unknown provider {provider}"}, status=400)
+
+        return web.json_response({'ok': True, 'webhooks': results})
+
+    # --- Webhook'lar --------------------------------------------------------
+
+    async def _post_webhook(self, path: str, **kwargs) -> Optional[Dict]:
+        import aiohttp
+
+        if not self.webhook_url:
+            return None
+        if self._webhook_session is None:
+            self._webhook_session = aiohttp.ClientSession()
+
+        try:
+            async with self._webhook_session.post(f"{self.webhook_url}{path}", **kwargs) as response:
+                result = await response.json(content_type=None)
+        except Exception as e:
+            self.webhook_results["transport_error"] += 1
+            return {'error': str(e)}
+
+        error = result.get('error')
+        ok = error in (None, 0)
+        self.webhook_results["ok" if ok else "error"] += 1
+        return result
+
+    async def _send_payme_webhooks(self, transaction: Dict) -> List:
+        """CheckPerform -> Create -> Perform ketma-ketligi"""
+        auth = base64.b64encode(f"Paycom:{self.payme_key}".encode()).decode()
+        headers = {'Authorization': f'Basic {auth}'}
+        results = []
+        calls = [
+            ('CheckPerformTransaction', {'amount': transaction['amount'], 'account': transaction['account']}),
+            ('CreateTransaction', {'id': transaction['id'], 'time': transaction['time'],
+                                   'amount': transaction['amount'], 'account': transaction['account']}),
+            ('PerformTransaction', {'id': transaction['id']}),
+        ]
+        for request_id, (method, params) in enumerate(calls, start=1):
+            result = await self._post_webhook(
+                "/webhook/payme", headers=headers,
+                json={'id': request_id, 'method': method, 'params': params}
+            )
+            results.append(result)
+            if result and result.get('error'):
+                break
+        return results
+
+    def _click_sign(self, click_trans_id, order_id, prepare_id, amount, action, sign_time) -> str:
+        return hashlib.md5(
+            f"{click_trans_id}{self.click_service_id}{self.click_secret}{order_id}{prepare_id}{amount}{action}{sign_time}".encode()
+        ).hexdigest()
+
+    async def _send_click_webhooks(self, order_id: str, invoice: Dict) -> List:
+        """Prepare -> Complete ketma-ketligi"""
+        click_trans_id = str(invoice['payment_id'])
+        amount = f"{invoice['amount'] / 100:.2f}"
+        sign_time = time.strftime("%Y-%m-%d %H:%M:%S")
+        base = {
+            'click_trans_id': click_trans_id,
+            'service_id': self.click_service_id,
+            'click_paydoc_id': click_trans_id,
+            'merchant_trans_id': order_id,
+            'amount': amount,
+            'error': '0',
+            'error_note': 'Success',
+            'sign_time': sign_time
+        }
+
+        prepare = dict(base, action='0', sign_string=self._click_sign(click_trans_id, order_id, '', amount, 0, sign_time))
+        result = await self._post_webhook("/webhook/click", data=prepare)
+        results = [result]
+        if not result or result.get('error') not in (None, 0):
+            return results
+
+        prepare_id = str(result.get('merchant_prepare_id'))
+        complete = dict(
+            base, action='1', merchant_prepare_id=prepare_id,
+            sign_string=self._click_sign(click_trans_id, order_id, prepare_id, amount, 1, sign_time)
+        )
+        results.append(await self._post_webhook("/webhook/click", data=complete))
+        return results
+
+# --- PaymentManager benchmark ---------------------------------------------
+
+async def run_bench(args) -> Dict:
+    """Simulyatorga qarshi PaymentManager.check_payment_status throughput"""
+    from config import Config
+
+    simulator = PaymentProviderSimulator(
+        latency=args.latency_ms / 1000.0,
+        jitter=args.jitter_ms / 1000.0,
+        error_rate=args.error_rate
+    )
+    await simulator.start()
+
+    # Provayderlar konstruktorda URL ni o'qiydi
+    Config.PAYME_API_URL = f"{simulator.base_url}/payme"
+    Config.CLICK_API_URL = f"{simulator.base_url}/click"
+    if args.statement_interval is not None:
+        Config.PAYME_STATEMENT_INTERVAL = args.statement_interval
+    from http_client import CircuitOpenError
+    from payments import PaymentManager, PaymentError
+    manager = PaymentManager()
+
+    providers = ["payme", "click"] if args.provider == "all" else [args.provider]
+    states = [('paid', 0.7), ('pending', 0.2), ('cancelled', 0.05), ('missing', 0.05)]
+    jobs = []
+    for i in range(args.payments):
+        method = providers[i % len(providers)]
+        order_id = str(1_000_000 + i)
+        state = random.choices([s for s, _ in states], weights=[w for _, w in states])[0]
+        if method == "payme" and state != 'missing':
+            simulator.add_payme_transaction(order_id, 50000, {
+                'paid': PAYME_STATE_PERFORMED, 'pending': PAYME_STATE_CREATED, 'cancelled': PAYME_STATE_CANCELLED
+            }[state])
+        elif method == "click" and state != 'missing':
+            simulator.add_click_invoice(order_id, 50000, {
+                'paid': CLICK_INVOICE_PAID, 'pending': CLICK_INVOICE_PENDING, 'cancelled': CLICK_INVOICE_CANCELLED
+            }[state])
+        jobs.append((method, order_id))
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    outcomes: Dict[str, int] = defaultdict(int)
+
+    async def check(method: str, order_id: str):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                status = await manager.check_payment_status(method, order_id)
+                outcomes[f"{method}.{status['status']}"] += 1
+            except PaymentError as e:
+                kind = "circuit_open" if isinstance(e.__cause__, CircuitOpenError) else "error"
+                outcomes[f"{method}.{kind}"] += 1
+            latencies[method].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        await asyncio.gather(*(check(method, order_id) for method, order_id in jobs))
+    wall_time = time.perf_counter() - started
+
+    await manager.close_all_sessions()
+    await simulator.stop()
+
+    total = sum(len(v) for v in latencies.values())
+    return {
+        'payments': args.payments,
+        'rounds': args.rounds,
+        'concurrency': args.concurrency,
+        'provider_latency_ms': args.latency_ms,
+        'error_rate': args.error_rate,
+        'wall_time_s': wall_time,
+        'checks_per_s': total / wall_time if wall_time else 0.0,
+        'latency_ms': {
+            method: {
+                'p50': percentile(values, 50) * 1000,
+                'p95': percentile(values, 95) * 1000,
+                'p99': percentile(values, 99) * 1000
+            }
+            for method, values in latencies.items()
+        },
+        'outcomes': dict(outcomes),
+        'provider_calls': dict(simulator.calls),
+        'injected_errors': simulator.injected_errors,
+        'circuit_breakers': {name: client.breaker.state for name, client in manager.http_clients.items()}
+    }
+
+def print_report(report: Dict):
+    """Natijalarni chiqarish"""
+    print(f"\n💳 PaymentManager benchmark: {report['payments']} to'lov x {report['rounds']} marta, "
+          f"concurrency {report['concurrency']}")
+    print(f"   provayder kechikishi {report['provider_latency_ms']:.0f}ms, xato ulushi {report['error_rate'] * 100:.1f}%")
+    print("-" * 60)
+    print(f"⏱ Davomiylik:      {report['wall_time_s']:.2f}s ({report['checks_per_s']:.1f} tekshiruv/s)")
+    for method, latency in report['latency_ms'].items():
+        print(f"📈 {method:<15} p50 {latency['p50']:.1f}ms  p95 {latency['p95']:.1f}ms  p99 {latency['p99']:.1f}ms")
+    print(f"📊 Natijalar:       {report['outcomes']}")
+    print(f"🌐 Provayder so'rovlari: {report['provider_calls']} (kiritilgan xatolar: {report['injected_errors']})")
+    print(f"🔌 Circuit breaker: {report['circuit_breakers']}")
+
+async def serve(args):
+    """Simulyatorni mustaqil ishga tushirish"""
+    from config import Config
+
+    simulator = PaymentProviderSimulator(
+        host=args.host, port=args.port,
+        latency=args.latency_ms / 1000.0,
+        jitter=args.jitter_ms / 1000.0,
+        error_rate=args.error_rate,
+        webhook_url=args.webhook_url,
+        payme_key=Config.PAYME_SECRET_KEY,
+        click_secret=Config.CLICK_SECRET_KEY,
+        click_service_id=Config.CLICK_SERVICE_ID
+    )
+    await simulator.start()
+    print(f"To'lov simulyatori: {simulator.base_url}")
+    print(f"  PAYME_API_URL={simulator.base_url}/payme")
+    print(f"  CLICK_API_URL={simulator.base_url}/click")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await simulator.stop()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="To'lov provayderlari simulyatori")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_network_args(p):
+        p.add_argument("--latency-ms", type=float, default=50.0, help="Provayder javob kechikishi")
+        p.add_argument("--jitter-ms", type=float, default=0.0, help="Tasodifiy qo'shimcha kechikish (0..N ms)")
+        p.add_argument("--error-rate", type=float, default=0.0, help="HTTP 503 qaytarish ehtimoli (0..1)")
+
+    serve_parser = sub.add_parser("serve", help="Simulyatorni HTTP server sifatida ishga tushirish")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8700)
+    serve_parser.add_argument("--webhook-url", help="Bot HTTP serveri (masalan http://127.0.0.1:9100)")
+    add_network_args(serve_parser)
+
+    bench_parser = sub.add_parser("bench", help="PaymentManager throughput benchmark")
+    bench_parser.add_argument("--payments", type=int, default=1000, help="Ochiq to'lovlar soni")
+    bench_parser.add_argument("--rounds", type=int, default=3, help="Har bir to'lov necha marta tekshiriladi")
+    bench_parser.add_argument("--concurrency", type=int, default=50)
+    bench_parser.add_argument("--provider", choices=["payme", "click", "all"], default="all")
+    bench_parser.add_argument("--statement-interval", type=float, help="PAYME_STATEMENT_INTERVAL ni almashtirish")
+    bench_parser.add_argument("--seed", type=int, default=42)
+    bench_parser.add_argument("--json", help="Natijani JSON faylga yozish")
+    add_network_args(bench_parser)
+
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    prepare_environment(getattr(args, "database_url", None))
+
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    random.seed(args.seed)
+    report = asyncio.run(run_bench(args))
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
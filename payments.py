@@ -2,15 +2,23 @@
 To'lov tizimlari integratsiyasi
 """
 
-import aiohttp
+import asyncio
 import hashlib
 import hmac
 import json
+import logging
+import time
 import uuid
 from datetime import datetime
-from typing import Dict, Optional, Tuple
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 from config import Config
 from utils import generate_payment_signature, verify_payment_signature
+from metrics import track_payment_call
+from http_client import CircuitOpenError, ResilientHttpClient
+from events import event_bus, PAYMENT_FAILED, PAYMENT_PAID
+from outbox import enqueue_payment_failed, enqueue_payment_paid, enqueue_refund
+
+logger = logging.getLogger(__name__)
 
 class PaymentError(Exception):
     """To'lov xatosi"""
@@ -19,46 +27,125 @@ class PaymentError(Exception):
 class PaymentProvider:
     """Asosiy to'lov provider klassi"""
     
-    def __init__(self):
-        self.session = None
+    name = "base"
     
-    async def create_session(self):
-        """HTTP session yaratish"""
-        if not self.session:
-            self.session = aiohttp.ClientSession()
+    def __init__(self, http: ResilientHttpClient = None):
+        self.http = http or ResilientHttpClient(self.name)
     
     async def close_session(self):
         """HTTP session yopish"""
-        if self.session:
-            await self.session.close()
-            self.session = None
+        await self.http.close()
     
     async def create_payment(self, amount: float, order_id: str, 
                            return_url: str = None) -> Dict:
         """To'lov yaratish (abstract method)"""
         raise NotImplementedError
     
-    async def check_payment_status(self, payment_id: str) -> Dict:
-        """To'lov holatini tekshirish (abstract method)"""
+    async def check_payment_status(self, payment_id: str, order_id: str = None) -> Dict:
+        """To'lov holatini tekshirish (abstract method); order_id - bron ID si"""
         raise NotImplementedError
     
     async def cancel_payment(self, payment_id: str) -> bool:
         """To'lovni bekor qilish (abstract method)"""
         raise NotImplementedError
 
+# Payme tranzaksiya holatlari
+PAYME_STATE_CREATED = 1
+PAYME_STATE_PERFORMED = 2
+PAYME_STATE_CANCELLED = -1
+PAYME_STATE_CANCELLED_AFTER_PERFORM = -2
+
+class PaymeStatementCache:
+    """
+    GetStatement natijalarini order_id bo'yicha indekslovchi umumiy kesh
+    
+    Statement har bir holat tekshiruvida emas, ko'pi bilan `interval` da bir
+    marta olinadi. Keyingi so'rovlar faqat oxirgi `to` dan boshlab (yoki hali
+    yakunlanmagan eng eski tranzaksiyadan) olinadi. Bir vaqtda kelgan
+    tekshiruvlar bitta so'rovni kutadi.
+    """
+    
+    def __init__(self, fetch: Callable[[int, int], Awaitable[List[Dict]]],
+                 interval: float = None, lookback_hours: int = None):
+        self._fetch = fetch
+        self.interval = interval if interval is not None else Config.PAYME_STATEMENT_INTERVAL
+        self.lookback_ms = (lookback_hours or Config.PAYME_STATEMENT_LOOKBACK_HOURS) * 3600 * 1000
+        self.transactions: Dict[str, Dict] = {}
+        self._last_to: Optional[int] = None
+        self._refreshed_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+    
+    def _is_fresh(self) -> bool:
+        return self._refreshed_at is not None and time.monotonic() - self._refreshed_at < self.interval
+    
+    def _next_from(self, now_ms: int) -> int:
+        """Keyingi so'rov boshlanish vaqti"""
+        if self._last_to is None:
+            return now_ms - self.lookback_ms
+        
+        # Holati hali o'zgarishi mumkin bo'lgan tranzaksiyalarni qayta olish
+        pending = [
+            t.get('create_time', self._last_to) for t in self.transactions.values()
+            if t.get('state') == PAYME_STATE_CREATED
+        ]
+        return min([self._last_to] + pending)
+    
+    def _prune(self, now_ms: int):
+        """Lookback oynasidan tashqaridagi yakunlangan tranzaksiyalarni o'chirish"""
+        border = now_ms - self.lookback_ms
+        stale = [
+            order_id for order_id, t in self.transactions.items()
+            if t.get('state') != PAYME_STATE_CREATED and t.get('create_time', 0) < border
+        ]
+        for order_id in stale:
+            del self.transactions[order_id]
+    
+    async def refresh(self, force: bool = False):
+        """Statement ni yangilash (interval ichida takroriy so'rov yuborilmaydi)"""
+        if not force and self._is_fresh():
+            return
+        
+        async with self._lock:
+            # Lock kutilayotganda boshqa task yangilagan bo'lishi mumkin
+            if not force and self._is_fresh():
+                return
+            
+            now_ms = int(time.time() * 1000)
+            transactions = await self._fetch(self._next_from(now_ms), now_ms)
+            
+            for transaction in transactions:
+                order_id = transaction.get('account', {}).get('order_id')
+                if order_id is not None:
+                    self.transactions[str(order_id)] = transaction
+            
+            self._last_to = now_ms
+            self._refreshed_at = time.monotonic()
+            self._prune(now_ms)
+    
+    async def get(self, order_id: str) -> Optional[Dict]:
+        """order_id bo'yicha tranzaksiyani olish"""
+        await self.refresh()
+        return self.transactions.get(str(order_id))
+
 class PaymeProvider(PaymentProvider):
     """Payme to'lov tizimi"""
     
-    def __init__(self):
-        super().__init__()
+    name = "payme"
+    
+    def __init__(self, http: ResilientHttpClient = None):
+        super().__init__(http)
         self.merchant_id = Config.PAYME_MERCHANT_ID
         self.secret_key = Config.PAYME_SECRET_KEY
         self.test_mode = Config.PAYME_TEST_MODE
         
-        if self.test_mode:
+        if Config.PAYME_API_URL:
+            self.base_url = Config.PAYME_API_URL
+        elif self.test_mode:
             self.base_url = "https://checkout.test.paycom.uz/api"
         else:
             self.base_url = "https://checkout.paycom.uz/api"
+        
+        self.statement = PaymeStatementCache(self._get_statement)
     
     def _generate_auth_header(self) -> str:
         """Authorization header yaratish"""
@@ -69,8 +156,6 @@ class PaymeProvider(PaymentProvider):
     async def create_payment(self, amount: float, order_id: str, 
                            return_url: str = None) -> Dict:
         """Payme to'lov yaratish - VAQTINCHA QO'LDA TASDIQLASH"""
-        await self.create_session()
-        
         # VAQTINCHA: Haqiqiy to'lov URL o'rniga mock
         return {
             'payment_id': f'payme_manual_{order_id}',
@@ -96,10 +181,8 @@ class PaymeProvider(PaymentProvider):
         
         return encoded_params
     
-    async def check_payment_status(self, payment_id: str) -> Dict:
-        """Payme to'lov holatini tekshirish"""
-        await self.create_session()
-        
+    async def _get_statement(self, from_ms: int, to_ms: int) -> List[Dict]:
+        """GetStatement: [from_ms, to_ms] oralig'idagi tranzaksiyalar"""
         headers = {
             'Authorization': f'Basic {self._generate_auth_header()}',
             'Content-Type': 'application/json'
@@ -108,57 +191,64 @@ class PaymeProvider(PaymentProvider):
         payload = {
             'method': 'GetStatement',
             'params': {
-                'from': int((datetime.now().timestamp() - 86400) * 1000),  # 24 soat oldin
-                'to': int(datetime.now().timestamp() * 1000)
+                'from': from_ms,
+                'to': to_ms
             }
         }
         
         try:
-            async with self.session.post(
-                f"{self.base_url}",
-                headers=headers,
-                json=payload
-            ) as response:
-                data = await response.json()
-                
-                if 'result' in data:
-                    # To'lov ma'lumotlarini qidirish
-                    for transaction in data['result']['transactions']:
-                        if transaction.get('account', {}).get('order_id') == payment_id:
-                            state = transaction.get('state')
-                            if state == 2:  # To'langan
-                                return {
-                                    'status': 'paid',
-                                    'transaction_id': transaction.get('id'),
-                                    'amount': transaction.get('amount', 0) / 100
-                                }
-                            elif state == -1:  # Bekor qilingan
-                                return {
-                                    'status': 'cancelled',
-                                    'transaction_id': transaction.get('id')
-                                }
-                            else:
-                                return {
-                                    'status': 'pending',
-                                    'transaction_id': transaction.get('id')
-                                }
-                
-                return {'status': 'not_found'}
-                
+            # GetStatement faqat o'qiydi, shuning uchun qayta yuborish xavfsiz
+            data = await self.http.post_json(self.base_url, payload, headers=headers, idempotent=True)
+        except CircuitOpenError as e:
+            raise PaymentError(str(e)) from e
         except Exception as e:
             raise PaymentError(f"Payme API xatosi: {str(e)}")
+        
+        if 'result' not in data:
+            raise PaymentError(f"Payme API xatosi: {data.get('error')}")
+        
+        return data['result'].get('transactions', [])
+    
+    async def check_payment_status(self, payment_id: str, order_id: str = None) -> Dict:
+        """Payme to'lov holatini tekshirish (umumiy statement keshidan)"""
+        # Statement tranzaksiyalari account.order_id bo'yicha indekslangan
+        transaction = await self.statement.get(order_id or payment_id)
+        if transaction is None:
+            return {'status': 'not_found'}
+        
+        state = transaction.get('state')
+        if state == PAYME_STATE_PERFORMED:  # To'langan
+            return {
+                'status': 'paid',
+                'transaction_id': transaction.get('id'),
+                'amount': transaction.get('amount', 0) / 100
+            }
+        elif state in (PAYME_STATE_CANCELLED, PAYME_STATE_CANCELLED_AFTER_PERFORM):  # Bekor qilingan
+            return {
+                'status': 'cancelled',
+                'transaction_id': transaction.get('id')
+            }
+        else:
+            return {
+                'status': 'pending',
+                'transaction_id': transaction.get('id')
+            }
 
 class ClickProvider(PaymentProvider):
     """Click to'lov tizimi"""
     
-    def __init__(self):
-        super().__init__()
+    name = "click"
+    
+    def __init__(self, http: ResilientHttpClient = None):
+        super().__init__(http)
         self.merchant_id = Config.CLICK_MERCHANT_ID
         self.service_id = Config.CLICK_SERVICE_ID
         self.secret_key = Config.CLICK_SECRET_KEY
         self.test_mode = Config.CLICK_TEST_MODE
         
-        if self.test_mode:
+        if Config.CLICK_API_URL:
+            self.base_url = Config.CLICK_API_URL
+        elif self.test_mode:
             self.base_url = "https://api.click.uz/v2/merchant"
         else:
             self.base_url = "https://api.click.uz/v2/merchant"
@@ -166,8 +256,6 @@ class ClickProvider(PaymentProvider):
     async def create_payment(self, amount: float, order_id: str, 
                            return_url: str = None) -> Dict:
         """Click to'lov yaratish - VAQTINCHA QO'LDA TASDIQLASH"""
-        await self.create_session()
-        
         # VAQTINCHA: Haqiqiy API o'rniga mock
         return {
             'payment_id': f'click_manual_{order_id}',
@@ -177,10 +265,8 @@ class ClickProvider(PaymentProvider):
             'method': 'click'
         }
     
-    async def check_payment_status(self, payment_id: str) -> Dict:
+    async def check_payment_status(self, payment_id: str, order_id: str = None) -> Dict:
         """Click to'lov holatini tekshirish"""
-        await self.create_session()
-        
         check_data = {
             'service_id': self.service_id,
             'merchant_id': self.merchant_id,
@@ -192,41 +278,63 @@ class ClickProvider(PaymentProvider):
         check_data['sign'] = hashlib.md5(sign_string.encode()).hexdigest()
         
         try:
-            async with self.session.post(
+            data = await self.http.post_json(
                 f"{self.base_url}/invoice/status",
-                json=check_data
-            ) as response:
-                data = await response.json()
-                
-                if data.get('error_code') == 0:
-                    status_code = data.get('invoice_status')
-                    if status_code == 2:  # To'langan
-                        return {
-                            'status': 'paid',
-                            'transaction_id': data.get('payment_id'),
-                            'amount': data.get('amount', 0) / 100
-                        }
-                    elif status_code == -1:  # Bekor qilingan
-                        return {
-                            'status': 'cancelled',
-                            'transaction_id': data.get('payment_id')
-                        }
-                    else:
-                        return {
-                            'status': 'pending',
-                            'transaction_id': data.get('payment_id')
-                        }
-                else:
-                    return {'status': 'not_found'}
-                    
+                check_data,
+                idempotent=True
+            )
+        except CircuitOpenError as e:
+            raise PaymentError(str(e)) from e
+        except Exception as e:
+            raise PaymentError(f"Click API xatosi: {str(e)}")
+        
+        if data.get('error_code') == 0:
+            status_code = data.get('invoice_status')
+            if status_code == 2:  # To'langan
+                return {
+                    'status': 'paid',
+                    'transaction_id': data.get('payment_id'),
+                    'amount': data.get('amount', 0) / 100
+                }
+            elif status_code == -1:  # Bekor qilingan
+                return {
+                    'status': 'cancelled',
+                    'transaction_id': data.get('payment_id')
+                }
+            else:
+                return {
+                    'status': 'pending',
+                    'transaction_id': data.get('payment_id')
+                }
+        else:
+            return {'status': 'not_found'}
+    
+    async def cancel_payment(self, payment_id: str) -> bool:
+        """Click to'lovini qaytarish (reversal); provayder rad etsa - False"""
+        sign_string = f"{self.service_id}{self.merchant_id}{payment_id}{self.secret_key}"
+        
+        try:
+            # Bir to'lovni ikki marta qaytarib bo'lmaydi - qayta yuborish xavfsiz
+            data = await self.http.request_json(
+                "DELETE",
+                f"{self.base_url}/payment/reversal/{self.service_id}/{payment_id}",
+                idempotent=True,
+                headers={'Auth': f"{self.merchant_id}:{hashlib.md5(sign_string.encode()).hexdigest()}"}
+            )
+        except CircuitOpenError as e:
+            raise PaymentError(str(e)) from e
         except Exception as e:
             raise PaymentError(f"Click API xatosi: {str(e)}")
+        
+        return data.get('error_code') == 0
 
 class UzumPayProvider(PaymentProvider):
     """Uzum Pay to'lov tizimi"""
     
-    def __init__(self):
-        super().__init__()
+    name = "uzum"
+    
+    def __init__(self, http: ResilientHttpClient = None):
+        super().__init__(http)
         self.merchant_id = Config.UZUM_MERCHANT_ID
         self.secret_key = Config.UZUM_SECRET_KEY
         self.test_mode = Config.UZUM_TEST_MODE
@@ -247,7 +355,7 @@ class UzumPayProvider(PaymentProvider):
             'method': 'uzum'
         }
     
-    async def check_payment_status(self, payment_id: str) -> Dict:
+    async def check_payment_status(self, payment_id: str, order_id: str = None) -> Dict:
         """Uzum Pay to'lov holatini tekshirish"""
         # Mock implementation
         return {'status': 'pending'}
@@ -256,152 +364,591 @@ class PaymentManager:
     """To'lov menejeri"""
     
     def __init__(self):
+        # Har bir provayder o'z connection pool'i va circuit breaker'iga ega
+        self.http_clients = {
+            name: ResilientHttpClient(name) for name in ('payme', 'click', 'uzum')
+        }
         self.providers = {
-            'payme': PaymeProvider(),
-            'click': ClickProvider(),
-            'uzum': UzumPayProvider()
+            'payme': PaymeProvider(self.http_clients['payme']),
+            'click': ClickProvider(self.http_clients['click']),
+            'uzum': UzumPayProvider(self.http_clients['uzum'])
         }
     
+    def get_provider(self, method) -> Tuple[str, PaymentProvider]:
+        """To'lov usuli (str yoki PaymentMethod) bo'yicha provider"""
+        method = getattr(method, 'value', method)
+        if method not in self.providers:
+            raise PaymentError(f"Noto'g'ri to'lov usuli: {method}")
+        return method, self.providers[method]
+    
     async def create_payment(self, method: str, amount: float, 
                            order_id: str, return_url: str = None) -> Dict:
         """To'lov yaratish"""
-        if method not in self.providers:
-            raise PaymentError(f"Noto'g'ri to'lov usuli: {method}")
-        
-        provider = self.providers[method]
-        return await provider.create_payment(amount, order_id, return_url)
+        method, provider = self.get_provider(method)
+        with track_payment_call(method, "create_payment"):
+            return await provider.create_payment(amount, order_id, return_url)
     
-    async def check_payment_status(self, method: str, payment_id: str) -> Dict:
+    async def check_payment_status(self, method: str, payment_id: str, order_id: str = None) -> Dict:
         """To'lov holatini tekshirish"""
-        if method not in self.providers:
-            raise PaymentError(f"Noto'g'ri to'lov usuli: {method}")
-        
-        provider = self.providers[method]
-        return await provider.check_payment_status(payment_id)
+        method, provider = self.get_provider(method)
+        with track_payment_call(method, "check_payment_status"):
+            return await provider.check_payment_status(payment_id, order_id)
     
     async def cancel_payment(self, method: str, payment_id: str) -> bool:
         """To'lovni bekor qilish"""
-        if method not in self.providers:
-            raise PaymentError(f"Noto'g'ri to'lov usuli: {method}")
-        
-        provider = self.providers[method]
-        return await provider.cancel_payment(payment_id)
+        method, provider = self.get_provider(method)
+        with track_payment_call(method, "cancel_payment"):
+            return await provider.cancel_payment(payment_id)
     
     async def close_all_sessions(self):
         """Barcha sessiyalarni yopish"""
-        for provider in self.providers.values():
-            await provider.close_session()
+        for client in self.http_clients.values():
+            await client.close()
 
 # Webhook handlers
+#
+# Holat o'zgarishlari shartli UPDATE ... RETURNING bilan bitta so'rovda
+# bajariladi: takroriy (replay) chaqiruv hech qanday qatorni o'zgartirmaydi
+# va mavjud holat qaytariladi. Idempotentlik kaliti - transaction_id
+# (unique index).
+
+# Payme xato kodlari
+PAYME_ERROR_INSUFFICIENT_PRIVILEGE = -32504
+PAYME_ERROR_METHOD_NOT_FOUND = -32601
+PAYME_ERROR_INVALID_AMOUNT = -31001
+PAYME_ERROR_TRANSACTION_NOT_FOUND = -31003
+PAYME_ERROR_CANT_PERFORM = -31008
+PAYME_ERROR_ORDER_NOT_FOUND = -31050
+PAYME_ERROR_ORDER_BUSY = -31051
+
+async def _publish_event(event: Tuple[str, Dict]):
+    """Commit dan keyingi hodisa - faqat uyg'otish signali; xato webhook javobiga ta'sir qilmaydi"""
+    try:
+        await event_bus.publish(*event)
+    except Exception as e:
+        # Outbox yozuvlari commit qilingan - worker ularni navbatdagi so'rovda oladi
+        logger.error(f"Payment event publish error ({event[0]} {event[1]}): {e}")
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+def payme_error(code: int, message: str, data: str = None) -> Dict:
+    error = {'code': code, 'message': {'uz': message, 'ru': message, 'en': message}}
+    if data:
+        error['data'] = data
+    return {'error': error}
+
+def verify_payme_auth(authorization: Optional[str]) -> bool:
+    """Payme Basic auth sarlavhasini tekshirish (Paycom:<secret_key>)"""
+    import base64
+    if not authorization or not authorization.startswith('Basic ') or not Config.PAYME_SECRET_KEY:
+        return False
+    try:
+        decoded = base64.b64decode(authorization[6:]).decode()
+    except Exception:
+        return False
+    login, _, password = decoded.partition(':')
+    return login == 'Paycom' and hmac.compare_digest(password, Config.PAYME_SECRET_KEY)
+
+def _payme_state(payment) -> int:
+    """Payment qatoridan Payme tranzaksiya holati"""
+    from database import PaymentStatus
+    if payment.status == PaymentStatus.PAID:
+        return PAYME_STATE_PERFORMED
+    if payment.status == PaymentStatus.REFUNDED:
+        return PAYME_STATE_CANCELLED_AFTER_PERFORM
+    if payment.status == PaymentStatus.FAILED:
+        return PAYME_STATE_CANCELLED
+    return PAYME_STATE_CREATED
+
+def _payme_transaction(payment) -> Dict:
+    """CheckTransaction/Perform/Cancel javobi uchun tranzaksiya ma'lumotlari"""
+    return {
+        'create_time': payment.provider_create_time or 0,
+        'perform_time': payment.provider_perform_time or 0,
+        'cancel_time': payment.provider_cancel_time or 0,
+        'transaction': str(payment.id),
+        'state': _payme_state(payment),
+        'reason': payment.cancel_reason
+    }
+
+def _parse_order_id(account: Dict) -> Optional[int]:
+    try:
+        return int(account.get('order_id'))
+    except (TypeError, ValueError):
+        return None
+
+async def _payme_check_order(session, order_id: Optional[int], amount: int) -> Optional[Dict]:
+    """Buyurtmani tekshirish: xato bo'lsa Payme error, aks holda None"""
+    from sqlalchemy import select
+    from database import Booking, BookingStatus, Payment, PaymentMethod, PaymentStatus
+    
+    if order_id is None:
+        return payme_error(PAYME_ERROR_ORDER_NOT_FOUND, "Buyurtma topilmadi", "order_id")
+    
+    result = await session.execute(
+        select(Payment, Booking.status)
+        .join(Booking, Booking.id == Payment.booking_id)
+        .where(Payment.booking_id == order_id, Payment.payment_method == PaymentMethod.PAYME)
+    )
+    row = result.first()
+    if row is None:
+        return payme_error(PAYME_ERROR_ORDER_NOT_FOUND, "Buyurtma topilmadi", "order_id")
+    
+    payment, booking_status = row
+    if round(payment.amount * 100) != amount:
+        return payme_error(PAYME_ERROR_INVALID_AMOUNT, "Noto'g'ri summa")
+    if booking_status not in (BookingStatus.PENDING, BookingStatus.HOLD):
+        return payme_error(PAYME_ERROR_CANT_PERFORM, "Buyurtmani to'lab bo'lmaydi")
+    if payment.status != PaymentStatus.PENDING:
+        return payme_error(PAYME_ERROR_ORDER_BUSY, "Buyurtma boshqa tranzaksiyada", "order_id")
+    return None
+
+async def _claim_payment(session, statement):
+    """
+    To'lovga tranzaksiya ID sini biriktirish (UPDATE ... RETURNING)
+    
+    transaction_id boshqa to'lovda band bo'lsa (unique index) None qaytaradi,
+    chaqiruvchi replay holatini tekshiradi.
+    """
+    from sqlalchemy.exc import IntegrityError
+    try:
+        result = await session.execute(statement)
+    except IntegrityError:
+        await session.rollback()
+        return None
+    return result.first()
+
+async def confirm_paid_booking(session, booking_id: int, payment_id: int) -> bool:
+    """
+    To'langan bronni tasdiqlash (faqat PENDING/HOLD bron)
+    
+    Bron to'lov kelguncha bekor qilingan bo'lsa (slot boshqa mijozga
+    berilgan bo'lishi mumkin) - tasdiqlanmaydi, to'lov qaytarishga yoziladi.
+    """
+    from sqlalchemy import update
+    from database import Booking, BookingStatus
+    confirmed = await session.scalar(
+        update(Booking)
+        .where(Booking.id == booking_id, Booking.status.in_([BookingStatus.PENDING, BookingStatus.HOLD]))
+        .values(status=BookingStatus.CONFIRMED, updated_at=datetime.utcnow())
+        .returning(Booking.id)
+        .execution_options(synchronize_session=False)
+    )
+    if confirmed is None:
+        logger.warning(f"To'lov {payment_id} yopilgan bron {booking_id} uchun keldi - qaytariladi")
+        enqueue_refund(session, booking_id, payment_id)
+        return False
+    enqueue_payment_paid(session, booking_id)
+    return True
+
+async def _get_payment_by_transaction(session, transaction_id: str):
+    from sqlalchemy import select
+    from database import Payment
+    result = await session.execute(select(Payment).where(Payment.transaction_id == transaction_id))
+    return result.scalar_one_or_none()
+
 async def handle_payme_webhook(data: Dict) -> Dict:
-    """Payme webhook ishlov berish"""
-    method = data.get('method')
+    """Payme webhook (Merchant API JSON-RPC) ishlov berish"""
+    from sqlalchemy import case, literal, select, update
+    from database import async_session, Booking, BookingStatus, Payment, PaymentMethod, PaymentStatus
     
-    if method == 'CheckPerformTransaction':
-        # To'lov imkoniyatini tekshirish
-        account = data.get('params', {}).get('account', {})
-        order_id = account.get('order_id')
+    method = data.get('method')
+    params = data.get('params', {})
+    transaction_id = params.get('id')
+    event = None
+    
+    async with async_session() as session:
+        if method == 'CheckPerformTransaction':
+            error = await _payme_check_order(session, _parse_order_id(params.get('account', {})), params.get('amount'))
+            return error or {'result': {'allow': True}}
         
-        # Bu yerda order_id ni database da tekshirish kerak
-        # Hozircha mock response
-        return {
-            'result': {
-                'allow': True
-            }
-        }
-    
-    elif method == 'CreateTransaction':
-        # Tranzaksiya yaratish
-        return {
-            'result': {
-                'create_time': int(datetime.now().timestamp() * 1000),
-                'transaction': data.get('params', {}).get('id'),
-                'state': 1
-            }
-        }
-    
-    elif method == 'PerformTransaction':
-        # To'lovni amalga oshirish
-        return {
-            'result': {
-                'perform_time': int(datetime.now().timestamp() * 1000),
-                'transaction': data.get('params', {}).get('id'),
-                'state': 2
-            }
-        }
-    
-    elif method == 'CancelTransaction':
-        # To'lovni bekor qilish
-        return {
-            'result': {
-                'cancel_time': int(datetime.now().timestamp() * 1000),
-                'transaction': data.get('params', {}).get('id'),
-                'state': -1
-            }
-        }
-    
-    elif method == 'CheckTransaction':
-        # Tranzaksiya holatini tekshirish
-        return {
-            'result': {
-                'create_time': int(datetime.now().timestamp() * 1000),
-                'perform_time': int(datetime.now().timestamp() * 1000),
-                'cancel_time': 0,
-                'transaction': data.get('params', {}).get('id'),
-                'state': 2,
-                'reason': None
-            }
-        }
+        elif method == 'CreateTransaction':
+            order_id = _parse_order_id(params.get('account', {}))
+            create_time = params.get('time') or _now_ms()
+            
+            # Bitta so'rov: faqat hali tranzaksiyasi yo'q PENDING to'lovni egallash
+            row = await _claim_payment(
+                session,
+                update(Payment)
+                .where(
+                    Payment.booking_id == order_id,
+                    Payment.payment_method == PaymentMethod.PAYME,
+                    Payment.status == PaymentStatus.PENDING,
+                    Payment.transaction_id.is_(None)
+                )
+                .values(
+                    transaction_id=transaction_id,
+                    status=PaymentStatus.PROCESSING,
+                    provider_create_time=create_time,
+                    updated_at=datetime.utcnow()
+                )
+                .returning(Payment.id, Payment.amount)
+                .execution_options(synchronize_session=False)
+            )
+            if row is not None:
+                if round(row.amount * 100) != params.get('amount'):
+                    await session.rollback()
+                    return payme_error(PAYME_ERROR_INVALID_AMOUNT, "Noto'g'ri summa")
+                await session.commit()
+                return {'result': {
+                    'create_time': create_time,
+                    'transaction': str(row.id),
+                    'state': PAYME_STATE_CREATED
+                }}
+            
+            # Replay: shu tranzaksiya allaqachon yaratilgan
+            payment = await _get_payment_by_transaction(session, transaction_id)
+            if payment is not None:
+                if payment.status != PaymentStatus.PROCESSING:
+                    return payme_error(PAYME_ERROR_CANT_PERFORM, "Tranzaksiya yakunlangan")
+                return {'result': {
+                    'create_time': payment.provider_create_time,
+                    'transaction': str(payment.id),
+                    'state': PAYME_STATE_CREATED
+                }}
+            
+            return await _payme_check_order(session, order_id, params.get('amount')) or \
+                payme_error(PAYME_ERROR_ORDER_BUSY, "Buyurtma boshqa tranzaksiyada", "order_id")
+        
+        elif method == 'PerformTransaction':
+            perform_time = _now_ms()
+            result = await session.execute(
+                update(Payment)
+                .where(Payment.transaction_id == transaction_id, Payment.status == PaymentStatus.PROCESSING)
+                .values(
+                    status=PaymentStatus.PAID,
+                    paid_at=datetime.utcnow(),
+                    provider_perform_time=perform_time,
+                    updated_at=datetime.utcnow()
+                )
+                .returning(Payment.id, Payment.booking_id)
+                .execution_options(synchronize_session=False)
+            )
+            row = result.first()
+            if row is not None:
+                confirmed = await confirm_paid_booking(session, row.booking_id, row.id)
+                await session.commit()
+                if confirmed:
+                    event = (PAYMENT_PAID, {'booking_id': row.booking_id, 'payment_id': row.id, 'method': 'payme'})
+                response = {'result': {
+                    'perform_time': perform_time,
+                    'transaction': str(row.id),
+                    'state': PAYME_STATE_PERFORMED
+                }}
+            else:
+                payment = await _get_payment_by_transaction(session, transaction_id)
+                if payment is None:
+                    return payme_error(PAYME_ERROR_TRANSACTION_NOT_FOUND, "Tranzaksiya topilmadi")
+                if payment.status != PaymentStatus.PAID:
+                    return payme_error(PAYME_ERROR_CANT_PERFORM, "Tranzaksiya bekor qilingan")
+                return {'result': {
+                    'perform_time': payment.provider_perform_time,
+                    'transaction': str(payment.id),
+                    'state': PAYME_STATE_PERFORMED
+                }}
+        
+        elif method == 'CancelTransaction':
+            cancel_time = _now_ms()
+            result = await session.execute(
+                update(Payment)
+                .where(
+                    Payment.transaction_id == transaction_id,
+                    Payment.status.in_([PaymentStatus.PROCESSING, PaymentStatus.PAID])
+                )
+                .values(
+                    status=case(
+                        (Payment.status == PaymentStatus.PAID, literal(PaymentStatus.REFUNDED, Payment.status.type)),
+                        else_=literal(PaymentStatus.FAILED, Payment.status.type)
+                    ),
+                    provider_cancel_time=cancel_time,
+                    cancel_reason=params.get('reason'),
+                    updated_at=datetime.utcnow()
+                )
+                .returning(Payment.id, Payment.booking_id, Payment.status)
+                .execution_options(synchronize_session=False)
+            )
+            row = result.first()
+            if row is not None:
+                await session.execute(
+                    update(Booking)
+                    .where(Booking.id == row.booking_id)
+                    .values(status=BookingStatus.CANCELLED, updated_at=datetime.utcnow())
+                    .execution_options(synchronize_session=False)
+                )
+                enqueue_payment_failed(session, row.booking_id)
+                await session.commit()
+                event = (PAYMENT_FAILED, {'booking_id': row.booking_id, 'payment_id': row.id, 'method': 'payme'})
+                response = {'result': {
+                    'cancel_time': cancel_time,
+                    'transaction': str(row.id),
+                    'state': PAYME_STATE_CANCELLED_AFTER_PERFORM if row.status == PaymentStatus.REFUNDED else PAYME_STATE_CANCELLED
+                }}
+            else:
+                payment = await _get_payment_by_transaction(session, transaction_id)
+                if payment is None:
+                    return payme_error(PAYME_ERROR_TRANSACTION_NOT_FOUND, "Tranzaksiya topilmadi")
+                return {'result': {
+                    'cancel_time': payment.provider_cancel_time or 0,
+                    'transaction': str(payment.id),
+                    'state': _payme_state(payment)
+                }}
+        
+        elif method == 'CheckTransaction':
+            payment = await _get_payment_by_transaction(session, transaction_id)
+            if payment is None:
+                return payme_error(PAYME_ERROR_TRANSACTION_NOT_FOUND, "Tranzaksiya topilmadi")
+            return {'result': _payme_transaction(payment)}
+        
+        elif method == 'GetStatement':
+            result = await session.execute(
+                select(Payment)
+                .where(
+                    Payment.payment_method == PaymentMethod.PAYME,
+                    Payment.provider_create_time.between(params.get('from', 0), params.get('to', 0))
+                )
+                .order_by(Payment.provider_create_time)
+            )
+            transactions = []
+            for payment in result.scalars():
+                transaction = _payme_transaction(payment)
+                transaction.update({
+                    'id': payment.transaction_id,
+                    'time': payment.provider_create_time,
+                    'amount': round(payment.amount * 100),
+                    'account': {'order_id': str(payment.booking_id)}
+                })
+                transactions.append(transaction)
+            return {'result': {'transactions': transactions}}
+        
+        else:
+            return payme_error(PAYME_ERROR_METHOD_NOT_FOUND, "Noto'g'ri method")
     
-    return {'error': {'code': -32400, 'message': 'Noto\'g\'ri method'}}
+    # Hodisa faqat commit dan keyin e'lon qilinadi
+    if event:
+        await _publish_event(event)
+    return response
+
+# Click xato kodlari
+CLICK_ERROR_SIGN = -1
+CLICK_ERROR_AMOUNT = -2
+CLICK_ERROR_ACTION = -3
+CLICK_ERROR_ALREADY_PAID = -4
+CLICK_ERROR_ORDER_NOT_FOUND = -5
+CLICK_ERROR_TRANSACTION_NOT_FOUND = -6
+CLICK_ERROR_REQUEST = -8
+CLICK_ERROR_CANCELLED = -9
+
+def _click_response(data: Dict, error: int, note: str, **extra) -> Dict:
+    response = {
+        'click_trans_id': data.get('click_trans_id'),
+        'merchant_trans_id': data.get('merchant_trans_id'),
+        'error': error,
+        'error_note': note
+    }
+    response.update(extra)
+    return response
 
 async def handle_click_webhook(data: Dict) -> Dict:
-    """Click webhook ishlov berish"""
+    """Click webhook (Prepare/Complete) ishlov berish"""
+    from sqlalchemy import update
+    from database import async_session, Booking, BookingStatus, Payment, PaymentMethod, PaymentStatus
+    
     # Click webhook parametrlari
-    click_trans_id = data.get('click_trans_id')
+    click_trans_id = str(data.get('click_trans_id'))
     service_id = data.get('service_id')
     merchant_trans_id = data.get('merchant_trans_id')
+    merchant_prepare_id = data.get('merchant_prepare_id', '')
     amount = data.get('amount')
-    action = data.get('action')
-    error = data.get('error')
     sign_time = data.get('sign_time')
     sign_string = data.get('sign_string')
     
-    # Imzoni tekshirish
-    expected_sign = hashlib.md5(
-        f"{click_trans_id}{service_id}{Config.CLICK_SECRET_KEY}{merchant_trans_id}{amount}{action}{sign_time}".encode()
-    ).hexdigest()
+    try:
+        action = int(data.get('action'))
+        error = int(data.get('error', 0))
+        order_id = int(merchant_trans_id)
+        amount_value = float(amount)
+    except (TypeError, ValueError):
+        return _click_response(data, CLICK_ERROR_REQUEST, "Noto'g'ri so'rov")
     
-    if sign_string != expected_sign:
-        return {
-            'error': -1,
-            'error_note': 'Noto\'g\'ri imzo'
-        }
+    # Kalit sozlanmagan bo'lsa imzoni tekshirib bo'lmaydi - so'rov rad etiladi
+    if not Config.CLICK_SECRET_KEY or str(service_id) != str(Config.CLICK_SERVICE_ID):
+        return _click_response(data, CLICK_ERROR_SIGN, "Noto'g'ri imzo")
     
-    if action == 0:  # Prepare
-        # To'lovni tayyorlash
-        return {
-            'click_trans_id': click_trans_id,
-            'merchant_trans_id': merchant_trans_id,
-            'merchant_prepare_id': int(datetime.now().timestamp()),
-            'error': 0,
-            'error_note': 'Success'
-        }
+    # Imzoni tekshirish (Complete da merchant_prepare_id ham kiradi)
+    prepare_part = merchant_prepare_id if action == 1 else ''
+    expected_sign = hashlib.md5(
+        f"{click_trans_id}{service_id}{Config.CLICK_SECRET_KEY}{merchant_trans_id}{prepare_part}{amount}{action}{sign_time}".encode()
+    ).hexdigest()
     
-    elif action == 1:  # Complete
-        # To'lovni yakunlash
-        return {
-            'click_trans_id': click_trans_id,
-            'merchant_trans_id': merchant_trans_id,
-            'merchant_confirm_id': int(datetime.now().timestamp()),
-            'error': 0,
-            'error_note': 'Success'
-        }
+    if not sign_string or not hmac.compare_digest(sign_string, expected_sign):
+        return _click_response(data, CLICK_ERROR_SIGN, "Noto'g'ri imzo")
+    
+    event = None
+    
+    async with async_session() as session:
+        if action == 0:  # Prepare
+            row = await _claim_payment(
+                session,
+                update(Payment)
+                .where(
+                    Payment.booking_id == order_id,
+                    Payment.payment_method == PaymentMethod.CLICK,
+                    Payment.status == PaymentStatus.PENDING,
+                    Payment.transaction_id.is_(None)
+                )
+                .values(transaction_id=click_trans_id, status=PaymentStatus.PROCESSING, updated_at=datetime.utcnow())
+                .returning(Payment.id, Payment.amount)
+                .execution_options(synchronize_session=False)
+            )
+            if row is not None:
+                if abs(row.amount - amount_value) >= 0.01:
+                    await session.rollback()
+                    return _click_response(data, CLICK_ERROR_AMOUNT, "Noto'g'ri summa")
+                await session.commit()
+                return _click_response(data, 0, "Success", merchant_prepare_id=row.id)
+            
+            payment = await _get_payment_by_transaction(session, click_trans_id)
+            if payment is not None and payment.booking_id == order_id:
+                # Replay
+                if payment.status == PaymentStatus.FAILED:
+                    return _click_response(data, CLICK_ERROR_CANCELLED, "Tranzaksiya bekor qilingan")
+                return _click_response(data, 0, "Success", merchant_prepare_id=payment.id)
+            
+            return _click_response(data, CLICK_ERROR_ORDER_NOT_FOUND, "Buyurtma topilmadi yoki to'langan")
+        
+        elif action == 1:  # Complete
+            try:
+                prepare_id = int(merchant_prepare_id)
+            except (TypeError, ValueError):
+                return _click_response(data, CLICK_ERROR_TRANSACTION_NOT_FOUND, "Tranzaksiya topilmadi")
+            
+            if error < 0:
+                # Click tomonida to'lov amalga oshmadi
+                new_status = PaymentStatus.FAILED
+                values = {'status': new_status, 'error_message': f"click error {error}"}
+            else:
+                new_status = PaymentStatus.PAID
+                values = {'status': new_status, 'paid_at': datetime.utcnow()}
+            
+            result = await session.execute(
+                update(Payment)
+                .where(
+                    Payment.id == prepare_id,
+                    Payment.transaction_id == click_trans_id,
+                    Payment.status == PaymentStatus.PROCESSING
+                )
+                .values(updated_at=datetime.utcnow(), **values)
+                .returning(Payment.id, Payment.booking_id)
+                .execution_options(synchronize_session=False)
+            )
+            row = result.first()
+            if row is not None:
+                if new_status == PaymentStatus.PAID:
+                    confirmed = await confirm_paid_booking(session, row.booking_id, row.id)
+                else:
+                    await session.execute(
+                        update(Booking)
+                        .where(Booking.id == row.booking_id, Booking.status.in_([BookingStatus.PENDING, BookingStatus.HOLD]))
+                        .values(status=BookingStatus.CANCELLED, updated_at=datetime.utcnow())
+                        .execution_options(synchronize_session=False)
+                    )
+                    enqueue_payment_failed(session, row.booking_id)
+                await session.commit()
+                if new_status == PaymentStatus.PAID:
+                    if confirmed:
+                        event = (PAYMENT_PAID, {'booking_id': row.booking_id, 'payment_id': row.id, 'method': 'click'})
+                    response = _click_response(data, 0, "Success", merchant_confirm_id=row.id)
+                else:
+                    event = (PAYMENT_FAILED, {'booking_id': row.booking_id, 'payment_id': row.id, 'method': 'click'})
+                    response = _click_response(data, CLICK_ERROR_CANCELLED, "Tranzaksiya bekor qilingan")
+            else:
+                payment = await _get_payment_by_transaction(session, click_trans_id)
+                if payment is None or payment.id != prepare_id:
+                    return _click_response(data, CLICK_ERROR_TRANSACTION_NOT_FOUND, "Tranzaksiya topilmadi")
+                if payment.status == PaymentStatus.PAID:
+                    # Replay: shu tranzaksiya allaqachon yakunlangan
+                    return _click_response(data, 0, "Success", merchant_confirm_id=payment.id)
+                return _click_response(data, CLICK_ERROR_CANCELLED, "Tranzaksiya bekor qilingan")
+        
+        else:
+            return _click_response(data, CLICK_ERROR_ACTION, "Noto'g'ri action")
     
-    return {
-        'error': -9,
-        'error_note': 'Noto\'g\'ri action'
-    }
+    # Hodisa faqat commit dan keyin e'lon qilinadi
+    if event:
+        await _publish_event(event)
+    return response
 
 # Global payment manager
 payment_manager = PaymentManager()
+
+# To'lovni qaytarish natijalari
+REFUND_DONE = "refunded"
+REFUND_MANUAL = "manual"
+
+# Payme CancelTransaction sababi: mablag' qaytarildi
+REFUND_CANCEL_REASON = 5
+
+_refund_semaphore: Optional[asyncio.Semaphore] = None
+
+async def refund_payment(payment_id: int) -> Optional[str]:
+    """
+    Bekor qilingan bron to'lovini qaytarish (outbox REFUND_PAYMENT handleri)
+
+    Natija: REFUND_DONE, REFUND_MANUAL (provayder API orqali qaytarib
+    bo'lmaydi - admin qo'lda qaytaradi) yoki None (qaytariladigan to'lov yo'q).
+    Vaqtinchalik xato PaymentError sifatida ko'tariladi - outbox qayta uradi.
+    """
+    from sqlalchemy import update
+    from database import async_session, Payment, PaymentMethod, PaymentStatus
+    global _refund_semaphore
+    
+    async with async_session() as session:
+        payment = await session.get(Payment, payment_id)
+        if payment is None or payment.status != PaymentStatus.PAID:
+            return None
+        method = payment.payment_method
+        reference = payment.transaction_id or payment.external_payment_id
+    
+    # VAQTINCHA: qo'lda to'lov rejimida mablag' provayder orqali o'tmagan
+    if not Config.MANUAL_PAYMENT_MODE:
+        if _refund_semaphore is None:
+            _refund_semaphore = asyncio.Semaphore(Config.REFUND_CONCURRENCY)
+        if method == PaymentMethod.CASH or getattr(method, 'value', method) not in payment_manager.providers:
+            # Naqd yoki provayderi yo'q to'lov - faqat qo'lda qaytariladi
+            refunded = False
+        else:
+            try:
+                async with _refund_semaphore:
+                    refunded = await payment_manager.cancel_payment(method, reference)
+            except NotImplementedError:
+                refunded = False
+        
+        if not refunded:
+            async with async_session() as session:
+                await session.execute(
+                    update(Payment)
+                    .where(Payment.id == payment_id, Payment.status == PaymentStatus.PAID)
+                    .values(error_message="Qaytarish qo'lda bajarilishi kerak", updated_at=datetime.utcnow())
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+            return REFUND_MANUAL
+    
+    async with async_session() as session:
+        result = await session.execute(
+            update(Payment)
+            .where(Payment.id == payment_id, Payment.status == PaymentStatus.PAID)
+            .values(
+                status=PaymentStatus.REFUNDED,
+                provider_cancel_time=_now_ms(),
+                cancel_reason=REFUND_CANCEL_REASON,
+                error_message=None,
+                updated_at=datetime.utcnow()
+            )
+            .returning(Payment.id)
+            .execution_options(synchronize_session=False)
+        )
+        row = result.first()
+        await session.commit()
+    return REFUND_DONE if row is not None else None
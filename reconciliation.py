@@ -0,0 +1,230 @@
+"""
+To'lov holatlarini davriy solishtirish (reconciliation)
+"""
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+
+from config import Config
+from database import async_session, Booking, BookingStatus, Payment, PaymentMethod, PaymentStatus
+from events import event_bus, EventBus, PAYMENT_FAILED, PAYMENT_PAID
+from outbox import enqueue_payment_failed
+from payments import confirm_paid_booking, payment_manager, PaymentManager
+
+logger = logging.getLogger(__name__)
+
+OPEN_STATUSES = (PaymentStatus.PENDING, PaymentStatus.PROCESSING)
+
+class PaymentReconciler:
+    """
+    PENDING/PROCESSING to'lovlarni provayderlar bilan solishtiruvchi worker
+
+    Har bir o'tishda ochiq to'lovlar to'lov usuli bo'yicha guruhlanadi va
+    `batch_size` lik partiyalarda tekshiriladi. Har bir partiyaning holat
+    o'zgarishlari outbox yozuvlari bilan birga bitta tranzaksiyada yoziladi
+    (har bir to'lov alohida savepoint'da - bitta xato qator partiyani
+    to'xtatmaydi) va so'ng payment.paid / payment.failed hodisalari e'lon qilinadi. Javob bermagan to'lovlar
+    eksponensial backoff bilan qayta tekshiriladi, `deadline` o'tgach esa
+    bekor qilinadi.
+    """
+
+    def __init__(self, manager: PaymentManager = None, bus: EventBus = None,
+                 interval: float = None, batch_size: int = None,
+                 concurrency: int = None, deadline_minutes: int = None):
+        self.manager = manager or payment_manager
+        self.bus = bus or event_bus
+        self.interval = interval or Config.PAYMENT_RECONCILE_INTERVAL
+        self.batch_size = batch_size or Config.PAYMENT_RECONCILE_BATCH_SIZE
+        self.concurrency = concurrency or Config.PAYMENT_RECONCILE_CONCURRENCY
+        self.deadline = timedelta(minutes=deadline_minutes or Config.PAYMENT_DEADLINE_MINUTES)
+        self.max_backoff = Config.PAYMENT_RECONCILE_MAX_BACKOFF
+
+        # payment_id -> (urinishlar soni, keyingi tekshiruv vaqti)
+        self._backoff: Dict[int, Tuple[int, float]] = {}
+        self._wake_event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Workerni ishga tushirish"""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Workerni to'xtatish"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def wake(self):
+        """Keyingi o'tishni kutmasdan darhol tekshirish"""
+        self._wake_event.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.exception(f"Payment reconciliation error: {e}")
+
+            try:
+                await asyncio.wait_for(self._wake_event.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake_event.clear()
+
+    def _is_due(self, payment_id: int, now: float) -> bool:
+        state = self._backoff.get(payment_id)
+        return state is None or state[1] <= now
+
+    def _schedule_retry(self, payment_id: int, now: float):
+        attempts, _ = self._backoff.get(payment_id, (0, now))
+        delay = min(self.interval * (2 ** attempts), self.max_backoff)
+        self._backoff[payment_id] = (attempts + 1, now + delay)
+
+    async def run_once(self) -> Dict[str, int]:
+        """Bitta solishtirish o'tishi"""
+        async with async_session() as session:
+            result = await session.execute(
+                select(Payment.id, Payment.booking_id, Payment.payment_method, Payment.external_payment_id)
+                .where(
+                    Payment.status.in_(OPEN_STATUSES),
+                    Payment.payment_method != PaymentMethod.CASH
+                )
+                .order_by(Payment.id)
+            )
+            rows = result.all()
+
+        # Yopilgan to'lovlarning backoff holatini tozalash
+        open_ids = {row.id for row in rows}
+        for payment_id in list(self._backoff):
+            if payment_id not in open_ids:
+                del self._backoff[payment_id]
+
+        now = time.monotonic()
+        groups: Dict[PaymentMethod, List] = defaultdict(list)
+        for row in rows:
+            if self._is_due(row.id, now):
+                groups[row.payment_method].append(row)
+
+        summary = {'checked': 0, 'paid': 0, 'failed': 0}
+        for method, method_rows in groups.items():
+            for start in range(0, len(method_rows), self.batch_size):
+                batch = method_rows[start:start + self.batch_size]
+                batch_summary = await self._process_batch(method, batch)
+                for key, value in batch_summary.items():
+                    summary[key] += value
+
+        return summary
+
+    async def _fetch_statuses(self, method: PaymentMethod, batch: List) -> Dict[int, Optional[Dict]]:
+        """Partiyadagi to'lovlar holatini provayderdan olish (xato bo'lsa None)"""
+        if Config.MANUAL_PAYMENT_MODE:
+            # VAQTINCHA: To'lovni muvaffaqiyatli deb hisoblash
+            stamp = int(datetime.now().timestamp())
+            return {
+                row.id: {'status': 'paid', 'transaction_id': f'manual_{row.external_payment_id}_{stamp}'}
+                for row in batch
+            }
+
+        if not Config.PAYMENT_POLLING_ENABLED:
+            # Holat webhook'lar orqali keladi, bu yerda faqat deadline tekshiriladi
+            return {row.id: None for row in batch}
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def check(row):
+            async with semaphore:
+                try:
+                    return row.id, await self.manager.check_payment_status(
+                        method, row.external_payment_id, order_id=str(row.booking_id)
+                    )
+                except Exception as e:
+                    logger.warning(f"Payment {row.id} status check failed: {e}")
+                    return row.id, None
+
+        return dict(await asyncio.gather(*(check(row) for row in batch)))
+
+    async def _process_batch(self, method: PaymentMethod, batch: List) -> Dict[str, int]:
+        statuses = await self._fetch_statuses(method, batch)
+        now = time.monotonic()
+        expired_before = datetime.utcnow() - self.deadline
+        events: List[Tuple[str, Dict]] = []
+        paid = failed = 0
+
+        async with async_session() as session:
+            result = await session.execute(
+                select(Payment)
+                .options(selectinload(Payment.booking))
+                .where(
+                    Payment.id.in_(list(statuses)),
+                    Payment.status.in_(OPEN_STATUSES)
+                )
+            )
+
+            for payment in result.scalars():
+                payment_id = payment.id
+                status = statuses.get(payment_id)
+                state = status.get('status') if status else None
+                expired = payment.created_at < expired_before
+
+                if state != 'paid' and state != 'cancelled' and not expired:
+                    self._schedule_retry(payment_id, now)
+                    continue
+
+                try:
+                    async with session.begin_nested():
+                        if state == 'paid':
+                            payment.status = PaymentStatus.PAID
+                            payment.paid_at = datetime.utcnow()
+                            # Webhook yozgan tranzaksiya ID si saqlanib qoladi (takroriy webhook uni qidiradi)
+                            if payment.transaction_id is None:
+                                payment.transaction_id = status.get('transaction_id')
+                            if await confirm_paid_booking(session, payment.booking_id, payment_id):
+                                event = (PAYMENT_PAID, self._event_payload(payment))
+                            else:
+                                event = None
+                        else:
+                            payment.status = PaymentStatus.FAILED
+                            payment.error_message = "cancelled" if state == 'cancelled' else "deadline exceeded"
+                            if payment.booking.status in (BookingStatus.PENDING, BookingStatus.HOLD):
+                                payment.booking.status = BookingStatus.CANCELLED
+                            enqueue_payment_failed(session, payment.booking_id)
+                            event = (PAYMENT_FAILED, self._event_payload(payment))
+                except IntegrityError as e:
+                    logger.error(f"Payment {payment_id} reconcile error: {e}")
+                    self._schedule_retry(payment_id, now)
+                    continue
+
+                if state == 'paid':
+                    paid += 1
+                else:
+                    failed += 1
+                if event:
+                    events.append(event)
+
+            await session.commit()
+
+        # Hodisalar faqat commit dan keyin e'lon qilinadi
+        for event_type, payload in events:
+            try:
+                await self.bus.publish(event_type, payload)
+            except Exception as e:
+                logger.error(f"Payment event publish error ({event_type} {payload}): {e}")
+
+        return {'checked': len(batch), 'paid': paid, 'failed': failed}
+
+    @staticmethod
+    def _event_payload(payment: Payment) -> Dict:
+        return {
+            'booking_id': payment.booking_id,
+            'payment_id': payment.id,
+            'method': payment.payment_method.value
+        }
@@ -0,0 +1,218 @@
+"""
+Bron eslatmalari (masalan, start_time dan 24 soat va 1 soat oldin)
+
+Har bir bron uchun alohida uxlab turuvchi task o'rniga eslatmalar vaqt
+bo'yicha bucket'larga (standart 1 daqiqa) yig'iladi, bucket kalitlari esa
+heap'da saqlanadi. Scheduler faqat eng yaqin bucket vaqtigacha uxlaydi va
+muddati kelgan bucket'larni partiyalab yuboradi.
+
+Indeks ishga tushganda va har REMINDER_REBUILD_MINUTES da bazadan qayta
+quriladi, yangi tasdiqlangan bronlar payment.paid hodisasi orqali qo'shiladi.
+Yuborilgan eslatmalar `booking_reminders` jadvalida saqlanadi.
+"""
+
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from config import Config
+from database import async_session, Booking, BookingReminder, BookingStatus
+from localization import get_text
+from send_queue import send_queue, TelegramSendQueue, PRIORITY_LOW
+from utils import get_uzbekistan_time
+
+logger = logging.getLogger(__name__)
+
+# Bucket kalitlarini hisoblash uchun boshlang'ich nuqta (start_time - mahalliy vaqt, naive)
+EPOCH = datetime(2000, 1, 1)
+
+def local_now() -> datetime:
+    """Mahalliy vaqt (Booking.start_time bilan solishtirish uchun, naive)"""
+    return get_uzbekistan_time().replace(tzinfo=None)
+
+class ReminderScheduler:
+    """Vaqt bo'yicha bucket'langan eslatmalar navbati"""
+
+    def __init__(self, hours: List[int] = None, bucket_seconds: int = None,
+                 batch_size: int = None, queue: TelegramSendQueue = None):
+        self.offsets = {f"{h}h": timedelta(hours=h) for h in (hours or Config.REMINDER_HOURS)}
+        self.bucket_seconds = bucket_seconds or Config.REMINDER_BUCKET_SECONDS
+        self.batch_size = batch_size or Config.REMINDER_BATCH_SIZE
+        self.grace = timedelta(minutes=Config.REMINDER_GRACE_MINUTES)
+        self.rebuild_interval = timedelta(minutes=Config.REMINDER_REBUILD_MINUTES)
+        self.queue = queue or send_queue
+
+        # bucket kaliti -> {(booking_id, kind)}
+        self._buckets: Dict[int, Set[Tuple[int, str]]] = {}
+        self._heap: List[int] = []
+        self._wake_event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def _bucket_key(self, moment: datetime) -> int:
+        return int((moment - EPOCH).total_seconds() // self.bucket_seconds)
+
+    def _bucket_start(self, key: int) -> datetime:
+        return EPOCH + timedelta(seconds=key * self.bucket_seconds)
+
+    def pending(self) -> int:
+        return sum(len(items) for items in self._buckets.values())
+
+    def schedule(self, booking_id: int, start_time: datetime, now: datetime = None):
+        """Bron eslatmalarini indeksga qo'shish (muddati o'tganlari tashlab ketiladi)"""
+        now = now or local_now()
+        if start_time <= now:
+            return
+
+        for kind, offset in self.offsets.items():
+            due = start_time - offset
+            if due < now - self.grace:
+                continue
+            key = self._bucket_key(due)
+            if key not in self._buckets:
+                self._buckets[key] = set()
+                heapq.heappush(self._heap, key)
+                if self._heap[0] == key:
+                    # Yangi eng yaqin bucket - scheduler uyqusini qisqartirish
+                    self._wake_event.set()
+            self._buckets[key].add((booking_id, kind))
+
+    async def schedule_booking(self, booking_id: int):
+        """Bitta bronni bazadan o'qib rejalashtirish"""
+        async with async_session() as session:
+            result = await session.execute(
+                select(Booking.start_time).where(
+                    Booking.id == booking_id,
+                    Booking.status == BookingStatus.CONFIRMED
+                )
+            )
+            start_time = result.scalar_one_or_none()
+        if start_time is not None:
+            self.schedule(booking_id, start_time)
+
+    async def on_booking_confirmed(self, event: Dict[str, Any]):
+        """payment.paid obunachisi"""
+        await self.schedule_booking(event['booking_id'])
+
+    async def rebuild(self):
+        """Indeksni bazadagi kelajakdagi tasdiqlangan bronlardan qayta qurish"""
+        now = local_now()
+        horizon = now + max(self.offsets.values(), default=timedelta()) + self.rebuild_interval
+        async with async_session() as session:
+            result = await session.execute(
+                select(Booking.id, Booking.start_time).where(
+                    Booking.status == BookingStatus.CONFIRMED,
+                    Booking.start_time > now,
+                    Booking.start_time <= horizon
+                )
+            )
+            rows = result.all()
+
+        self._buckets.clear()
+        self._heap.clear()
+        for row in rows:
+            self.schedule(row.id, row.start_time, now)
+        logger.info(f"Eslatmalar indeksi qayta qurildi: {len(rows)} bron, {self.pending()} eslatma")
+
+    def start(self):
+        """Schedulerni ishga tushirish"""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Schedulerni to'xtatish"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def pop_due(self, now: datetime = None) -> List[Tuple[int, str]]:
+        """Muddati kelgan barcha bucket'larni olish"""
+        now_key = self._bucket_key(now or local_now())
+        due: List[Tuple[int, str]] = []
+        while self._heap and self._heap[0] <= now_key:
+            key = heapq.heappop(self._heap)
+            due.extend(self._buckets.pop(key, ()))
+        return due
+
+    async def _run(self):
+        next_rebuild = datetime.min
+        while True:
+            try:
+                now = local_now()
+                if now >= next_rebuild:
+                    await self.rebuild()
+                    next_rebuild = now + self.rebuild_interval
+
+                due = self.pop_due(now)
+                for start in range(0, len(due), self.batch_size):
+                    await self.fire(due[start:start + self.batch_size])
+            except Exception as e:
+                logger.exception(f"Reminder scheduler error: {e}")
+
+            # Eng yaqin bucket yoki qayta qurish vaqtigacha uxlash
+            wake_at = next_rebuild
+            if self._heap:
+                wake_at = min(wake_at, self._bucket_start(self._heap[0]))
+            timeout = max((wake_at - local_now()).total_seconds(), 0.0)
+
+            self._wake_event.clear()
+            try:
+                await asyncio.wait_for(self._wake_event.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def fire(self, items: List[Tuple[int, str]]) -> int:
+        """Eslatmalar partiyasini yuborish; yuborilganlar soni"""
+        if not items:
+            return 0
+
+        booking_ids = {booking_id for booking_id, _ in items}
+        async with async_session() as session:
+            result = await session.execute(
+                select(Booking)
+                .options(selectinload(Booking.user), selectinload(Booking.court))
+                .where(Booking.id.in_(booking_ids), Booking.status == BookingStatus.CONFIRMED)
+            )
+            bookings = {booking.id: booking for booking in result.scalars()}
+
+            result = await session.execute(
+                select(BookingReminder.booking_id, BookingReminder.kind)
+                .where(BookingReminder.booking_id.in_(booking_ids))
+            )
+            already_sent = set(result.all())
+
+            now = local_now()
+            messages = []
+            for booking_id, kind in sorted(items):
+                booking = bookings.get(booking_id)
+                if booking is None or (booking_id, kind) in already_sent or booking.start_time <= now:
+                    continue
+                user = booking.user
+                if not user.notifications_enabled or user.is_blocked:
+                    continue
+
+                session.add(BookingReminder(booking_id=booking_id, kind=kind))
+                messages.append((user.telegram_id, get_text(
+                    f"booking_reminder_{kind}", user.language,
+                    time=booking.start_time.strftime("%H:%M"),
+                    court_name=booking.court.name
+                )))
+
+            # Avval belgilab, keyin yuborish: qayta ishga tushganda eslatma takrorlanmaydi
+            await session.commit()
+
+        results = await asyncio.gather(
+            *(self.queue.send_message(chat_id, text, priority=PRIORITY_LOW) for chat_id, text in messages),
+            return_exceptions=True
+        )
+        failed = [result for result in results if isinstance(result, Exception)]
+        for error in failed:
+            logger.warning(f"Eslatma yuborilmadi: {error}")
+        return len(messages) - len(failed)
+
+# Global reminder scheduler
+reminder_scheduler = ReminderScheduler()
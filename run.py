@@ -23,7 +23,7 @@ def setup_directories():
         Config.UPLOAD_PATH,
         Config.REPORTS_PATH,
         Config.TICKETS_PATH,
-        "logs"
+        Config.LOG_DIR
     ]
     
     for directory in directories:
@@ -31,21 +31,9 @@ def setup_directories():
         print(f"📁 Papka yaratildi: {directory}")
 
 def setup_logging():
-    """Logging sozlash"""
-    log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    
-    logging.basicConfig(
-        level=getattr(logging, Config.LOG_LEVEL),
-        format=log_format,
-        handlers=[
-            logging.FileHandler(f"logs/{Config.LOG_FILE}"),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
-    
-    # Aiogram loglarini kamaytirish
-    logging.getLogger("aiogram").setLevel(logging.WARNING)
-    logging.getLogger("aiohttp").setLevel(logging.WARNING)
+    """Logging sozlash (QueueHandler orqali, disk yozuvlari background thread'da)"""
+    from logging_setup import setup_logging as setup_queue_logging
+    setup_queue_logging()
 
 async def check_database():
     """Ma'lumotlar bazasini tekshirish"""
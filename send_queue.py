@@ -0,0 +1,236 @@
+"""
+Telegramga chiquvchi xabarlar navbati (flood limitlardan himoya)
+
+Fon vazifalaridan (bilet, bildirishnomalar, eslatmalar, broadcast) yuboriladigan
+xabarlar shu navbat orqali o'tadi:
+    - global token bucket (~30 xabar/s)
+    - har bir chat uchun 1 xabar/s (tayyor bo'lmagan chat keyinga suriladi)
+    - ustuvorlik yo'laklari: bilet/to'lov > oddiy > eslatma/broadcast
+    - TelegramRetryAfter bo'lsa butun navbat `retry_after` ga to'xtaydi va
+      xabar o'z yo'lagining boshiga qaytariladi
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+from config import Config
+from metrics import TELEGRAM_RETRY_AFTER, TELEGRAM_SEND_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+# Ustuvorlik yo'laklari (kichik raqam - yuqori ustuvorlik)
+PRIORITY_HIGH = 0     # bilet, to'lov tasdiqlari
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2      # eslatmalar, broadcast
+
+PRIORITY_NAMES = {PRIORITY_HIGH: "high", PRIORITY_NORMAL: "normal", PRIORITY_LOW: "low"}
+
+# Chat tayyorligini tekshirishda bitta yo'lakda ko'riladigan xabarlar soni
+SCAN_LIMIT = 200
+
+class TokenBucket:
+    """Oddiy token bucket: `rate` token/s, `capacity` tagacha yig'iladi"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Keyingi token uchun kutish vaqti (0 - token bor)"""
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill(time.monotonic())
+        self.tokens -= 1
+
+@dataclass
+class SendJob:
+    chat_id: int
+    method: str
+    kwargs: Dict[str, Any]
+    priority: int
+    future: asyncio.Future
+    retries: int = 0
+
+class TelegramSendQueue:
+    """Rate-limited chiquvchi xabarlar navbati"""
+
+    def __init__(self, global_rate: float = None, chat_interval: float = None, max_retries: int = None):
+        self.global_bucket = TokenBucket(global_rate or Config.TELEGRAM_GLOBAL_RATE)
+        self.chat_interval = chat_interval if chat_interval is not None else Config.TELEGRAM_CHAT_INTERVAL
+        self.max_retries = max_retries if max_retries is not None else Config.TELEGRAM_SEND_MAX_RETRIES
+
+        self.bot: Optional[Bot] = None
+        self._lanes: List[Deque[SendJob]] = [deque() for _ in PRIORITY_NAMES]
+        self._chat_ready: Dict[int, float] = {}
+        self._paused_until = 0.0
+        self._wake_event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+
+    def bind(self, bot: Bot):
+        """Xabarlarni yuboradigan bot"""
+        self.bot = bot
+
+    def start(self):
+        """Navbatni ishga tushirish"""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0):
+        """Navbatdagi xabarlarni `timeout` gacha yuborib, to'xtatish"""
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._inflight:
+            await asyncio.gather(*list(self._inflight), return_exceptions=True)
+
+        for lane in self._lanes:
+            while lane:
+                job = lane.popleft()
+                if not job.future.done():
+                    job.future.set_exception(RuntimeError("Send queue to'xtatildi"))
+        self._update_depth()
+
+    def pending(self) -> int:
+        return sum(len(lane) for lane in self._lanes)
+
+    async def call(self, method: str, chat_id: int, priority: int = PRIORITY_NORMAL, **kwargs) -> Any:
+        """
+        Bot API metodini navbat orqali chaqirish va natijani kutish
+
+        Navbat ishga tushirilmagan bo'lsa (benchmark, skriptlar) to'g'ridan-to'g'ri
+        yuboriladi.
+        """
+        if self._task is None:
+            return await getattr(self.bot, method)(chat_id=chat_id, **kwargs)
+
+        job = SendJob(
+            chat_id=chat_id,
+            method=method,
+            kwargs=kwargs,
+            priority=priority,
+            future=asyncio.get_running_loop().create_future()
+        )
+        self._lanes[priority].append(job)
+        self._update_depth()
+        self._wake_event.set()
+        return await job.future
+
+    async def send_message(self, chat_id: int, text: str, priority: int = PRIORITY_NORMAL, **kwargs) -> Any:
+        return await self.call("send_message", chat_id, priority, text=text, **kwargs)
+
+    async def send_photo(self, chat_id: int, photo: Any, priority: int = PRIORITY_NORMAL, **kwargs) -> Any:
+        return await self.call("send_photo", chat_id, priority, photo=photo, **kwargs)
+
+    async def send_document(self, chat_id: int, document: Any, priority: int = PRIORITY_NORMAL, **kwargs) -> Any:
+        return await self.call("send_document", chat_id, priority, document=document, **kwargs)
+
+    def _next_job(self, now: float) -> Optional[SendJob]:
+        """Chat limiti bo'shagan eng ustuvor xabar"""
+        for lane in self._lanes:
+            for index, job in enumerate(itertools.islice(lane, SCAN_LIMIT)):
+                if self._chat_ready.get(job.chat_id, 0.0) <= now:
+                    del lane[index]
+                    return job
+        return None
+
+    def _next_ready_time(self) -> Optional[float]:
+        """Navbatdagi chatlardan eng erta tayyor bo'ladigan vaqt"""
+        times = [
+            self._chat_ready.get(job.chat_id, 0.0)
+            for lane in self._lanes
+            for job in itertools.islice(lane, SCAN_LIMIT)
+        ]
+        return min(times) if times else None
+
+    def _prune_chats(self, now: float):
+        if len(self._chat_ready) > 10000:
+            self._chat_ready = {chat_id: ready for chat_id, ready in self._chat_ready.items() if ready > now}
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+
+            if self._paused_until > now:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+
+            job = self._next_job(now)
+            if job is None:
+                ready_at = self._next_ready_time()
+                timeout = None if ready_at is None else max(ready_at - now, 0.001)
+                self._wake_event.clear()
+                try:
+                    await asyncio.wait_for(self._wake_event.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            delay = self.global_bucket.delay()
+            if delay > 0:
+                # Token kutilayotganda yuqoriroq ustuvorlikdagi xabar kelishi mumkin
+                self._lanes[job.priority].appendleft(job)
+                await asyncio.sleep(delay)
+                continue
+
+            self.global_bucket.take()
+            self._chat_ready[job.chat_id] = now + self.chat_interval
+            self._prune_chats(now)
+            self._update_depth()
+
+            task = asyncio.create_task(self._execute(job))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _execute(self, job: SendJob):
+        if job.future.done():
+            return
+        try:
+            result = await getattr(self.bot, job.method)(chat_id=job.chat_id, **job.kwargs)
+        except TelegramRetryAfter as e:
+            TELEGRAM_RETRY_AFTER.inc()
+            logger.warning(f"Telegram flood limit: {e.retry_after}s kutiladi (chat {job.chat_id})")
+            self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+            if job.retries < self.max_retries:
+                job.retries += 1
+                self._lanes[job.priority].appendleft(job)
+                self._update_depth()
+                self._wake_event.set()
+            elif not job.future.done():
+                job.future.set_exception(e)
+        except Exception as e:
+            # Chaqiruvchi kutishni bekor qilgan bo'lishi mumkin
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def _update_depth(self):
+        for priority, lane in enumerate(self._lanes):
+            TELEGRAM_SEND_QUEUE_DEPTH.labels(PRIORITY_NAMES[priority]).set(len(lane))
+
+# Global send queue (bot.py da bog'lanadi, bot.main da ishga tushiriladi)
+send_queue = TelegramSendQueue()
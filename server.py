@@ -0,0 +1,71 @@
+"""
+HTTP server: to'lov webhook'lari va /metrics
+"""
+
+import json
+import logging
+
+from aiohttp import web
+
+from config import Config
+from metrics import metrics_handler
+from payments import (
+    handle_click_webhook, handle_payme_webhook, verify_payme_auth,
+    payme_error, PAYME_ERROR_INSUFFICIENT_PRIVILEGE
+)
+
+logger = logging.getLogger(__name__)
+
+PAYME_ERROR_PARSE = -32700
+
+async def payme_webhook_handler(request: web.Request) -> web.Response:
+    """POST /webhook/payme (JSON-RPC, Payme har doim HTTP 200 kutadi)"""
+    if not verify_payme_auth(request.headers.get("Authorization")):
+        response = payme_error(PAYME_ERROR_INSUFFICIENT_PRIVILEGE, "Ruxsat yo'q")
+        return web.json_response(response)
+
+    try:
+        data = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return web.json_response(payme_error(PAYME_ERROR_PARSE, "JSON xatosi"))
+    if not isinstance(data, dict):
+        # JSON-RPC so'rovi faqat obyekt bo'lishi mumkin (massiv, son va h.k. emas)
+        return web.json_response(payme_error(PAYME_ERROR_PARSE, "JSON xatosi"))
+
+    response = await handle_payme_webhook(data)
+    response["id"] = data.get("id")
+    return web.json_response(response)
+
+async def click_webhook_handler(request: web.Request) -> web.Response:
+    """POST /webhook/click (form-urlencoded)"""
+    data = dict(await request.post())
+    response = await handle_click_webhook(data)
+    return web.json_response(response)
+
+def create_app() -> web.Application:
+    """aiohttp ilovasini yaratish"""
+    app = web.Application()
+
+    if Config.METRICS_ENABLED:
+        app.router.add_get("/metrics", metrics_handler)
+    if Config.WEBHOOKS_ENABLED:
+        # Kalitlari sozlanmagan provayder webhook'i ochilmaydi
+        if Config.PAYME_SECRET_KEY:
+            app.router.add_post("/webhook/payme", payme_webhook_handler)
+        if Config.CLICK_SECRET_KEY and Config.CLICK_SERVICE_ID:
+            app.router.add_post("/webhook/click", click_webhook_handler)
+
+    return app
+
+async def start_http_server(host: str = None, port: int = None) -> web.AppRunner:
+    """HTTP serverni ishga tushirish"""
+    host = host or Config.HTTP_HOST
+    port = port or Config.HTTP_PORT
+
+    runner = web.AppRunner(create_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+
+    logger.info(f"HTTP server: http://{host}:{port}")
+    return runner
@@ -0,0 +1,248 @@
+"""
+Biletlarni PDF ga partiyalab chiqarish (reportlab canvas)
+
+    - Sahifa shabloni (ramka, sarlavha, maydon nomlari, qoidalar) har bir PDF
+      uchun bir marta Form XObject sifatida chiziladi va har bir bilet uchun
+      qayta ishlatiladi - bilet uchun faqat o'zgaruvchan matn va QR qoladi.
+    - QR rasmlar worker jarayonida keshlanadi (mavjud QR fayl bo'lsa - o'qiladi).
+    - Render ProcessPoolExecutor da bajariladi: kunlik PDF bitta vazifa,
+      mijozlar bo'yicha PDF'lar esa partiyalab parallel chiqariladi.
+
+Bilet ma'lumotlari `create_ticket_image` bilan bir xil lug'at ko'rinishida.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+from sqlalchemy import select, update
+
+from config import Config
+from database import async_session, Ticket, Booking, Court, User, TicketStatus
+from utils import generate_qr_code
+
+logger = logging.getLogger(__name__)
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+TICKETS_PER_PAGE = 3
+SLOT_HEIGHT = PAGE_HEIGHT / TICKETS_PER_PAGE
+MARGIN = 12 * mm
+QR_SIZE = 55 * mm
+TEMPLATE_NAME = "ticket_slot"
+
+FIELDS = [
+    ("Bilet ID:", "ticket_id"),
+    ("Mijoz:", "user_name"),
+    ("Telefon:", "phone"),
+    ("Sana:", "date"),
+    ("Vaqt:", "time"),
+    ("Kort:", "court_name"),
+    ("Narx:", "amount"),
+    ("To'lov holati:", "payment_status"),
+]
+
+RULES = [
+    "Biletni kort kiraverishida ko'rsating",
+    "Kechikish 15 daqiqadan oshsa, bron bekor qilinadi",
+    "Qo'llab-quvvatlash: +998 90 123 45 67",
+]
+
+@lru_cache(maxsize=2048)
+def _qr_image(qr_code_data: Optional[str], qr_code_path: Optional[str]) -> ImageReader:
+    """QR rasm (worker jarayonida keshlanadi)"""
+    if qr_code_path and os.path.exists(qr_code_path):
+        return ImageReader(qr_code_path)
+    return ImageReader(generate_qr_code(qr_code_data, size=6))
+
+def _draw_template(pdf: canvas.Canvas):
+    """Bilet bloki shabloni (har bir PDF da bir marta)"""
+    pdf.beginForm(TEMPLATE_NAME)
+    pdf.setStrokeColor(colors.grey)
+    pdf.setDash(4, 3)
+    pdf.line(0, 0, PAGE_WIDTH, 0)
+    pdf.setDash()
+
+    top = SLOT_HEIGHT - MARGIN
+    pdf.setFillColor(colors.HexColor("#1f6f43"))
+    pdf.rect(MARGIN, top - 10 * mm, PAGE_WIDTH - 2 * MARGIN, 10 * mm, stroke=0, fill=1)
+    pdf.setFillColor(colors.white)
+    pdf.setFont("Helvetica-Bold", 14)
+    pdf.drawString(MARGIN + 4 * mm, top - 7 * mm, "TENNIS KORT BILETI")
+
+    pdf.setFillColor(colors.black)
+    pdf.setFont("Helvetica-Bold", 10)
+    y = top - 17 * mm
+    for label, _ in FIELDS:
+        pdf.drawString(MARGIN + 4 * mm, y, label)
+        y -= 6 * mm
+
+    pdf.setFont("Helvetica", 7)
+    pdf.setFillColor(colors.grey)
+    y = MARGIN + 2 * mm + 3.5 * mm * (len(RULES) - 1)
+    for rule in RULES:
+        pdf.drawString(MARGIN + 4 * mm, y, f"- {rule}")
+        y -= 3.5 * mm
+    pdf.endForm()
+
+def _draw_ticket(pdf: canvas.Canvas, ticket: Dict, slot: int):
+    pdf.saveState()
+    pdf.translate(0, PAGE_HEIGHT - (slot + 1) * SLOT_HEIGHT)
+    pdf.doForm(TEMPLATE_NAME)
+
+    values = dict(ticket)
+    values['time'] = f"{ticket['start_time']} - {ticket['end_time']}"
+    values['amount'] = f"{ticket['amount']:,.0f} so'm"
+
+    top = SLOT_HEIGHT - MARGIN
+    pdf.setFont("Helvetica", 10)
+    y = top - 17 * mm
+    for _, key in FIELDS:
+        pdf.drawString(MARGIN + 34 * mm, y, str(values.get(key) or "-"))
+        y -= 6 * mm
+
+    if ticket.get('qr_code_data') or ticket.get('qr_code_path'):
+        qr = _qr_image(ticket.get('qr_code_data'), ticket.get('qr_code_path'))
+        pdf.drawImage(qr, PAGE_WIDTH - MARGIN - QR_SIZE, top - 13 * mm - QR_SIZE, QR_SIZE, QR_SIZE)
+    pdf.restoreState()
+
+def render_tickets_pdf(tickets: List[Dict], file_path: str) -> str:
+    """Biletlarni bitta ko'p sahifali PDF ga chiqarish (sahifada 3 ta bilet)"""
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+
+    pdf = canvas.Canvas(file_path, pagesize=A4, pageCompression=1)
+    pdf.setTitle("Tennis kort biletlari")
+    _draw_template(pdf)
+
+    for index, ticket in enumerate(tickets):
+        if index and index % TICKETS_PER_PAGE == 0:
+            pdf.showPage()
+        _draw_ticket(pdf, ticket, index % TICKETS_PER_PAGE)
+
+    pdf.save()
+    return file_path
+
+def render_many(jobs: List[tuple]) -> List[str]:
+    """Bir nechta PDF ni bitta worker vazifasida chiqarish: [(tickets, file_path), ...]"""
+    return [render_tickets_pdf(tickets, file_path) for tickets, file_path in jobs]
+
+class TicketPdfRenderer:
+    """Bazadan biletlarni olib, PDF larni jarayonlar pool'ida chiqaruvchi"""
+
+    def __init__(self, workers: int = None, chunk_size: int = None):
+        self.workers = workers or Config.PDF_RENDER_WORKERS
+        self.chunk_size = chunk_size or Config.PDF_RENDER_CHUNK_SIZE
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: fork jarayonda ishlayotgan thread'lar (log listener, watchdog,
+            # qr-decode pool) ushlab turgan lock'lar bilan nusxalanib qolmasin
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._pool(), func, *args)
+
+    async def load_tickets(self, day: date, court_id: int = None) -> List[Dict]:
+        """Kun (va kort) biletlari: bekor qilinmaganlar, vaqt va kort bo'yicha"""
+        day_start = datetime.combine(day, datetime.min.time())
+        query = (
+            select(Ticket, Booking, Court, User)
+            .join(Booking, Ticket.booking_id == Booking.id)
+            .join(Court, Booking.court_id == Court.id)
+            .join(User, Booking.user_id == User.id)
+            .where(
+                Ticket.status != TicketStatus.CANCELLED,
+                Booking.start_time >= day_start,
+                Booking.start_time < day_start + timedelta(days=1)
+            )
+            .order_by(Booking.start_time, Court.id)
+        )
+        if court_id is not None:
+            query = query.where(Booking.court_id == court_id)
+
+        async with async_session() as session:
+            result = await session.execute(query)
+            rows = result.all()
+
+        return [
+            {
+                'id': ticket.id,
+                'user_id': user.id,
+                'ticket_id': ticket.ticket_id,
+                'user_name': f"{user.first_name} {user.last_name or ''}".strip(),
+                'phone': user.phone_number or "N/A",
+                'date': booking.booking_date.strftime("%d.%m.%Y"),
+                'start_time': booking.start_time.strftime("%H:%M"),
+                'end_time': booking.end_time.strftime("%H:%M"),
+                'court_name': court.name,
+                'amount': booking.final_amount,
+                'payment_status': "To'langan",
+                'qr_code_data': ticket.qr_code_data,
+                'qr_code_path': ticket.qr_code_path
+            }
+            for ticket, booking, court, user in rows
+        ]
+
+    async def render_day(self, day: date, court_id: int = None) -> Optional[str]:
+        """Kun (yoki kort) biletlari - qabulxona uchun bitta PDF; biletlar bo'lmasa - None"""
+        tickets = await self.load_tickets(day, court_id)
+        if not tickets:
+            return None
+
+        suffix = f"_court{court_id}" if court_id is not None else ""
+        file_path = os.path.join(Config.TICKETS_PATH, "pdf", f"tickets_{day.strftime('%Y%m%d')}{suffix}.pdf")
+        await self._run(render_tickets_pdf, tickets, file_path)
+        logger.info(f"Biletlar PDF: {file_path} ({len(tickets)} bilet)")
+        return file_path
+
+    async def render_per_user(self, day: date) -> Dict[int, str]:
+        """Har bir mijoz uchun kun biletlari PDF i; Ticket.pdf_path to'ldiriladi"""
+        tickets = await self.load_tickets(day)
+
+        by_user: Dict[int, List[Dict]] = {}
+        for ticket in tickets:
+            by_user.setdefault(ticket['user_id'], []).append(ticket)
+
+        jobs = []
+        paths: Dict[int, str] = {}
+        for user_id, user_tickets in by_user.items():
+            file_name = f"tickets_{day.strftime('%Y%m%d')}_user{user_id}.pdf"
+            paths[user_id] = os.path.join(Config.TICKETS_PATH, "pdf", file_name)
+            jobs.append((user_tickets, paths[user_id]))
+
+        # IPC ni kamaytirish uchun bir vazifada bir nechta PDF
+        await asyncio.gather(*(
+            self._run(render_many, jobs[start:start + self.chunk_size])
+            for start in range(0, len(jobs), self.chunk_size)
+        ))
+
+        if tickets:
+            async with async_session() as session:
+                await session.execute(update(Ticket), [
+                    {'id': ticket['id'], 'pdf_path': paths[ticket['user_id']]}
+                    for ticket in tickets
+                ])
+                await session.commit()
+        return paths
+
+# Global PDF renderer (pool birinchi ishlatilganda yaratiladi)
+ticket_pdf_renderer = TicketPdfRenderer()
@@ -0,0 +1,71 @@
+"""
+Biletning QR uchun ixcham imzolangan tokeni
+
+Binar tuzilma (19 bayt):
+    versiya (1) | booking_id (4) | court_id (2) | start_time, daqiqa (4) | HMAC-SHA256[:8]
+
+Token base32 da (A-Z, 2-7, padding'siz) 31 belgi bo'ladi - QR alphanumeric
+rejimida ERROR_CORRECT_M bilan 2-versiyaga sig'adi (eski JSON ~7-versiya edi).
+Imzo Config.SECRET_KEY bilan tekshiriladi, shuning uchun soxta yoki buzilgan
+QR bazaga murojaatsiz rad etiladi.
+"""
+
+import base64
+import hashlib
+import hmac
+import struct
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+from config import Config
+
+TOKEN_VERSION = 1
+TOKEN_FORMAT = ">BIHI"
+TOKEN_BODY_SIZE = struct.calcsize(TOKEN_FORMAT)
+SIGNATURE_SIZE = 8
+TOKEN_SIZE = TOKEN_BODY_SIZE + SIGNATURE_SIZE
+
+# start_time daqiqalari shu nuqtadan hisoblanadi (mahalliy vaqt, naive)
+TOKEN_EPOCH = datetime(2020, 1, 1)
+
+class TicketToken(NamedTuple):
+    booking_id: int
+    court_id: int
+    start_time: datetime
+
+def _signing_key() -> bytes:
+    # SECRET_KEY boshqa maqsadlarda ham ishlatilgani uchun alohida kalit chiqariladi
+    return hmac.new(Config.SECRET_KEY.encode("utf-8"), b"ticket-token", hashlib.sha256).digest()
+
+def _sign(body: bytes) -> bytes:
+    return hmac.new(_signing_key(), body, hashlib.sha256).digest()[:SIGNATURE_SIZE]
+
+def encode_ticket_token(booking_id: int, court_id: int, start_time: datetime) -> str:
+    """Bilet tokenini yaratish"""
+    minutes = int((start_time - TOKEN_EPOCH).total_seconds() // 60)
+    body = struct.pack(TOKEN_FORMAT, TOKEN_VERSION, booking_id, court_id, minutes)
+    return base64.b32encode(body + _sign(body)).decode("ascii").rstrip("=")
+
+def looks_like_ticket_token(payload: str) -> bool:
+    """Matn token formatiga o'xshaydimi (imzo tekshirilmaydi)"""
+    payload = payload.strip().upper()
+    return len(payload) == 31 and all(c in "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567" for c in payload)
+
+def decode_ticket_token(payload: str) -> Optional[TicketToken]:
+    """Tokenni tekshirish va o'qish (noto'g'ri format yoki imzo - None)"""
+    payload = payload.strip().upper()
+    try:
+        raw = base64.b32decode(payload + "=" * (-len(payload) % 8))
+    except (ValueError, TypeError):
+        return None
+    if len(raw) != TOKEN_SIZE:
+        return None
+
+    body, signature = raw[:TOKEN_BODY_SIZE], raw[TOKEN_BODY_SIZE:]
+    if not hmac.compare_digest(signature, _sign(body)):
+        return None
+
+    version, booking_id, court_id, minutes = struct.unpack(TOKEN_FORMAT, body)
+    if version != TOKEN_VERSION:
+        return None
+    return TicketToken(booking_id, court_id, TOKEN_EPOCH + timedelta(minutes=minutes))
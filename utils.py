@@ -4,37 +4,77 @@ Yordamchi funksiyalar
 
 import hashlib
 import hmac
-import uuid
 import qrcode
 import os
 from datetime import datetime, timedelta, time
 from typing import List, Dict, Optional, Tuple
 from io import BytesIO
 from PIL import Image, ImageDraw, ImageFont
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
 from config import Config
 import pytz
 import re
+import logging
+
+audit_logger = logging.getLogger("audit")
+
+# Crockford base32 (I, L, O, U yo'q - qo'lda yozishda adashtirilmaydi)
+TICKET_ID_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+TICKET_ID_PATTERN = re.compile(r"^TNS-\d{8}-CRT\d+-[0-9A-HJKMNP-TV-Z]{5,}$")
+# Yangi formatga o'xshash ID (suffiksda alifbodan tashqari belgilar bo'lishi mumkin)
+TICKET_ID_SHAPE = re.compile(r"^TNS-\d{8}-CRT\d+-[0-9A-Z]{5,}$")
+# Qo'lda yozishda adashtiriladigan belgilar: O -> 0, I/L -> 1
+TICKET_ID_TYPOS = str.maketrans("OIL", "011")
+
+def _ticket_checksum(body: str) -> str:
+    """Luhn mod 32 tekshiruv belgisi (bitta xato belgi va ko'p o'rin almashishlarni aniqlaydi)"""
+    base = len(TICKET_ID_ALPHABET)
+    total = 0
+    factor = 2
+    for char in reversed(body.replace("-", "")):
+        addend = factor * TICKET_ID_ALPHABET.index(char)
+        total += addend // base + addend % base
+        factor = 1 if factor == 2 else 2
+    return TICKET_ID_ALPHABET[(base - total % base) % base]
+
+def _encode_base32(number: int, width: int = 4) -> str:
+    chars = []
+    while number:
+        number, remainder = divmod(number, len(TICKET_ID_ALPHABET))
+        chars.append(TICKET_ID_ALPHABET[remainder])
+    return "".join(reversed(chars)).rjust(width, "0")
 
 def generate_ticket_id(booking_id: int, court_id: int, date: datetime) -> str:
     """
     Bilet ID yaratish
-    Format: TNS-YYYYMMDD-CRT{N}-XXXX
+    Format: TNS-YYYYMMDD-CRT{N}-{booking_id base32}{tekshiruv belgisi}
+    
+    ID booking_id dan hosil qilinadi, shuning uchun bazaga murojaatsiz unikal
+    (bron uchun bitta bilet).
     """
-    date_str = date.strftime("%Y%m%d")
-    random_suffix = str(uuid.uuid4())[:4].upper()
-    return f"TNS-{date_str}-CRT{court_id}-{random_suffix}"
+    body = f"TNS-{date.strftime('%Y%m%d')}-CRT{court_id}-{_encode_base32(booking_id)}"
+    return body + _ticket_checksum(body)
+
+def normalize_ticket_id(ticket_id: str) -> str:
+    """Katta harflarga o'tkazish; yangi formatdagi suffiksda O, I, L ni 0, 1 ga almashtirish"""
+    ticket_id = ticket_id.strip().upper()
+    if not TICKET_ID_SHAPE.match(ticket_id):
+        return ticket_id
+    prefix, _, suffix = ticket_id.rpartition("-")
+    return f"{prefix}-{suffix.translate(TICKET_ID_TYPOS)}"
+
+def validate_ticket_id(ticket_id: str) -> bool:
+    """Yangi formatdagi bilet ID sining tuzilishi va tekshiruv belgisini tekshirish"""
+    ticket_id = normalize_ticket_id(ticket_id)
+    # Pattern faqat alifbodagi belgilarni o'tkazadi (U va boshqalar - False)
+    if not TICKET_ID_PATTERN.match(ticket_id):
+        return False
+    return _ticket_checksum(ticket_id[:-1]) == ticket_id[-1]
 
 def generate_qr_code(data: str, size: int = 10) -> BytesIO:
-    """QR kod yaratish"""
+    """QR kod yaratish (bilet tokeni alphanumeric rejimda, M darajadagi xato tuzatish bilan)"""
     qr = qrcode.QRCode(
         version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
         box_size=size,
         border=4,
     )
@@ -62,81 +102,9 @@ def save_qr_code(data: str, file_path: str, size: int = 10) -> str:
     return file_path
 
 def create_ticket_pdf(ticket_data: Dict, file_path: str) -> str:
-    """Bilet PDF yaratish"""
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    
-    doc = SimpleDocTemplate(file_path, pagesize=A4)
-    styles = getSampleStyleSheet()
-    story = []
-    
-    # Sarlavha
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=30,
-        alignment=1  # Center
-    )
-    story.append(Paragraph("🎾 TENNIS KORT BİLETİ", title_style))
-    
-    # Bilet ma'lumotlari
-    data = [
-        ['Bilet ID:', ticket_data['ticket_id']],
-        ['Mijoz:', f"{ticket_data['user_name']}"],
-        ['Telefon:', ticket_data['phone']],
-        ['Sana:', ticket_data['date']],
-        ['Vaqt:', f"{ticket_data['start_time']} - {ticket_data['end_time']}"],
-        ['Kort:', ticket_data['court_name']],
-        ['Narx:', f"{ticket_data['amount']:,.0f} so'm"],
-        ['To\'lov holati:', ticket_data['payment_status']],
-        ['Yaratilgan:', ticket_data['created_at']],
-    ]
-    
-    table = Table(data, colWidths=[2*inch, 4*inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), colors.white),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-    ]))
-    
-    story.append(table)
-    story.append(Spacer(1, 20))
-    
-    # QR kod haqida ma'lumot
-    qr_info = Paragraph(
-        "QR kodni kort kiraverishida ko'rsating:",
-        styles['Normal']
-    )
-    story.append(qr_info)
-    story.append(Spacer(1, 10))
-    
-    # QR kod (bu yerda QR kod rasmini qo'shish kerak)
-    # QR kod fayli mavjud bo'lsa, uni qo'shish
-    if 'qr_code_path' in ticket_data and os.path.exists(ticket_data['qr_code_path']):
-        # QR kodni PDF ga qo'shish logikasi
-        pass
-    
-    # Qoidalar
-    rules_text = """
-    <b>Muhim eslatmalar:</b><br/>
-    • Biletni kort kiraverishida ko'rsating<br/>
-    • Kechikish 15 daqiqadan oshsa, bron bekor qilinadi<br/>
-    • Raketkalar va to'plar alohida ijaraga beriladi<br/>
-    • Ichimlik va ovqat olib kirish taqiqlangan<br/>
-    • Qo'llab-quvvatlash: +998 90 123 45 67
-    """
-    
-    rules = Paragraph(rules_text, styles['Normal'])
-    story.append(Spacer(1, 30))
-    story.append(rules)
-    
-    doc.build(story)
-    return file_path
+    """Bitta bilet PDF i (partiyalab chiqarish - ticket_pdf.py)"""
+    from ticket_pdf import render_tickets_pdf
+    return render_tickets_pdf([ticket_data], file_path)
 
 def calculate_booking_price(
     court_hourly_rate_peak: float,
@@ -403,9 +371,22 @@ def create_excel_report(data: List[Dict], headers: List[str],
         raise ImportError("openpyxl kutubxonasi o'rnatilmagan")
 
 def create_ticket_image(ticket_data: Dict, qr_path: str, file_path: str) -> str:
-    """Bilet rasmini yaratish"""
+    """Bilet rasmini faylga yaratish"""
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
     
+    qr_img = Image.open(qr_path) if os.path.exists(qr_path) else None
+    draw_ticket_image(ticket_data, qr_img).save(file_path, 'PNG', quality=95)
+    return file_path
+
+def render_ticket_png(ticket_data: Dict, qr_png: Optional[bytes] = None) -> bytes:
+    """Bilet rasmini xotirada yaratish (PNG baytlari)"""
+    qr_img = Image.open(BytesIO(qr_png)) if qr_png else None
+    buffer = BytesIO()
+    draw_ticket_image(ticket_data, qr_img).save(buffer, 'PNG', quality=95)
+    return buffer.getvalue()
+
+def draw_ticket_image(ticket_data: Dict, qr_img: Optional[Image.Image] = None) -> Image.Image:
+    """Bilet rasmini chizish"""
     # Rasm o'lchamlari - kichikroq va chiroyliroq
     width = 600
     height = 400
@@ -484,15 +465,14 @@ def create_ticket_image(ticket_data: Dict, qr_path: str, file_path: str) -> str:
     draw.text((left_x + 80, y_pos), ticket_data['created_at'], fill='black', font=text_font)
     
     # QR kod qo'shish
-    if os.path.exists(qr_path):
-        qr_img = Image.open(qr_path)
+    qr_size = 150
+    qr_y = 100
+    if qr_img is not None:
         # QR kod o'lchamini kichraytirish
-        qr_size = 150
         qr_img = qr_img.resize((qr_size, qr_size), Image.Resampling.LANCZOS)
         
         # QR kodni o'ng tomonga joylash
         qr_x = right_x
-        qr_y = 100
         img.paste(qr_img, (qr_x, qr_y))
         
         # QR kod haqida matn
@@ -517,16 +497,14 @@ def create_ticket_image(ticket_data: Dict, qr_path: str, file_path: str) -> str:
         draw.text((30, y_pos), rule, fill='black', font=small_font)
         y_pos += 20
     
-    # Rasmni saqlash
-    img.save(file_path, 'PNG', quality=95)
-    return file_path
+    return img
 
 def log_user_action(user_id: int, action: str, details: str = None):
-    """Foydalanuvchi amallarini loglash"""
-    timestamp = get_uzbekistan_time()
-    log_entry = f"[{timestamp}] User {user_id}: {action}"
+    """Foydalanuvchi amallarini audit logga yozish (logs/audit.log)"""
+    log_entry = f"User {user_id}: {action}"
     if details:
         log_entry += f" - {details}"
     
-    # Bu yerda logging kutubxonasidan foydalanish kerak
-    print(log_entry)  # Hozircha print, keyinchalik logging.info() ga o'zgartirish
+    audit_logger.info(log_entry, extra={
+        'audit': {'audit_user_id': user_id, 'action': action, 'details': details}
+    })
@@ -0,0 +1,368 @@
+"""
+Band slotlar uchun navbat (waitlist)
+
+    - Mijoz (kort, sana, soat) slotiga navbatga yoziladi. Baza - asosiy manba,
+      xotirada esa har bir slot uchun FIFO indeks (deque) saqlanadi: bo'shagan
+      slot uchun navbatdagi birinchi mijoz bazani skanerlamasdan topiladi.
+    - Slot bo'shaganda (bron bekor qilindi, to'lov bekor qilindi yoki HOLD
+      muddati o'tdi) navbatdagi birinchi mijoz uchun WAITLIST_OFFER_MINUTES
+      muddatli HOLD bron yaratiladi va taklif yuboriladi. Slot shu HOLD bilan
+      band bo'lgani uchun taklif eksklyuziv.
+    - Fon vazifasi muddati o'tgan HOLD bronlarni (to'lov boshlanmaganlarini)
+      bekor qiladi va slotni navbatdagi keyingi mijozga taklif qiladi.
+
+Navbatni ko'tarish bitta fon vazifasida ketma-ket bajariladi (bir nechta bot
+jarayoni ishlaganda navbatni faqat bittasi boshqarishi kerak).
+"""
+
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import exists, select, update
+
+from config import Config
+from database import (
+    async_session, Booking, BookingStatus, Court, Payment, PaymentStatus,
+    User, WaitlistEntry, WaitlistStatus
+)
+from keyboards import get_waitlist_offer_keyboard
+from localization import get_text
+from send_queue import send_queue, PRIORITY_HIGH
+from utils import calculate_booking_price, get_uzbekistan_time
+
+logger = logging.getLogger(__name__)
+
+SlotKey = Tuple[int, datetime]
+
+# Slotni band qiladigan bron holatlari
+BUSY_STATUSES = [BookingStatus.CONFIRMED, BookingStatus.PAID, BookingStatus.HOLD]
+
+def local_now() -> datetime:
+    """Mahalliy vaqt (Booking.start_time bilan solishtirish uchun, naive)"""
+    return get_uzbekistan_time().replace(tzinfo=None)
+
+def slot_hours(start_time: datetime, end_time: datetime = None) -> List[datetime]:
+    """Bron egallagan soatlik slotlar boshlanishi: [start_time, end_time)"""
+    start = start_time.replace(tzinfo=None, minute=0, second=0, microsecond=0)
+    end = end_time.replace(tzinfo=None) if end_time is not None else start + timedelta(hours=1)
+    hours = []
+    while start < end:
+        hours.append(start)
+        start += timedelta(hours=1)
+    return hours
+
+class WaitlistManager:
+    """Slot navbatlari va HOLD takliflarini boshqaruvchi"""
+
+    def __init__(self, offer_minutes: int = None, sweep_interval: float = None):
+        self.offer_ttl = timedelta(minutes=offer_minutes or Config.WAITLIST_OFFER_MINUTES)
+        self.sweep_interval = sweep_interval or Config.WAITLIST_SWEEP_INTERVAL
+
+        # (court_id, slot_start) -> navbat: [(entry_id, user_id), ...]
+        self._queues: Dict[SlotKey, Deque[Tuple[int, int]]] = {}
+        self._freed: Set[SlotKey] = set()
+        self._wake_event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def position(self, court_id: int, slot_start: datetime, entry_id: int) -> Optional[int]:
+        """Navbatdagi o'rni (1 dan boshlab); navbatda bo'lmasa - None"""
+        for index, (queued_id, _) in enumerate(self._queues.get((court_id, slot_start), ())):
+            if queued_id == entry_id:
+                return index + 1
+        return None
+
+    async def load(self):
+        """Kutayotgan yozuvlardan indeksni qayta qurish"""
+        async with async_session() as session:
+            result = await session.execute(
+                select(WaitlistEntry.id, WaitlistEntry.user_id, WaitlistEntry.court_id, WaitlistEntry.slot_start)
+                .where(WaitlistEntry.status == WaitlistStatus.WAITING, WaitlistEntry.slot_start > local_now())
+                .order_by(WaitlistEntry.id)
+            )
+            rows = result.all()
+
+        self._queues = {}
+        for row in rows:
+            self._queues.setdefault((row.court_id, row.slot_start), deque()).append((row.id, row.user_id))
+        # Ishga tushguncha bo'shagan slotlar ham tekshiriladi
+        self._freed.update(self._queues)
+        logger.info(f"Navbat yuklandi: {len(rows)} ta yozuv, {len(self._queues)} ta slot")
+
+    async def join(self, user_id: int, court_id: int, slot_start: datetime) -> Tuple[int, int]:
+        """Navbatga yozilish (takroriy yozilish mavjud yozuvni qaytaradi): (entry_id, o'rni)"""
+        key = (court_id, slot_start)
+        queue = self._queues.setdefault(key, deque())
+        for index, (entry_id, queued_user_id) in enumerate(queue):
+            if queued_user_id == user_id:
+                return entry_id, index + 1
+
+        async with async_session() as session:
+            entry = WaitlistEntry(user_id=user_id, court_id=court_id, slot_start=slot_start)
+            session.add(entry)
+            await session.commit()
+
+        queue.append((entry.id, user_id))
+        # Slot allaqachon bo'sh bo'lishi mumkin - darhol tekshiriladi
+        self.slot_freed(court_id, slot_start)
+        return entry.id, len(queue)
+
+    async def leave(self, user_id: int, entry_id: int) -> bool:
+        """Navbatdan chiqish"""
+        async with async_session() as session:
+            result = await session.execute(
+                update(WaitlistEntry)
+                .where(
+                    WaitlistEntry.id == entry_id,
+                    WaitlistEntry.user_id == user_id,
+                    WaitlistEntry.status == WaitlistStatus.WAITING
+                )
+                .values(status=WaitlistStatus.CANCELLED)
+                .returning(WaitlistEntry.court_id, WaitlistEntry.slot_start)
+                .execution_options(synchronize_session=False)
+            )
+            row = result.first()
+            await session.commit()
+
+        if row is None:
+            return False
+        queue = self._queues.get((row.court_id, row.slot_start))
+        if queue:
+            self._queues[(row.court_id, row.slot_start)] = deque(item for item in queue if item[0] != entry_id)
+        return True
+
+    def slot_freed(self, court_id: int, start_time: datetime, end_time: datetime = None):
+        """Bron vaqti bo'shadi: navbati bor har bir soat birinchi mijozga taklif qilinadi"""
+        for slot_start in slot_hours(start_time, end_time):
+            key = (court_id, slot_start)
+            if self._queues.get(key):
+                self._freed.add(key)
+                self._wake_event.set()
+
+    async def on_payment_failed(self, event: Dict[str, Any]):
+        """payment.failed: bekor qilingan bron sloti navbatga beriladi"""
+        async with async_session() as session:
+            booking = await session.get(Booking, event['booking_id'])
+        if booking is not None and booking.status == BookingStatus.CANCELLED:
+            self.slot_freed(booking.court_id, booking.start_time, booking.end_time)
+
+    async def release_offer(self, user_id: int, booking_id: int) -> bool:
+        """Mijoz taklifni rad etdi: HOLD bekor qilinadi va slot keyingi mijozga o'tadi"""
+        async with async_session() as session:
+            result = await session.execute(
+                update(Booking)
+                .where(
+                    Booking.id == booking_id,
+                    Booking.user_id == user_id,
+                    Booking.status == BookingStatus.HOLD,
+                    # NULL - to'lov yaratilmoqda (HOLD band qilingan)
+                    Booking.hold_expires_at.isnot(None),
+                    ~exists().where(Payment.booking_id == Booking.id)
+                )
+                .values(status=BookingStatus.CANCELLED, updated_at=datetime.utcnow())
+                .returning(Booking.court_id, Booking.start_time, Booking.end_time)
+                .execution_options(synchronize_session=False)
+            )
+            row = result.first()
+            if row is not None:
+                await session.execute(
+                    update(WaitlistEntry)
+                    .where(WaitlistEntry.booking_id == booking_id)
+                    .values(status=WaitlistStatus.CANCELLED)
+                    .execution_options(synchronize_session=False)
+                )
+            await session.commit()
+
+        if row is None:
+            return False
+        self.slot_freed(row.court_id, row.start_time, row.end_time)
+        return True
+
+    async def sweep(self) -> int:
+        """Muddati o'tgan HOLD bronlar va o'tib ketgan slot navbatlarini tozalash"""
+        now = local_now()
+        async with async_session() as session:
+            # To'lov boshlangan HOLD lar to'lov muddati (reconciliation) bilan boshqariladi
+            active_payment = exists().where(
+                Payment.booking_id == Booking.id,
+                Payment.status.in_([PaymentStatus.PENDING, PaymentStatus.PROCESSING, PaymentStatus.PAID])
+            )
+            result = await session.execute(
+                update(Booking)
+                .where(Booking.status == BookingStatus.HOLD, Booking.hold_expires_at < now, ~active_payment)
+                .values(status=BookingStatus.CANCELLED, updated_at=datetime.utcnow())
+                .returning(Booking.id, Booking.court_id, Booking.start_time, Booking.end_time)
+                .execution_options(synchronize_session=False)
+            )
+            expired = result.all()
+            if expired:
+                await session.execute(
+                    update(WaitlistEntry)
+                    .where(
+                        WaitlistEntry.booking_id.in_([row.id for row in expired]),
+                        WaitlistEntry.status.in_([WaitlistStatus.OFFERED, WaitlistStatus.ACCEPTED])
+                    )
+                    .values(status=WaitlistStatus.EXPIRED)
+                    .execution_options(synchronize_session=False)
+                )
+
+            past = [key for key in self._queues if key[1] <= now]
+            if past:
+                await session.execute(
+                    update(WaitlistEntry)
+                    .where(WaitlistEntry.status == WaitlistStatus.WAITING, WaitlistEntry.slot_start <= now)
+                    .values(status=WaitlistStatus.EXPIRED)
+                    .execution_options(synchronize_session=False)
+                )
+            await session.commit()
+
+        for key in past:
+            del self._queues[key]
+            self._freed.discard(key)
+        for row in expired:
+            self.slot_freed(row.court_id, row.start_time, row.end_time)
+        if expired:
+            logger.info(f"Muddati o'tgan HOLD bronlar bekor qilindi: {len(expired)} ta")
+        return len(expired)
+
+    async def _promote(self, key: SlotKey) -> Optional[int]:
+        """Bo'sh slotni navbatdagi birinchi mijozga HOLD sifatida taklif qilish; booking_id"""
+        court_id, slot_start = key
+        queue = self._queues.get(key)
+        slot_end = slot_start + timedelta(hours=1)
+
+        async with async_session() as session:
+            busy = await session.scalar(
+                select(Booking.id).where(
+                    Booking.court_id == court_id,
+                    Booking.start_time < slot_end,
+                    Booking.end_time > slot_start,
+                    Booking.status.in_(BUSY_STATUSES)
+                ).limit(1)
+            )
+            if busy is not None:
+                return None
+            court = await session.get(Court, court_id)
+
+            while queue:
+                # Yozuv navbatdan faqat commit dan keyin olinadi (xato bo'lsa o'rni saqlanadi)
+                entry_id, user_id = queue[0]
+                # Mijoz shu orada navbatdan chiqqan bo'lishi mumkin
+                result = await session.execute(
+                    update(WaitlistEntry)
+                    .where(WaitlistEntry.id == entry_id, WaitlistEntry.status == WaitlistStatus.WAITING)
+                    .values(status=WaitlistStatus.OFFERED, offered_at=datetime.utcnow())
+                    .returning(WaitlistEntry.id)
+                    .execution_options(synchronize_session=False)
+                )
+                if result.first() is None:
+                    queue.popleft()
+                    continue
+
+                user = await session.get(User, user_id)
+                pricing = calculate_booking_price(
+                    court.hourly_rate_peak,
+                    court.hourly_rate_offpeak,
+                    1.0,
+                    slot_start,
+                    user.is_vip
+                )
+                booking = Booking(
+                    user_id=user_id,
+                    court_id=court_id,
+                    booking_date=slot_start.date(),
+                    start_time=slot_start,
+                    end_time=slot_end,
+                    duration_hours=1,
+                    total_amount=pricing['subtotal'],
+                    discount_amount=pricing['discount'],
+                    service_fee=pricing['service_fee'],
+                    final_amount=pricing['final_amount'],
+                    status=BookingStatus.HOLD,
+                    is_peak_time=pricing['is_peak'],
+                    is_weekend=pricing['is_weekend'],
+                    hold_expires_at=local_now() + self.offer_ttl
+                )
+                session.add(booking)
+                await session.flush()
+                await session.execute(
+                    update(WaitlistEntry)
+                    .where(WaitlistEntry.id == entry_id)
+                    .values(booking_id=booking.id)
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+                queue.popleft()
+                break
+            else:
+                await session.commit()
+                self._queues.pop(key, None)
+                return None
+
+        if not queue:
+            self._queues.pop(key, None)
+
+        lang = user.language
+        try:
+            await send_queue.send_message(
+                user.telegram_id,
+                get_text(
+                    "waitlist_offer", lang,
+                    date=slot_start.strftime("%d.%m.%Y"),
+                    time=slot_start.strftime("%H:%M"),
+                    court_name=court.name,
+                    amount=booking.final_amount,
+                    minutes=int(self.offer_ttl.total_seconds() // 60)
+                ),
+                priority=PRIORITY_HIGH,
+                reply_markup=get_waitlist_offer_keyboard(booking.id, lang)
+            )
+        except Exception as e:
+            # HOLD muddati o'tgach slot keyingi mijozga o'tadi
+            logger.warning(f"Navbat taklifi yuborilmadi (bron {booking.id}): {e}")
+
+        logger.info(f"Navbat taklifi: kort {court_id}, {slot_start}, bron {booking.id}")
+        return booking.id
+
+    async def run_once(self) -> int:
+        """Tozalash va bo'shagan slotlarni taklif qilish; yuborilgan takliflar soni"""
+        await self.sweep()
+        offered = 0
+        while self._freed:
+            key = self._freed.pop()
+            if await self._promote(key) is not None:
+                offered += 1
+        return offered
+
+    def start(self):
+        """Fon vazifasini ishga tushirish"""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        try:
+            await self.load()
+        except Exception as e:
+            logger.exception(f"Navbat yuklanmadi: {e}")
+
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.exception(f"Waitlist error: {e}")
+
+            try:
+                await asyncio.wait_for(self._wake_event.wait(), timeout=self.sweep_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake_event.clear()
+
+# Global navbat menejeri (bot.main da ishga tushiriladi)
+waitlist_manager = WaitlistManager()